@@ -12,9 +12,8 @@ import multiprocessing
 from time import sleep
 from datetime import datetime, time
 
-from vnpy.event import EventEngine2
 from vnpy.trader.vtEvent import EVENT_LOG, EVENT_ERROR
-from vnpy.trader.vtEngine import MainEngine, LogEngine
+from vnpy.trader.vtEngine import MainEngine, LogEngine, createEventEngine
 from vnpy.trader.gateway import ctpGateway
 from vnpy.trader.app import ctaStrategy
 from vnpy.trader.app.ctaStrategy.ctaBase import EVENT_CTA_LOG
@@ -43,7 +42,7 @@ def runChildProcess():
     
     le.info(u'启动CTA策略运行子进程')
     
-    ee = EventEngine2()
+    ee = createEventEngine()
     le.info(u'事件引擎创建成功')
     
     me = MainEngine(ee)
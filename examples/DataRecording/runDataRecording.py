@@ -5,9 +5,8 @@ import multiprocessing
 from time import sleep
 from datetime import datetime, time
 
-from vnpy.event import EventEngine2
 from vnpy.trader.vtEvent import EVENT_LOG, EVENT_ERROR
-from vnpy.trader.vtEngine import MainEngine, LogEngine
+from vnpy.trader.vtEngine import MainEngine, LogEngine, createEventEngine
 from vnpy.trader.gateway import ctpGateway
 from vnpy.trader.app import dataRecorder
 
@@ -32,7 +31,7 @@ def runChildProcess():
     le.addConsoleHandler()
     le.info(u'启动行情记录运行子进程')
     
-    ee = EventEngine2()
+    ee = createEventEngine()
     le.info(u'事件引擎创建成功')
     
     me = MainEngine(ee)
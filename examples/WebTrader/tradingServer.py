@@ -12,8 +12,7 @@ import signal
 from time import sleep
 
 # vn.trader模块
-from vnpy.event import EventEngine2
-from vnpy.trader.vtEngine import MainEngine, LogEngine
+from vnpy.trader.vtEngine import MainEngine, LogEngine, createEventEngine
 
 # 加载底层接口
 from vnpy.trader.gateway import ctpGateway
@@ -33,7 +32,7 @@ def main():
     le.info(u'服务器进程启动')
     
     # 创建事件引擎
-    ee = EventEngine2()
+    ee = createEventEngine()
     le.info(u'事件引擎创建成功')
     
     # 创建主引擎
@@ -0,0 +1,161 @@
+# encoding: UTF-8
+
+"""CTA回测引擎测试"""
+
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from vnpy.trader.vtStore import HistoryStore
+from vnpy.trader.app.ctaStrategy.ctaBase import (CTAORDER_BUY, CTAORDER_SELL,
+                                                 CTAORDER_SHORT, CTAORDER_COVER)
+from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine
+
+
+ORDER_TYPES = [CTAORDER_BUY, CTAORDER_SELL, CTAORDER_SHORT, CTAORDER_COVER]
+
+
+########################################################################
+class RandomStrategy(object):
+    """随机发出和撤销限价单、停止单的策略，记录收到的全部推送"""
+    className = 'RandomStrategy'
+
+    #----------------------------------------------------------------------
+    def __init__(self, engine, setting):
+        """Constructor"""
+        self.engine = engine
+        self.name = 'random'
+        self.pos = 0
+        self.inited = False
+        self.trading = False
+
+        self.rng = random.Random(7)
+        self.log = []
+
+    #----------------------------------------------------------------------
+    def onInit(self):
+        """初始化"""
+        pass
+
+    #----------------------------------------------------------------------
+    def onStart(self):
+        """启动"""
+        pass
+
+    #----------------------------------------------------------------------
+    def onBar(self, bar):
+        """随机发单和撤单"""
+        rng = self.rng
+        engine = self.engine
+        self.log.append(('bar', bar.datetime, bar.close))
+
+        for i in range(rng.randint(0, 2)):
+            engine.sendOrder('rb', rng.choice(ORDER_TYPES), bar.close + rng.randint(-8, 8), 1, self)
+        for i in range(rng.randint(0, 2)):
+            engine.sendStopOrder('rb', rng.choice(ORDER_TYPES), bar.close + rng.randint(-8, 8), 1, self)
+
+        if rng.random() < 0.3:
+            l = sorted(engine.workingLimitOrderDict.keys(), key=int)
+            if l:
+                engine.cancelOrder(rng.choice(l))
+        if rng.random() < 0.3:
+            l = sorted(engine.workingStopOrderDict.keys())
+            if l:
+                engine.cancelStopOrder(rng.choice(l))
+
+    #----------------------------------------------------------------------
+    def onOrder(self, order):
+        """委托推送"""
+        self.log.append(('order', order.orderID, order.status, order.price, order.tradedVolume))
+
+    #----------------------------------------------------------------------
+    def onTrade(self, trade):
+        """成交推送，部分成交后在回调中继续发单"""
+        self.log.append(('trade', trade.tradeID, trade.orderID, trade.direction,
+                         trade.price, trade.volume, trade.dt))
+
+        rng = self.rng
+        if rng.random() < 0.3:
+            self.engine.sendStopOrder('rb', rng.choice([CTAORDER_BUY, CTAORDER_SHORT]),
+                                      trade.price + rng.randint(-3, 3), 1, self)
+        if rng.random() < 0.2:
+            self.engine.sendOrder('rb', rng.choice([CTAORDER_BUY, CTAORDER_SHORT]),
+                                  trade.price + rng.randint(-3, 3), 1, self)
+
+    #----------------------------------------------------------------------
+    def onStopOrder(self, so):
+        """停止单推送"""
+        self.log.append(('stop', so.stopOrderID, so.status))
+
+
+########################################################################
+class VectorBacktestingTest(unittest.TestCase):
+    """向量化K线回放和逐根K线回放的结果一致"""
+
+    #----------------------------------------------------------------------
+    def setUp(self):
+        """生成随机游走的K线数据"""
+        self.path = tempfile.mkdtemp()
+
+        rng = random.Random(1)
+        price = 100
+        barList = []
+        for i in range(2000):
+            dt = datetime(2018, 1, 2, 9) + timedelta(minutes=i)
+            openPrice = round(price)
+            price += rng.gauss(0, 1)
+            closePrice = round(price)
+            barList.append({
+                'vtSymbol': 'rb',
+                'symbol': 'rb',
+                'exchange': '',
+                'datetime': dt,
+                'date': dt.strftime('%Y%m%d'),
+                'time': dt.strftime('%H:%M:%S'),
+                'open': openPrice,
+                'high': max(openPrice, closePrice) + round(abs(rng.gauss(0, 0.5))),
+                'low': min(openPrice, closePrice) - round(abs(rng.gauss(0, 0.5))),
+                'close': closePrice,
+                'volume': 1,
+                'openInterest': 0
+            })
+
+        HistoryStore(self.path).insertData('test', 'rb', barList)
+
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.path)
+
+    #----------------------------------------------------------------------
+    def runBacktesting(self, vectorMode):
+        """运行回测，返回策略收到的推送和成交记录"""
+        engine = BacktestingEngine()
+        engine.output = lambda content: None
+        engine.setBacktestingMode(engine.BAR_MODE)
+        engine.setStartDate('20180102', 0)
+        engine.setDatabase('test', 'rb')
+        engine.setVectorMode(vectorMode)
+        engine.initHistoryStore(self.path)
+        engine.initStrategy(RandomStrategy, {})
+        engine.runBacktesting()
+
+        tradeList = [(tradeID, trade.price, trade.volume, trade.dt)
+                     for tradeID, trade in engine.tradeDict.items()]
+        return engine.strategy.log, tradeList
+
+    #----------------------------------------------------------------------
+    def testSameResult(self):
+        """策略收到的K线、委托、成交推送顺序和内容完全一致"""
+        log, tradeList = self.runBacktesting(False)
+        vectorLog, vectorTradeList = self.runBacktesting(True)
+
+        self.assertGreater(len(tradeList), 100)
+        self.assertEqual(log, vectorLog)
+        self.assertEqual(tradeList, vectorTradeList)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# encoding: UTF-8
+
+"""本地停止单簿测试"""
+
+import random
+import unittest
+from collections import OrderedDict
+
+from vnpy.trader.vtConstant import DIRECTION_LONG, DIRECTION_SHORT
+from vnpy.trader.app.ctaStrategy.ctaBase import StopOrder, StopOrderBook, STOPORDERPREFIX
+
+
+#----------------------------------------------------------------------
+def getTriggered(orderDict, buyPrice, sellPrice):
+    """逐个检查所有停止单，按发出的先后返回被触发的停止单"""
+    l = []
+    for so in orderDict.values():
+        if so.direction == DIRECTION_LONG and buyPrice >= so.price:
+            l.append(so)
+        elif so.direction == DIRECTION_SHORT and sellPrice <= so.price:
+            l.append(so)
+    return l
+
+
+########################################################################
+class StopOrderBookTest(unittest.TestCase):
+    """停止单簿和逐个检查的结果一致"""
+
+    #----------------------------------------------------------------------
+    def testTriggered(self):
+        """随机添加、移除和触发停止单"""
+        rng = random.Random(1)
+        book = StopOrderBook()
+        orderDict = OrderedDict()
+
+        for i in range(3000):
+            action = rng.random()
+
+            if action < 0.5:
+                so = StopOrder()
+                so.stopOrderID = STOPORDERPREFIX + str(i)
+                so.direction = rng.choice([DIRECTION_LONG, DIRECTION_SHORT])
+                so.price = 100 + rng.randint(-20, 20)       # 重复价格较多
+                book.addStopOrder(so)
+                orderDict[so.stopOrderID] = so
+            elif action < 0.7 and orderDict:
+                so = orderDict.pop(rng.choice(list(orderDict.keys())))
+                self.assertTrue(book.removeStopOrder(so))
+                self.assertFalse(book.removeStopOrder(so))
+            else:
+                # K线回测中买入和卖出的触发判断价格不同
+                buyPrice = 100 + rng.randint(-25, 25)
+                sellPrice = buyPrice - rng.randint(0, 5)
+
+                triggered = book.getTriggered(buyPrice, sellPrice)
+                self.assertEqual(triggered, getTriggered(orderDict, buyPrice, sellPrice))
+
+                # 触发的停止单从簿中移除
+                for so in triggered:
+                    book.removeStopOrder(so)
+                    del orderDict[so.stopOrderID]
+
+            self.assertEqual(len(book), len(orderDict))
+
+        book.clear()
+        self.assertEqual(len(book), 0)
+        self.assertEqual(book.getTriggered(1000, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# encoding: UTF-8
+
+"""K线序列管理工具测试"""
+
+from __future__ import division
+
+import random
+import unittest
+
+import numpy as np
+
+from vnpy.trader.vtObject import VtBarData
+from vnpy.trader.app.ctaStrategy.ctaTemplate import ArrayManager, RingArrayManager
+
+
+#----------------------------------------------------------------------
+def makeBarList(count):
+    """创建随机游走的K线列表"""
+    rng = random.Random(1)
+    price = 3000.0
+    l = []
+    for i in range(count):
+        bar = VtBarData()
+        bar.open = price
+        price += rng.gauss(0, 5)
+        bar.close = price
+        bar.high = max(bar.open, bar.close) + abs(rng.gauss(0, 2))
+        bar.low = min(bar.open, bar.close) - abs(rng.gauss(0, 2))
+        bar.volume = rng.randint(1, 100)
+        l.append(bar)
+    return l
+
+
+#----------------------------------------------------------------------
+def wilder(array, n):
+    """Wilder平滑，初始值为前n个数据的均值，和talib一样从序列起点开始计算"""
+    value = array[:n].mean()
+    for x in array[n:]:
+        value = (value * (n - 1) + x) / n
+    return value
+
+
+#----------------------------------------------------------------------
+def emaReference(close, n):
+    """指数均线"""
+    alpha = 2 / (n + 1)
+    value = close[:n].mean()
+    for x in close[n:]:
+        value += alpha * (x - value)
+    return value
+
+
+#----------------------------------------------------------------------
+def atrReference(high, low, close, n):
+    """ATR"""
+    preClose = close[:-1]
+    tr = np.maximum(high[1:] - low[1:],
+                    np.maximum(np.abs(high[1:] - preClose), np.abs(low[1:] - preClose)))
+    return wilder(tr, n)
+
+
+#----------------------------------------------------------------------
+def rsiReference(close, n):
+    """RSI"""
+    diff = np.diff(close)
+    avgGain = wilder(np.maximum(diff, 0), n)
+    avgLoss = wilder(np.maximum(-diff, 0), n)
+    return 100 * avgGain / (avgGain + avgLoss)
+
+
+########################################################################
+class RingArrayManagerTest(unittest.TestCase):
+    """环形缓冲区的序列和逐根平移的序列一致"""
+
+    #----------------------------------------------------------------------
+    def testSameArray(self):
+        """每根K线更新后序列完全相同"""
+        am = ArrayManager(50)
+        ram = RingArrayManager(50)
+
+        for bar in makeBarList(237):
+            am.updateBar(bar)
+            ram.updateBar(bar)
+
+            self.assertEqual(am.inited, ram.inited)
+            for name in ['open', 'high', 'low', 'close', 'volume']:
+                self.assertTrue(np.array_equal(getattr(am, name), getattr(ram, name)))
+
+
+########################################################################
+class StreamingIndicatorTest(unittest.TestCase):
+    """增量指标和按缓存序列完整计算的结果一致"""
+
+    #----------------------------------------------------------------------
+    def checkIndicator(self, amClass):
+        """逐根K线对比"""
+        size = 100
+        am = amClass(size, streaming=True)
+
+        for i, bar in enumerate(makeBarList(500)):
+            am.updateBar(bar)
+
+            # 第一次获取时注册并使用缓存序列预热
+            if i < 150:
+                am.sma(20)
+                am.std(20)
+                am.donchian(20)
+                am.ema(10)
+                am.atr(5)
+                am.rsi(5)
+                continue
+
+            high, low, close = am.high, am.low, am.close
+
+            self.assertAlmostEqual(am.sma(20), close[-20:].mean(), places=8)
+            self.assertAlmostEqual(am.std(20), close[-20:].std(), places=8)
+            self.assertEqual(am.donchian(20), (high[-20:].max(), low[-20:].min()))
+
+            # 平滑类指标的起点不同，差异随序列长度指数衰减
+            self.assertAlmostEqual(am.ema(10), emaReference(close, 10), places=6)
+            self.assertAlmostEqual(am.atr(5), atrReference(high, low, close, 5), places=6)
+            self.assertAlmostEqual(am.rsi(5), rsiReference(close, 5), places=6)
+
+    #----------------------------------------------------------------------
+    def testArrayManager(self):
+        """ArrayManager"""
+        self.checkIndicator(ArrayManager)
+
+    #----------------------------------------------------------------------
+    def testRingArrayManager(self):
+        """RingArrayManager"""
+        self.checkIndicator(RingArrayManager)
+
+
+if __name__ == '__main__':
+    unittest.main()
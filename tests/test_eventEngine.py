@@ -0,0 +1,114 @@
+# encoding: UTF-8
+
+"""事件引擎测试"""
+
+import time
+import unittest
+
+from vnpy.event import EventEngine2, LaneEventEngine, Event, EventMonitor
+
+
+########################################################################
+class Tick(object):
+    """行情数据"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, vtSymbol, price):
+        """Constructor"""
+        self.vtSymbol = vtSymbol
+        self.lastPrice = price
+
+
+#----------------------------------------------------------------------
+def makeEvent(type_, data=None):
+    """创建事件"""
+    event = Event(type_)
+    event.dict_['data'] = data
+    return event
+
+
+########################################################################
+class EventEngineTest(unittest.TestCase):
+    """EventEngine2和LaneEventEngine的处理函数调用一致"""
+
+    #----------------------------------------------------------------------
+    def waitFor(self, condition, timeout=5):
+        """等待处理线程处理完成"""
+        end = time.time() + timeout
+        while not condition() and time.time() < end:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    #----------------------------------------------------------------------
+    def runEngine(self, engineClass, conflation=False, monitor=False):
+        """注册处理函数后存入一组事件，返回各处理函数收到的事件"""
+        ee = engineClass()
+        ee.setConflation(conflation)
+        if monitor:
+            em = EventMonitor(ee, 0)
+            ee.setMonitor(em)
+
+        resultDict = {'tick': [], 'snapshot': [], 'order': [], 'log': [], 'general': []}
+        ee.register('eTick.', lambda event: resultDict['tick'].append(event.dict_['data'].lastPrice))
+        ee.registerSnapshotHandler('eTick.', lambda event: resultDict['snapshot'].append(event.dict_['data'].lastPrice))
+        ee.register('eOrder.', lambda event: resultDict['order'].append(event.dict_['data']))
+        ee.register('eLog', lambda event: resultDict['log'].append(event.dict_['data']))
+        ee.registerGeneralHandler(lambda event: resultDict['general'].append(event.type_))
+
+        # 启动前存入事件，保证合并模式下同一合约的行情在队列中积压
+        for i in range(100):
+            ee.put(makeEvent('eTick.', Tick('rb1810', i)))
+            ee.put(makeEvent('eOrder.', i))
+            ee.put(makeEvent('eLog', i))
+
+        ee.start(timer=False)
+        try:
+            self.waitFor(lambda: len(resultDict['general']) == 300 and ee.getQueueSize() == 0)
+        finally:
+            ee.stop()
+
+        if monitor:
+            self.assertIn('eOrder.', em.getWaitStats())
+            self.assertTrue(em.getHandlerStats())
+
+        return resultDict
+
+    #----------------------------------------------------------------------
+    def checkResult(self, resultDict, conflation):
+        """检查处理函数收到的事件"""
+        self.assertEqual(resultDict['tick'], list(range(100)))
+        self.assertEqual(resultDict['order'], list(range(100)))
+        self.assertEqual(resultDict['log'], list(range(100)))
+        self.assertEqual(sorted(resultDict['general']), ['eLog'] * 100 + ['eOrder.'] * 100 + ['eTick.'] * 100)
+
+        if conflation:
+            self.assertEqual(resultDict['snapshot'], [99])
+        else:
+            self.assertEqual(resultDict['snapshot'], list(range(100)))
+
+    #----------------------------------------------------------------------
+    def testEngine(self):
+        """单线程事件引擎"""
+        for conflation in (False, True):
+            for monitor in (False, True):
+                self.checkResult(self.runEngine(EventEngine2, conflation, monitor), conflation)
+
+    #----------------------------------------------------------------------
+    def testLaneEngine(self):
+        """分通道事件引擎"""
+        for conflation in (False, True):
+            for monitor in (False, True):
+                self.checkResult(self.runEngine(LaneEventEngine, conflation, monitor), conflation)
+
+    #----------------------------------------------------------------------
+    def testLaneRoute(self):
+        """按事件类型前缀分配通道"""
+        ee = LaneEventEngine()
+        ee.addLane('log', ['eLog'])
+        self.assertEqual(ee.getEventLane('eTick.rb1810'), LaneEventEngine.LANE_FAST)
+        self.assertEqual(ee.getEventLane('eTimer'), LaneEventEngine.LANE_SLOW)
+        self.assertEqual(ee.getEventLane('eLog'), 'log')
+
+
+if __name__ == '__main__':
+    unittest.main()
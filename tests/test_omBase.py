@@ -0,0 +1,189 @@
+# encoding: UTF-8
+
+"""OptionMaster持仓希腊值汇总测试"""
+
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from vnpy.trader.vtConstant import (OPTION_CALL, OPTION_PUT, PRODUCT_FUTURES,
+                                    DIRECTION_LONG, DIRECTION_SHORT,
+                                    OFFSET_OPEN, OFFSET_CLOSE)
+from vnpy.trader.vtObject import VtContractData, VtTickData, VtTradeData
+from vnpy.trader.app.optionMaster.omBase import (OmUnderlying, OmOption, OmChain,
+                                                 OmArrayChain, OmPortfolio, POS_FIELDS)
+from vnpy.pricing import black, blackNumpy
+
+
+########################################################################
+class Detail(object):
+    """启动时从持仓明细载入的持仓"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, longPos, shortPos):
+        """Constructor"""
+        self.longPos = longPos
+        self.shortPos = shortPos
+
+
+#----------------------------------------------------------------------
+def makeContract(symbol, strike=0, optionType=None):
+    """创建合约"""
+    contract = VtContractData()
+    contract.symbol = symbol
+    contract.vtSymbol = symbol
+    contract.size = 10
+    contract.priceTick = 1
+    contract.strikePrice = strike
+    contract.optionType = optionType
+    contract.expiryDate = '20190628'
+    contract.productClass = PRODUCT_FUTURES
+    return contract
+
+
+#----------------------------------------------------------------------
+def makeTick(symbol, bid, ask):
+    """创建行情"""
+    tick = VtTickData()
+    tick.symbol = symbol
+    tick.bidPrice1 = bid
+    tick.askPrice1 = ask
+    tick.bidVolume1 = 1
+    tick.askVolume1 = 1
+    return tick
+
+
+#----------------------------------------------------------------------
+def makeTrade(symbol, direction, offset, volume):
+    """创建成交"""
+    trade = VtTradeData()
+    trade.symbol = symbol
+    trade.direction = direction
+    trade.offset = offset
+    trade.volume = volume
+    return trade
+
+
+########################################################################
+class PortfolioTest(unittest.TestCase):
+    """按差值更新的持仓汇总和全量计算一致"""
+
+    #----------------------------------------------------------------------
+    def createPortfolio(self, chainClass, model):
+        """创建一条期权链的组合，两个期权带有初始持仓"""
+        underlying = OmUnderlying(makeContract('m1809'), Detail(0, 0))
+
+        strikeList = range(2800, 3300, 100)
+        callList = [OmOption(makeContract('c%s' %k, k, OPTION_CALL), Detail(0, 0),
+                             underlying, model, 0.03) for k in strikeList]
+        putList = [OmOption(makeContract('p%s' %k, k, OPTION_PUT), Detail(0, 0),
+                            underlying, model, 0.03) for k in strikeList]
+
+        callList[0].longPos = 5
+        callList[0].netPos = 5
+        putList[1].longPos = 5
+        putList[1].shortPos = 2
+        putList[1].netPos = 3
+
+        for option in callList + putList:
+            option.t = 0.25
+            option.pricingImpv = 0.2
+
+        chain = chainClass('m', callList, putList)
+        underlying.addChain(chain)
+
+        return OmPortfolio('test', model, [underlying], [chain])
+
+    #----------------------------------------------------------------------
+    def assertConsistent(self, portfolio):
+        """检查组合和期权链的汇总数据与按期权全量计算的结果一致"""
+        for chain in [portfolio] + list(portfolio.chainDict.values()):
+            d = dict.fromkeys(POS_FIELDS, 0)
+            for option in chain.optionDict.values():
+                d['longPos'] += option.longPos
+                d['shortPos'] += option.shortPos
+                d['posValue'] += option.theoPrice * option.netPos * option.size
+                d['posDelta'] += option.theoDelta * option.netPos
+                d['posGamma'] += option.theoGamma * option.netPos
+                d['posTheta'] += option.theoTheta * option.netPos
+                d['posVega'] += option.theoVega * option.netPos
+
+            if chain is portfolio:
+                for underlying in portfolio.underlyingDict.values():
+                    d['posDelta'] += underlying.posDelta
+
+            for field in POS_FIELDS:
+                self.assertAlmostEqual(getattr(chain, field), d[field], places=6)
+            self.assertEqual(chain.netPos, d['longPos'] - d['shortPos'])
+
+    #----------------------------------------------------------------------
+    def runScenario(self, chainClass, model):
+        """初始持仓、行情、成交和剩余时间更新"""
+        portfolio = self.createPortfolio(chainClass, model)
+        chain = list(portfolio.chainDict.values())[0]
+
+        # 初始持仓在创建时汇总
+        self.assertEqual(chain.longPos, 10)
+        self.assertEqual(chain.shortPos, 2)
+        self.assertEqual(portfolio.longPos, 10)
+        self.assertEqual(portfolio.netPos, 8)
+
+        rng = random.Random(1)
+        symbolList = list(portfolio.optionDict.keys())
+
+        for i in range(50):
+            price = 3000 + rng.randint(-50, 50)
+            portfolio.newTick(makeTick('m1809', price, price + 1))
+
+            symbol = rng.choice(symbolList)
+            portfolio.newTick(makeTick(symbol, 50, 52))
+
+            direction = rng.choice([DIRECTION_LONG, DIRECTION_SHORT])
+            portfolio.newTrade(makeTrade(symbol, direction, OFFSET_OPEN, rng.randint(1, 3)))
+
+            if i % 10 == 0:
+                portfolio.updateTimeToMaturity(datetime(2018, 7, 2, 10) + timedelta(minutes=i))
+                portfolio.flush()
+
+            self.assertConsistent(portfolio)
+
+        self.assertGreater(portfolio.longPos, 10)
+
+        # 平仓
+        option = portfolio.optionDict[symbolList[0]]
+        if option.longPos:
+            portfolio.newTrade(makeTrade(option.symbol, DIRECTION_SHORT, OFFSET_CLOSE, option.longPos))
+        self.assertConsistent(portfolio)
+
+    #----------------------------------------------------------------------
+    def testChain(self):
+        """普通期权链"""
+        self.runScenario(OmChain, black)
+
+    #----------------------------------------------------------------------
+    def testVectorizedChain(self):
+        """使用数组定价模型的普通期权链"""
+        self.runScenario(OmChain, blackNumpy)
+
+    #----------------------------------------------------------------------
+    def testArrayChain(self):
+        """数组期权链"""
+        self.runScenario(OmArrayChain, blackNumpy)
+
+    #----------------------------------------------------------------------
+    def testSameResult(self):
+        """两种期权链的持仓希腊值相同"""
+        resultList = []
+
+        for chainClass in (OmChain, OmArrayChain):
+            portfolio = self.createPortfolio(chainClass, blackNumpy)
+            portfolio.newTick(makeTick('m1809', 3000, 3001))
+            resultList.append([getattr(portfolio, field) for field in POS_FIELDS])
+
+        for value1, value2 in zip(*resultList):
+            self.assertAlmostEqual(value1, value2, places=6)
+        self.assertNotEqual(resultList[0][3], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
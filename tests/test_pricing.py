@@ -0,0 +1,181 @@
+# encoding: UTF-8
+
+"""向量化期权定价模型测试，和逐个计算的数值差分模型对比"""
+
+import unittest
+
+import numpy as np
+
+from vnpy.pricing import bs, black, crr, bsNumpy, blackNumpy, crrNumpy
+
+
+# 测试用的期权参数：(标的价格, 行权价, 利率, 剩余时间, 波动率, 期权类型)
+PARAM_LIST = [(s, k, r, t, v, cp)
+              for s in (3.0, 2950.0)
+              for k in (0.9, 1.0, 1.1)
+              for r in (0.0, 0.03)
+              for t in (0.05, 0.5)
+              for v in (0.15, 0.4)
+              for cp in (1, -1)]
+
+
+########################################################################
+class AnalyticModelTest(unittest.TestCase):
+    """bsNumpy、blackNumpy和bs、black的计算结果对比"""
+
+    #----------------------------------------------------------------------
+    def checkModel(self, scalarModel, numpyModel):
+        """逐个期权对比价格和希腊值"""
+        for s, k, r, t, v, cp in PARAM_LIST:
+            k = s * k
+            price, delta, gamma, theta, vega = numpyModel.calculateGreeks(s, k, r, t, v, cp)
+            scalarPrice, scalarDelta, scalarGamma, scalarTheta, scalarVega = \
+                scalarModel.calculateGreeks(s, k, r, t, v, cp)
+
+            self.assertAlmostEqual(price / s, scalarPrice / s, places=9)
+            self.assertAlmostEqual(delta / s, scalarDelta / s, places=6)
+            self.assertAlmostEqual(theta / s, scalarTheta / s, places=6)
+            self.assertAlmostEqual(vega / s, scalarVega / s, places=6)
+
+            # 数值差分模型的gamma对百分比delta求导，按模块说明中的关系换算，
+            # 两次差分的误差较大
+            originalDelta = delta / (s * 0.01)
+            originalGamma = gamma / (s * s * 0.0001)
+            expected = (originalDelta + s * originalGamma) * s * s * 0.000001
+            self.assertAlmostEqual(expected / scalarGamma, 1, places=2)
+
+    #----------------------------------------------------------------------
+    def testBs(self):
+        """Black-Scholes模型"""
+        self.checkModel(bs, bsNumpy)
+
+    #----------------------------------------------------------------------
+    def testBlack(self):
+        """Black-76模型"""
+        self.checkModel(black, blackNumpy)
+
+    #----------------------------------------------------------------------
+    def testArray(self):
+        """数组参数和逐个传入数值的结果一致"""
+        params = np.array(PARAM_LIST, dtype=float).T
+        params[1] *= params[0]
+
+        resultArray = np.array(blackNumpy.calculateGreeks(*params))
+        for i, param in enumerate(params.T):
+            result = blackNumpy.calculateGreeks(*param)
+            for value1, value2 in zip(resultArray[:, i], result):
+                self.assertAlmostEqual(value1, value2, places=12)
+
+    #----------------------------------------------------------------------
+    def testInvalid(self):
+        """波动率或者剩余时间为0时返回内在价值"""
+        for model in (bsNumpy, blackNumpy):
+            result = model.calculateGreeks(3.2, 3.0, 0.03, 0, 0.2, 1)
+            for value, expected in zip(result, (0.2, 0, 0, 0, 0)):
+                self.assertAlmostEqual(value, expected, places=12)
+            self.assertEqual(model.calculatePrice(3.2, 3.0, 0.03, 0.5, 0, -1), 0)
+
+
+########################################################################
+class ImpvTest(unittest.TestCase):
+    """批量隐含波动率求解"""
+
+    #----------------------------------------------------------------------
+    def makeChain(self, model):
+        """按已知波动率生成一组期权价格"""
+        rng = np.random.RandomState(1)
+        m = 400
+        s = np.full(m, 3000.0)
+        k = s * rng.uniform(0.7, 1.3, m)
+        r = np.full(m, 0.03)
+        t = rng.uniform(0.02, 1.0, m)
+        v = np.round(rng.uniform(0.05, 1.0, m), 4)
+        cp = rng.choice([1, -1], m).astype(float)
+        price = model.calculatePrice(s, k, r, t, v, cp)
+        return price, s, k, r, t, v, cp
+
+    #----------------------------------------------------------------------
+    def checkModel(self, scalarModel, numpyModel):
+        """批量求解结果和已知波动率、逐个求解、原有模型一致"""
+        price, s, k, r, t, v, cp = self.makeChain(numpyModel)
+        impv = numpyModel.calculateImpv(price, s, k, r, t, cp)
+
+        # vega过小的期权价格对波动率不敏感，无法还原
+        vega = numpyModel.calculateOriginalVega(s, k, r, t, v, cp)
+        meaningful = vega > 1e-3 * s
+        self.assertGreater(meaningful.sum(), 300)
+        self.assertTrue(np.all(np.abs(impv - v)[meaningful] <= 1e-4))
+
+        for i in range(0, len(price), 20):
+            args = (price[i], s[i], k[i], r[i], t[i], cp[i])
+            self.assertEqual(numpyModel.calculateImpv(*args), impv[i])
+
+            # 原有模型按1e-5的步长收敛，平值附近的结果相同
+            if abs(k[i] / s[i] - 1) < 0.1 and meaningful[i]:
+                self.assertAlmostEqual(scalarModel.calculateImpv(*args), impv[i], places=3)
+
+    #----------------------------------------------------------------------
+    def testBs(self):
+        """Black-Scholes模型"""
+        self.checkModel(bs, bsNumpy)
+
+    #----------------------------------------------------------------------
+    def testBlack(self):
+        """Black-76模型"""
+        self.checkModel(black, blackNumpy)
+
+    #----------------------------------------------------------------------
+    def testInvalid(self):
+        """价格不为正数、低于内在价值或者超过理论上限时返回0"""
+        for model in (bsNumpy, blackNumpy):
+            price = np.array([0, -1, 0.1, 3100, 200])
+            impv = model.calculateImpv(price, 3000, 2900, 0.03, 0.5, 1)
+            self.assertEqual(impv[:4].tolist(), [0, 0, 0, 0])
+            self.assertGreater(impv[4], 0)
+
+
+########################################################################
+class CrrModelTest(unittest.TestCase):
+    """crrNumpy和crr、blackNumpy的计算结果对比"""
+
+    #----------------------------------------------------------------------
+    def testPrice(self):
+        """利率为0时价格和crr.py的二叉树完全一致"""
+        for s, k, r, t, v, cp in PARAM_LIST:
+            k = s * k
+            for n in (15, 40):
+                self.assertAlmostEqual(crrNumpy.calculatePrice(s, k, 0, t, v, cp, n) / s,
+                                       crr.calculatePrice(s, k, 0, t, v, cp, n) / s,
+                                       places=10)
+
+    #----------------------------------------------------------------------
+    def testGreeks(self):
+        """利率为0时美式看涨期权不会提前行权，树高度足够时收敛到Black-76模型"""
+        for s, k, r, t, v, cp in PARAM_LIST:
+            if cp != 1:
+                continue
+            k = s * k
+
+            result = crrNumpy.calculateGreeks(s, k, 0, t, v, cp, 500)
+            expected = blackNumpy.calculateGreeks(s, k, 0, t, v, cp)
+
+            # 二叉树的离散误差，按标的价格的比例计算
+            for value, target, tolerance in zip(result, expected, (2e-4, 1e-5, 1e-5, 1e-5, 2e-4)):
+                self.assertLess(abs(value - target), tolerance * s)
+
+    #----------------------------------------------------------------------
+    def testArray(self):
+        """数组参数和逐个传入数值的结果一致，不受缓存数组复用的影响"""
+        params = np.array(PARAM_LIST, dtype=float).T
+        params[1] *= params[0]
+
+        for i in range(2):
+            resultArray = np.array(crrNumpy.calculateGreeks(*params, n=50))
+            for j, param in enumerate(params.T):
+                result = crrNumpy.calculateGreeks(*param, n=50)
+                for value1, value2 in zip(resultArray[:, j], result):
+                    self.assertAlmostEqual(value1, value2, places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# encoding: UTF-8
+
+"""vtCodec编码测试"""
+
+import unittest
+from datetime import datetime
+
+import numpy as np
+from msgpack import packb, ExtType
+
+from vnpy.event import Event
+from vnpy.trader import vtCodec
+from vnpy.trader.vtObject import VtTickData, VtLogData
+from vnpy.trader.app.spreadTrading.stBase import StLeg, StSpread
+
+
+########################################################################
+class CodecTest(unittest.TestCase):
+    """编码和解码"""
+
+    #----------------------------------------------------------------------
+    def testTickEvent(self):
+        """行情事件编码后还原所有字段"""
+        tick = VtTickData()
+        tick.vtSymbol = 'rb1810'
+        tick.lastPrice = 3500.0
+        tick.volume = 12
+        tick.datetime = datetime(2018, 7, 2, 9, 30, 1, 500000)
+        tick.rawData = {'ignored': True}
+        tick.extra = u'附加属性'
+        
+        event = Event('eTick.')
+        event.dict_['data'] = tick
+        
+        result = vtCodec.unpack(vtCodec.pack(event))
+        data = result.dict_['data']
+        
+        self.assertEqual(result.type_, 'eTick.')
+        self.assertIsInstance(data, VtTickData)
+        self.assertEqual(data.vtSymbol, 'rb1810')
+        self.assertEqual(data.lastPrice, 3500.0)
+        self.assertEqual(data.volume, 12)
+        self.assertEqual(data.datetime, tick.datetime)
+        self.assertEqual(data.extra, u'附加属性')
+        self.assertIsNone(data.rawData)
+    
+    #----------------------------------------------------------------------
+    def testNonEmptyDefault(self):
+        """非空默认值的字段总是编码"""
+        log = VtLogData()
+        log.logTime = '09:00:00'
+        
+        data = vtCodec.unpack(vtCodec.pack(log))
+        self.assertEqual(data.logTime, '09:00:00')
+    
+    #----------------------------------------------------------------------
+    def testNumpy(self):
+        """numpy数值和数组转换为Python对象"""
+        d = {'pos': np.int64(3), 'price': np.float64(1.5), 
+             'array': np.array([1.0, 2.0])}
+        
+        result = vtCodec.unpack(vtCodec.pack(d))
+        self.assertEqual(result, {'pos': 3, 'price': 1.5, 'array': [1.0, 2.0]})
+    
+    #----------------------------------------------------------------------
+    def testSpread(self):
+        """价差对象和其中的腿"""
+        leg = StLeg()
+        leg.vtSymbol = 'IF1809'
+        leg.ratio = 1
+        leg.bidPrice = 3600.0
+        
+        spread = StSpread()
+        spread.name = u'价差'
+        spread.addActiveLeg(leg)
+        spread.initSpread()
+        spread.netPos = -2
+        
+        data = vtCodec.unpack(vtCodec.pack(spread))
+        self.assertIsInstance(data, StSpread)
+        self.assertEqual(data.name, u'价差')
+        self.assertEqual(data.netPos, -2)
+        self.assertIsInstance(data.activeLeg, StLeg)
+        self.assertEqual(data.activeLeg.bidPrice, 3600.0)
+        self.assertEqual([l.vtSymbol for l in data.allLegs], ['IF1809'])
+    
+    #----------------------------------------------------------------------
+    def testUnregisteredObject(self):
+        """未注册的对象不能编码"""
+        class Unknown(object):
+            pass
+        
+        self.assertRaises(TypeError, vtCodec.pack, {'data': Unknown()})
+    
+    #----------------------------------------------------------------------
+    def testUnknownExtType(self):
+        """未知的扩展类型不会被反序列化执行"""
+        payload = b"cos\nsystem\n(S'echo PWNED'\ntR."
+        
+        result = vtCodec.unpack(packb(ExtType(3, payload)))
+        self.assertEqual(result, ExtType(3, payload))
+    
+    #----------------------------------------------------------------------
+    def testRegisterConflict(self):
+        """已被其他类使用的编号不能注册"""
+        self.assertRaises(ValueError, vtCodec.registerClass, 10, StLeg)
+        self.assertRaises(ValueError, vtCodec.registerClass, 3, StLeg)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+# encoding: UTF-8
+
+"""委托成交历史数据保留和归档、持仓冻结量测试"""
+
+import random
+import unittest
+
+from vnpy.trader.vtConstant import (DIRECTION_LONG, DIRECTION_SHORT,
+                                    OFFSET_OPEN, OFFSET_CLOSE,
+                                    OFFSET_CLOSETODAY, OFFSET_CLOSEYESTERDAY,
+                                    STATUS_PARTTRADED, STATUS_ALLTRADED, STATUS_CANCELLED)
+from vnpy.trader.vtObject import (VtOrderData, VtOrderReq, VtTradeData,
+                                  VtPositionData)
+from vnpy.trader.vtEngine import DataHistory, PositionDetail
+
+
+#----------------------------------------------------------------------
+def makeOrder(vtOrderID):
+    """创建委托"""
+    order = VtOrderData()
+    order.vtOrderID = vtOrderID
+    order.orderID = vtOrderID
+    order.volume = 1
+    return order
+
+
+########################################################################
+class DataHistoryTest(unittest.TestCase):
+    """保留上限和归档查询"""
+
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        """删除归档文件"""
+        for history in getattr(self, 'historyList', []):
+            history.close()
+
+    #----------------------------------------------------------------------
+    def createHistory(self, size=0, expiry=0):
+        """创建历史数据对象"""
+        dataDict = {}
+        history = DataHistory(dataDict, 'Test', size, expiry)
+        self.historyList = getattr(self, 'historyList', []) + [history]
+        return dataDict, history
+
+    #----------------------------------------------------------------------
+    def testUnbounded(self):
+        """默认不限制时所有数据都保留在字典中"""
+        dataDict, history = self.createHistory()
+
+        for i in range(100):
+            key = 'CTP.%s' %i
+            dataDict[key] = makeOrder(key)
+            history.add(key)
+
+        self.assertEqual(len(dataDict), 100)
+        self.assertIsNone(history.shelf)
+
+    #----------------------------------------------------------------------
+    def testArchive(self):
+        """超出数量的数据从字典移除后仍然可以按关键字查询"""
+        dataDict, history = self.createHistory(size=10)
+
+        for i in range(100):
+            key = u'CTP.%s' %i
+            dataDict[key] = makeOrder(key)
+            history.add(key)
+
+        self.assertEqual(len(dataDict), 10)
+        self.assertEqual(history.archiveCount, 90)
+
+        for i in range(100):
+            key = u'CTP.%s' %i
+            order = history.get(key)
+            self.assertIsNotNone(order)
+            self.assertEqual(order.vtOrderID, key)
+
+        self.assertIsNone(history.get('CTP.100'))
+
+    #----------------------------------------------------------------------
+    def testDiscard(self):
+        """重新变为活动状态的数据不会被归档"""
+        dataDict, history = self.createHistory(size=1)
+
+        for key in ['a', 'b']:
+            dataDict[key] = makeOrder(key)
+            history.add(key)
+        history.discard('b')
+
+        dataDict['c'] = makeOrder('c')
+        history.add('c')
+
+        self.assertIn('b', dataDict)
+        self.assertIn('c', dataDict)
+        self.assertNotIn('a', dataDict)
+        self.assertEqual(history.get('a').vtOrderID, 'a')
+
+
+########################################################################
+class PositionFrozenTest(unittest.TestCase):
+    """增量维护的冻结量和遍历活动委托全量计算的结果一致"""
+
+    #----------------------------------------------------------------------
+    def calculateFrozen(self, detail):
+        """遍历活动委托计算今昨冻结，平今平昨委托先于平仓委托统计"""
+        frozen = {DIRECTION_LONG: [0, 0], DIRECTION_SHORT: [0, 0]}
+        offsetOrder = {OFFSET_CLOSETODAY: 0, OFFSET_CLOSEYESTERDAY: 0, OFFSET_CLOSE: 1}
+
+        orderList = [order for order in detail.workingOrderDict.values()
+                     if order.offset in offsetOrder]
+        orderList.sort(key=lambda order: offsetOrder[order.offset])
+
+        for order in orderList:
+            frozenVolume = order.totalVolume - order.tradedVolume
+
+            # 多头委托冻结空头持仓
+            if order.direction == DIRECTION_LONG:
+                td = detail.shortTd
+            else:
+                td = detail.longTd
+            l = frozen[order.direction]
+
+            if order.offset == OFFSET_CLOSETODAY:
+                l[0] += frozenVolume
+            elif order.offset == OFFSET_CLOSEYESTERDAY:
+                l[1] += frozenVolume
+            else:
+                l[0] += frozenVolume
+                if l[0] > td:
+                    l[1] += l[0] - td
+                    l[0] = td
+
+        return frozen
+
+    #----------------------------------------------------------------------
+    def assertFrozen(self, detail):
+        """检查冻结量"""
+        self.assertTrue(detail.checkFrozen())
+
+        frozen = self.calculateFrozen(detail)
+        resultList = [(DIRECTION_LONG, detail.shortTd, detail.shortTdFrozen, detail.shortYdFrozen),
+                      (DIRECTION_SHORT, detail.longTd, detail.longTdFrozen, detail.longYdFrozen)]
+
+        for direction, td, tdFrozen, ydFrozen in resultList:
+            expectedTd, expectedYd = frozen[direction]
+            self.assertEqual(tdFrozen + ydFrozen, expectedTd + expectedYd)
+
+            # 平今委托量超过今仓时逐个统计的结果和委托顺序有关，只比较总量
+            todayVolume = sum([order.totalVolume - order.tradedVolume
+                               for order in detail.workingOrderDict.values()
+                               if order.direction == direction and order.offset == OFFSET_CLOSETODAY])
+            if todayVolume <= td:
+                self.assertEqual((tdFrozen, ydFrozen), (expectedTd, expectedYd))
+
+        self.assertEqual(detail.longPosFrozen, detail.longTdFrozen + detail.longYdFrozen)
+        self.assertEqual(detail.shortPosFrozen, detail.shortTdFrozen + detail.shortYdFrozen)
+
+    #----------------------------------------------------------------------
+    def testRandom(self):
+        """随机发单、成交、撤单和持仓更新"""
+        rng = random.Random(1)
+        detail = PositionDetail('IF1809')
+
+        for direction in (DIRECTION_LONG, DIRECTION_SHORT):
+            pos = VtPositionData()
+            pos.direction = direction
+            pos.position = 50
+            pos.ydPosition = 30
+            detail.updatePosition(pos)
+
+        offsetList = [OFFSET_OPEN, OFFSET_CLOSE, OFFSET_CLOSETODAY, OFFSET_CLOSEYESTERDAY]
+        workingList = []
+        frozenCount = 0
+
+        for i in range(2000):
+            action = rng.random()
+
+            # 发单
+            if action < 0.4 or not workingList:
+                req = VtOrderReq()
+                req.vtSymbol = detail.vtSymbol
+                req.direction = rng.choice([DIRECTION_LONG, DIRECTION_SHORT])
+                req.offset = rng.choice(offsetList)
+                req.volume = rng.randint(1, 5)
+
+                vtOrderID = str(i)
+                detail.updateOrderReq(req, vtOrderID)
+                workingList.append(vtOrderID)
+            else:
+                vtOrderID = rng.choice(workingList)
+                order = detail.workingOrderDict[vtOrderID]
+                order.vtOrderID = vtOrderID
+                remaining = order.totalVolume - order.tradedVolume
+
+                # 成交，先推送委托再推送成交
+                if action < 0.8:
+                    volume = rng.randint(1, remaining)
+                    order.tradedVolume += volume
+                    if order.tradedVolume == order.totalVolume:
+                        order.status = STATUS_ALLTRADED
+                        workingList.remove(vtOrderID)
+                    else:
+                        order.status = STATUS_PARTTRADED
+                    detail.updateOrder(order)
+
+                    trade = VtTradeData()
+                    trade.direction = order.direction
+                    trade.offset = order.offset
+                    trade.volume = volume
+                    trade.price = 3000
+                    detail.updateTrade(trade)
+                # 撤单
+                else:
+                    order.status = STATUS_CANCELLED
+                    workingList.remove(vtOrderID)
+                    detail.updateOrder(order)
+
+            self.assertFrozen(detail)
+            frozenCount += bool(detail.longYdFrozen and detail.shortTdFrozen)
+
+        self.assertGreater(frozenCount, 0)
+        self.assertEqual(sorted(detail.workingOrderDict.keys()), sorted(workingList))
+
+
+if __name__ == '__main__':
+    unittest.main()
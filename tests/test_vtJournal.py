@@ -0,0 +1,115 @@
+# encoding: UTF-8
+
+"""行情数据追加日志测试"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from vnpy.trader.vtObject import VtTickData
+from vnpy.trader.vtStore import HistoryStore, DATATYPE_TICK
+from vnpy.trader.vtJournal import DataJournal, getRecordDtype
+
+
+#----------------------------------------------------------------------
+def makeTickList(start, count):
+    """创建行情列表"""
+    l = []
+    for i in range(count):
+        tick = VtTickData()
+        tick.symbol = 'rb1810'
+        tick.exchange = 'SHFE'
+        tick.vtSymbol = 'rb1810'
+        tick.datetime = start + timedelta(seconds=i * 0.5)
+        tick.date = tick.datetime.strftime('%Y%m%d')
+        tick.time = tick.datetime.strftime('%H:%M:%S.%f')
+        tick.lastPrice = 3000 + i
+        tick.volume = 100 * i
+        tick.bidPrice1 = 2999 + i
+        tick.askPrice1 = 3001 + i
+        tick.bidVolume1 = i % 7
+        l.append(tick)
+    return l
+
+
+########################################################################
+class DataJournalTest(unittest.TestCase):
+    """写入后读取的数据与原始数据一致"""
+
+    #----------------------------------------------------------------------
+    def setUp(self):
+        """创建临时目录"""
+        self.path = tempfile.mkdtemp()
+        self.journal = DataJournal(os.path.join(self.path, 'journal'))
+
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        """删除临时目录"""
+        self.journal.close()
+        shutil.rmtree(self.path)
+
+    #----------------------------------------------------------------------
+    def assertTickEqual(self, tickList, dataList):
+        """逐条比较行情"""
+        self.assertEqual(len(tickList), len(dataList))
+        for tick, data in zip(tickList, dataList):
+            for field in ['datetime', 'date', 'time', 'lastPrice', 'volume',
+                          'bidPrice1', 'askPrice1', 'bidVolume1', 'askVolume5']:
+                self.assertEqual(getattr(tick, field), getattr(data, field))
+            self.assertEqual(data.vtSymbol, tick.vtSymbol)
+
+    #----------------------------------------------------------------------
+    def testRoundTrip(self):
+        """跨日写入并按时间范围读取"""
+        tickList = makeTickList(datetime(2018, 7, 2, 23, 59), 300)
+        for tick in tickList:
+            self.journal.append('tick', tick.vtSymbol, tick)
+
+        self.assertEqual(len(self.journal.getDateList('tick', 'rb1810')), 2)
+        self.assertTickEqual(tickList, self.journal.loadData('tick', 'rb1810'))
+
+        start = tickList[50].datetime
+        end = tickList[200].datetime
+        self.assertTickEqual(tickList[50:200], self.journal.loadData('tick', 'rb1810', start, end))
+        self.assertTickEqual(tickList[50:201],
+                             self.journal.loadData('tick', 'rb1810', start, end, includeEnd=True))
+
+    #----------------------------------------------------------------------
+    def testTornRecord(self):
+        """崩溃产生的不完整记录被忽略，重新打开后追加的记录不受影响"""
+        tickList = makeTickList(datetime(2018, 7, 2, 9), 10)
+        for tick in tickList[:5]:
+            self.journal.append('tick', tick.vtSymbol, tick)
+        self.journal.close()
+
+        # 模拟崩溃时写了一半的记录
+        filePath = self.journal.getFilePath('tick', 'rb1810', '20180702')
+        with open(filePath, 'ab') as f:
+            f.write(b'\x01' * (getRecordDtype(DATATYPE_TICK).itemsize // 2))
+        self.assertTickEqual(tickList[:5], self.journal.loadData('tick', 'rb1810'))
+
+        journal = DataJournal(self.journal.path)
+        for tick in tickList[5:]:
+            journal.append('tick', tick.vtSymbol, tick)
+        journal.close()
+
+        self.assertEqual(os.path.getsize(filePath) % getRecordDtype(DATATYPE_TICK).itemsize, 0)
+        self.assertTickEqual(tickList, journal.loadData('tick', 'rb1810'))
+
+    #----------------------------------------------------------------------
+    def testCompact(self):
+        """合并到HistoryStore后数据一致，没有新写入时不重复合并"""
+        tickList = makeTickList(datetime(2018, 7, 2, 23, 59), 300)
+        for tick in tickList:
+            self.journal.append('tick', tick.vtSymbol, tick)
+
+        store = HistoryStore(os.path.join(self.path, 'store'))
+        self.assertEqual(self.journal.compact(store), 300)
+        self.assertEqual(self.journal.compact(store), 0)
+        self.assertTickEqual(tickList, store.loadData('tick', 'rb1810'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# encoding: UTF-8
+
+"""按列存储的历史数据库测试"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from vnpy.trader.vtStore import (HistoryStore, DATATYPE_BAR, saveSnapshot,
+                                 loadSnapshot, makeDataList)
+
+
+FIELD_LIST = ['datetime', 'date', 'time', 'open', 'high', 'low', 'close',
+              'volume', 'openInterest', 'vtSymbol', 'symbol', 'exchange']
+
+
+#----------------------------------------------------------------------
+def makeBarList(start, count, seed=1):
+    """创建K线字典列表（和数据库中保存的格式一致）"""
+    rng = random.Random(seed)
+    l = []
+    for i in range(count):
+        dt = start + timedelta(minutes=i * 7)
+        price = 3000 + rng.randint(-50, 50)
+        l.append({
+            'vtSymbol': 'rb1810',
+            'symbol': 'rb1810',
+            'exchange': 'SHFE',
+            'datetime': dt,
+            'date': dt.strftime('%Y%m%d'),
+            'time': dt.strftime('%H:%M:%S'),
+            'open': price,
+            'high': price + rng.randint(0, 5),
+            'low': price - rng.randint(0, 5),
+            'close': price + rng.randint(-5, 5),
+            'volume': rng.randint(1, 1000),
+            'openInterest': rng.randint(1000, 2000)
+        })
+    return l
+
+
+#----------------------------------------------------------------------
+def queryList(barList, start=None, end=None, includeEnd=False):
+    """按数据库查询的语义逐条筛选"""
+    l = []
+    for d in barList:
+        if start and d['datetime'] < start:
+            continue
+        if end and (d['datetime'] > end or (d['datetime'] == end and not includeEnd)):
+            continue
+        l.append(d)
+    return sorted(l, key=lambda d: d['datetime'])
+
+
+########################################################################
+class HistoryStoreTest(unittest.TestCase):
+    """读取结果和逐条筛选原始数据的结果一致"""
+
+    #----------------------------------------------------------------------
+    def setUp(self):
+        """创建临时目录"""
+        self.path = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.path, 'store'))
+
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.path)
+
+    #----------------------------------------------------------------------
+    def assertBarEqual(self, barList, dataList):
+        """逐条比较K线"""
+        self.assertEqual(len(barList), len(dataList))
+        for d, data in zip(barList, dataList):
+            for field in FIELD_LIST:
+                self.assertEqual(d[field], getattr(data, field))
+
+    #----------------------------------------------------------------------
+    def testQuery(self):
+        """跨多个分区按时间范围读取"""
+        barList = makeBarList(datetime(2018, 7, 2, 9), 1000)
+        self.store.insertData('bar', 'rb1810', barList, DATATYPE_BAR)
+
+        self.assertEqual(len(self.store.getPartitionList('bar', 'rb1810')), 6)
+        self.assertBarEqual(barList, self.store.loadData('bar', 'rb1810'))
+
+        rng = random.Random(2)
+        for i in range(20):
+            start, end = sorted(rng.sample(barList, 2), key=lambda d: d['datetime'])
+            start = start['datetime']
+            end = end['datetime']
+            includeEnd = bool(i % 2)
+
+            self.assertBarEqual(queryList(barList, start, end, includeEnd),
+                                self.store.loadData('bar', 'rb1810', start, end, includeEnd))
+            self.assertBarEqual(queryList(barList, start=start),
+                                self.store.loadData('bar', 'rb1810', start=start))
+            self.assertBarEqual(queryList(barList, end=end),
+                                self.store.loadData('bar', 'rb1810', end=end))
+
+        self.assertEqual(self.store.loadData('bar', 'rb1810', datetime(2019, 1, 1)), [])
+        self.assertEqual(self.store.loadData('bar', 'rb1811'), [])
+
+    #----------------------------------------------------------------------
+    def testMerge(self):
+        """乱序分批插入后按时间排序，相同时间戳的数据被新数据覆盖"""
+        barList = makeBarList(datetime(2018, 7, 2, 9), 600)
+        newList = makeBarList(datetime(2018, 7, 2, 9), 600, seed=3)[100:200]
+
+        self.store.insertData('bar', 'rb1810', barList[300:], DATATYPE_BAR)
+        self.store.insertData('bar', 'rb1810', barList[:300], DATATYPE_BAR)
+        self.store.insertData('bar', 'rb1810', newList, DATATYPE_BAR)
+
+        expected = barList[:100] + newList + barList[200:]
+        self.assertBarEqual(expected, self.store.loadData('bar', 'rb1810'))
+
+    #----------------------------------------------------------------------
+    def testSnapshot(self):
+        """快照保存后以内存映射载入，数据不变"""
+        barList = makeBarList(datetime(2018, 7, 2, 9), 500)
+        self.store.insertData('bar', 'rb1810', barList, DATATYPE_BAR)
+
+        arrayDict = self.store.loadArray('bar', 'rb1810')
+        snapshotPath = os.path.join(self.path, 'snapshot')
+        saveSnapshot(snapshotPath, arrayDict)
+
+        self.assertBarEqual(barList, makeDataList(loadSnapshot(snapshotPath)))
+
+
+if __name__ == '__main__':
+    unittest.main()
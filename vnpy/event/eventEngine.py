@@ -3,9 +3,9 @@
 # 系统模块
 from __future__ import print_function
 from queue import Queue, Empty
-from threading import Thread
+from threading import Thread, Lock
 from time import sleep
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 # 第三方模块
 from qtpy.QtCore import QTimer
@@ -15,7 +15,183 @@ from .eventType import *
 
 
 ########################################################################
-class EventEngine(object):
+class EventEngineBase(object):
+    """
+    事件引擎基类，负责处理函数的注册和调用
+    
+    包括事件类型处理函数、通用处理函数、快照处理函数（快照合并模式）以及
+    事件监控器的时间戳记录，具体的队列和线程由子类实现：
+    
+    子类的put中先调用prepareEvent，返回True时再将事件存入自己的队列；
+    处理线程中取出事件后调用processEvent。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        # 这里的__handlers是一个字典，用来保存对应的事件调用关系
+        # 其中每个键对应的值是一个列表，列表中保存了对该事件进行监听的函数功能
+        self.__handlers = defaultdict(list)
+        
+        # __generalHandlers是一个列表，用来保存通用回调函数（所有事件均调用）
+        self.__generalHandlers = []
+        
+        # 事件监控器，默认关闭
+        self.__monitor = None
+        
+        # 快照合并模式，开启后快照处理函数只会收到每个合约最新的行情
+        self.__conflation = False
+        self.__conflator = SnapshotConflator()
+    
+    #----------------------------------------------------------------------
+    def prepareEvent(self, event):
+        """
+        事件存入队列前的处理，返回是否需要将事件存入队列
+        开启监控时记录时间戳，快照处理函数监听的事件先合并，若没有其他处理函数则不再进入队列
+        """
+        if self.__monitor:
+            self.__monitor.stamp(event)
+        
+        if event.type_ in self.__conflator.handlers:
+            marker = self.__conflator.put(event)
+            if marker:
+                self.put(marker)
+            
+            if event.type_ not in self.__handlers and not self.__generalHandlers:
+                return False
+        
+        return True
+    
+    #----------------------------------------------------------------------
+    def processEvent(self, event, callType=True, callGeneral=True):
+        """
+        处理事件
+        callType：是否调用该事件类型的处理函数
+        callGeneral：是否调用通用处理函数
+        """
+        # 快照合并事件只调用快照处理函数
+        if event.type_ == EVENT_SNAPSHOT:
+            self.processSnapshot(event)
+            return
+        
+        # 开启监控时记录等待时间和处理函数耗时
+        monitor = self.__monitor
+        
+        # 检查是否存在对该事件进行监听的处理函数
+        if callType:
+            if monitor:
+                monitor.recordWait(event)
+            
+            if event.type_ in self.__handlers:
+                # 若存在，则按顺序将事件传递给处理函数执行
+                if monitor:
+                    monitor.callHandlers(event, self.__handlers[event.type_])
+                else:
+                    [handler(event) for handler in self.__handlers[event.type_]]
+        
+        # 调用通用处理函数进行处理
+        if callGeneral and self.__generalHandlers:
+            if monitor:
+                monitor.callHandlers(event, self.__generalHandlers)
+            else:
+                [handler(event) for handler in self.__generalHandlers]
+    
+    #----------------------------------------------------------------------
+    def processSnapshot(self, event):
+        """处理快照合并事件，将最新的事件传递给快照处理函数"""
+        event = self.__conflator.pop(event)
+        if not event:
+            return
+        
+        handlerList = self.__conflator.getHandlers(event.type_)
+        if self.__monitor:
+            self.__monitor.callHandlers(event, handlerList)
+        else:
+            [handler(event) for handler in handlerList]
+    
+    #----------------------------------------------------------------------
+    def put(self, event):
+        """向事件队列中存入事件"""
+        raise NotImplementedError
+    
+    #----------------------------------------------------------------------
+    def register(self, type_, handler):
+        """注册事件处理函数监听"""
+        # 尝试获取该事件类型对应的处理函数列表，若无defaultDict会自动创建新的list
+        handlerList = self.__handlers[type_]
+        
+        # 若要注册的处理器不在该事件的处理器列表中，则注册该事件
+        if handler not in handlerList:
+            handlerList.append(handler)
+            
+    #----------------------------------------------------------------------
+    def unregister(self, type_, handler):
+        """注销事件处理函数监听"""
+        # 尝试获取该事件类型对应的处理函数列表，若无则忽略该次注销请求   
+        handlerList = self.__handlers[type_]
+            
+        # 如果该函数存在于列表中，则移除
+        if handler in handlerList:
+            handlerList.remove(handler)
+
+        # 如果函数列表为空，则从引擎中移除该事件类型
+        if not handlerList:
+            del self.__handlers[type_]
+    
+    #----------------------------------------------------------------------
+    def registerGeneralHandler(self, handler):
+        """注册通用事件处理函数监听"""
+        if handler not in self.__generalHandlers:
+            self.__generalHandlers.append(handler)
+            
+    #----------------------------------------------------------------------
+    def unregisterGeneralHandler(self, handler):
+        """注销通用事件处理函数监听"""
+        if handler in self.__generalHandlers:
+            self.__generalHandlers.remove(handler)
+    
+    #----------------------------------------------------------------------
+    def hasGeneralHandler(self):
+        """是否注册了通用事件处理函数"""
+        return bool(self.__generalHandlers)
+    
+    #----------------------------------------------------------------------
+    def setConflation(self, conflation):
+        """设置快照合并模式（需在注册快照处理函数前调用）"""
+        self.__conflation = conflation
+    
+    #----------------------------------------------------------------------
+    def registerSnapshotHandler(self, type_, handler):
+        """
+        注册快照处理函数监听
+        快照处理函数只关心每个合约的最新数据（如界面监控、最新行情缓存），
+        合并模式下积压的同一合约旧行情会被丢弃，未开启合并模式或事件类型
+        不允许合并（委托、成交等）时等同于register
+        """
+        if self.__conflation and self.__conflator.isConflatable(type_):
+            self.__conflator.register(type_, handler)
+        else:
+            self.register(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def unregisterSnapshotHandler(self, type_, handler):
+        """注销快照处理函数监听"""
+        self.__conflator.unregister(type_, handler)
+        self.unregister(type_, handler)
+    
+    #----------------------------------------------------------------------
+    def getConflationStatus(self):
+        """查询快照合并状态"""
+        return self.__conflator.getStatus()
+    
+    #----------------------------------------------------------------------
+    def setMonitor(self, monitor):
+        """设置事件监控器，传入None则关闭监控"""
+        self.__monitor = monitor
+
+
+########################################################################
+class EventEngine(EventEngineBase):
     """
     事件驱动引擎
     事件驱动引擎中所有的变量都设置为了私有，这是为了防止不小心
@@ -26,12 +202,10 @@ class EventEngine(object):
     __active：私有变量，事件引擎开关
     __thread：私有变量，事件处理线程
     __timer：私有变量，计时器
-    __handlers：私有变量，事件处理函数字典
     
     
     方法说明
     __run: 私有方法，事件处理线程连续运行用
-    __process: 私有方法，处理事件，调用注册在引擎中的监听函数
     __onTimer：私有方法，计时器固定事件间隔触发后，向事件队列中存入计时器事件
     start: 公共方法，启动引擎
     stop：公共方法，停止引擎
@@ -39,6 +213,8 @@ class EventEngine(object):
     unregister：公共方法，向引擎中注销监听函数
     put：公共方法，向事件队列中存入新的事件
     
+    处理函数的注册和调用由EventEngineBase实现。
+    
     事件监听函数必须定义为输入参数仅为一个event对象，即：
     
     函数
@@ -54,6 +230,8 @@ class EventEngine(object):
     #----------------------------------------------------------------------
     def __init__(self):
         """初始化事件引擎"""
+        super(EventEngine, self).__init__()
+        
         # 事件队列
         self.__queue = Queue()
         
@@ -67,39 +245,16 @@ class EventEngine(object):
         self.__timer = QTimer()
         self.__timer.timeout.connect(self.__onTimer)
         
-        # 这里的__handlers是一个字典，用来保存对应的事件调用关系
-        # 其中每个键对应的值是一个列表，列表中保存了对该事件进行监听的函数功能
-        self.__handlers = defaultdict(list)
-        
-        # __generalHandlers是一个列表，用来保存通用回调函数（所有事件均调用）
-        self.__generalHandlers = []
-        
     #----------------------------------------------------------------------
     def __run(self):
         """引擎运行"""
         while self.__active == True:
             try:
                 event = self.__queue.get(block = True, timeout = 1)  # 获取事件的阻塞时间设为1秒
-                self.__process(event)
+                self.processEvent(event)
             except Empty:
                 pass
-            
-    #----------------------------------------------------------------------
-    def __process(self, event):
-        """处理事件"""
-        # 检查是否存在对该事件进行监听的处理函数
-        if event.type_ in self.__handlers:
-            # 若存在，则按顺序将事件传递给处理函数执行
-            [handler(event) for handler in self.__handlers[event.type_]]
-            
-            # 以上语句为Python列表解析方式的写法，对应的常规循环写法为：
-            #for handler in self.__handlers[event.type_]:
-                #handler(event) 
-        
-        # 调用通用处理函数进行处理
-        if self.__generalHandlers:
-            [handler(event) for handler in self.__generalHandlers]
-               
+    
     #----------------------------------------------------------------------
     def __onTimer(self):
         """向事件队列中存入计时器事件"""
@@ -136,52 +291,22 @@ class EventEngine(object):
         
         # 等待事件处理线程退出
         self.__thread.join()
-            
-    #----------------------------------------------------------------------
-    def register(self, type_, handler):
-        """注册事件处理函数监听"""
-        # 尝试获取该事件类型对应的处理函数列表，若无defaultDict会自动创建新的list
-        handlerList = self.__handlers[type_]
-        
-        # 若要注册的处理器不在该事件的处理器列表中，则注册该事件
-        if handler not in handlerList:
-            handlerList.append(handler)
-            
-    #----------------------------------------------------------------------
-    def unregister(self, type_, handler):
-        """注销事件处理函数监听"""
-        # 尝试获取该事件类型对应的处理函数列表，若无则忽略该次注销请求   
-        handlerList = self.__handlers[type_]
-            
-        # 如果该函数存在于列表中，则移除
-        if handler in handlerList:
-            handlerList.remove(handler)
-
-        # 如果函数列表为空，则从引擎中移除该事件类型
-        if not handlerList:
-            del self.__handlers[type_]
-            
+    
     #----------------------------------------------------------------------
     def put(self, event):
         """向事件队列中存入事件"""
-        self.__queue.put(event)
-        
-    #----------------------------------------------------------------------
-    def registerGeneralHandler(self, handler):
-        """注册通用事件处理函数监听"""
-        if handler not in self.__generalHandlers:
-            self.__generalHandlers.append(handler)
-            
+        if self.prepareEvent(event):
+            self.__queue.put(event)
+    
     #----------------------------------------------------------------------
-    def unregisterGeneralHandler(self, handler):
-        """注销通用事件处理函数监听"""
-        if handler in self.__generalHandlers:
-            self.__generalHandlers.remove(handler)
-        
+    def getQueueSize(self):
+        """查询事件队列中等待处理的事件数量"""
+        return self.__queue.qsize()
+
 
 
 ########################################################################
-class EventEngine2(object):
+class EventEngine2(EventEngineBase):
     """
     计时器使用python线程的事件驱动引擎        
     """
@@ -189,6 +314,8 @@ class EventEngine2(object):
     #----------------------------------------------------------------------
     def __init__(self):
         """初始化事件引擎"""
+        super(EventEngine2, self).__init__()
+        
         # 事件队列
         self.__queue = Queue()
         
@@ -203,39 +330,16 @@ class EventEngine2(object):
         self.__timerActive = False                      # 计时器工作状态
         self.__timerSleep = 1                           # 计时器触发间隔（默认1秒）        
         
-        # 这里的__handlers是一个字典，用来保存对应的事件调用关系
-        # 其中每个键对应的值是一个列表，列表中保存了对该事件进行监听的函数功能
-        self.__handlers = defaultdict(list)
-        
-        # __generalHandlers是一个列表，用来保存通用回调函数（所有事件均调用）
-        self.__generalHandlers = []        
-        
     #----------------------------------------------------------------------
     def __run(self):
         """引擎运行"""
         while self.__active == True:
             try:
                 event = self.__queue.get(block = True, timeout = 1)  # 获取事件的阻塞时间设为1秒
-                self.__process(event)
+                self.processEvent(event)
             except Empty:
                 pass
-            
-    #----------------------------------------------------------------------
-    def __process(self, event):
-        """处理事件"""
-        # 检查是否存在对该事件进行监听的处理函数
-        if event.type_ in self.__handlers:
-            # 若存在，则按顺序将事件传递给处理函数执行
-            [handler(event) for handler in self.__handlers[event.type_]]
-            
-            # 以上语句为Python列表解析方式的写法，对应的常规循环写法为：
-            #for handler in self.__handlers[event.type_]:
-                #handler(event) 
-                
-        # 调用通用处理函数进行处理
-        if self.__generalHandlers:
-            [handler(event) for handler in self.__generalHandlers]        
-               
+    
     #----------------------------------------------------------------------
     def __runTimer(self):
         """运行在计时器线程中的循环函数"""
@@ -273,52 +377,351 @@ class EventEngine2(object):
         self.__active = False
         
         # 停止计时器
-        self.__timerActive = False
-        self.__timer.join()
+        if self.__timerActive:
+            self.__timerActive = False
+            self.__timer.join()
         
         # 等待事件处理线程退出
         self.__thread.join()
-            
+        
     #----------------------------------------------------------------------
-    def register(self, type_, handler):
-        """注册事件处理函数监听"""
-        # 尝试获取该事件类型对应的处理函数列表，若无defaultDict会自动创建新的list
-        handlerList = self.__handlers[type_]
+    def put(self, event):
+        """向事件队列中存入事件"""
+        if self.prepareEvent(event):
+            self.__queue.put(event)
+    
+    #----------------------------------------------------------------------
+    def getQueueSize(self):
+        """查询事件队列中等待处理的事件数量"""
+        return self.__queue.qsize()
+
+
+########################################################################
+class SnapshotConflator(object):
+    """
+    快照事件合并器
+    
+    对快照处理函数监听的事件，按照(事件类型, vtSymbol)只保留最新的一个，
+    并向队列中存入一个快照合并事件作为通知。处理快照合并事件时取出最新的
+    事件传递给快照处理函数，因此行情爆发时同一合约在队列中最多只有一个
+    待处理的快照，内存占用有上限。
+    """
+    
+    # 允许合并的事件类型前缀，对应vnpy.trader.vtEvent中的行情事件，委托成交等不允许合并
+    PREFIX_LIST = ['eTick.']
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.handlers = defaultdict(list)   # 事件类型:快照处理函数列表
+        self.latestDict = {}                # (事件类型, vtSymbol):最新事件
+        self.lock = Lock()
         
-        # 若要注册的处理器不在该事件的处理器列表中，则注册该事件
+        self.count = 0                      # 被合并丢弃的事件数量
+    
+    #----------------------------------------------------------------------
+    def isConflatable(self, type_):
+        """检查事件类型是否允许合并"""
+        for prefix in self.PREFIX_LIST:
+            if type_.startswith(prefix):
+                return True
+        return False
+    
+    #----------------------------------------------------------------------
+    def register(self, type_, handler):
+        """注册快照处理函数"""
+        handlerList = self.handlers[type_]
         if handler not in handlerList:
             handlerList.append(handler)
-            
+    
     #----------------------------------------------------------------------
     def unregister(self, type_, handler):
-        """注销事件处理函数监听"""
-        # 尝试获取该事件类型对应的处理函数列表，若无则忽略该次注销请求   
-        handlerList = self.__handlers[type_]
-            
-        # 如果该函数存在于列表中，则移除
+        """注销快照处理函数"""
+        if type_ not in self.handlers:
+            return
+        
+        handlerList = self.handlers[type_]
         if handler in handlerList:
             handlerList.remove(handler)
-
-        # 如果函数列表为空，则从引擎中移除该事件类型
-        if not handlerList:
-            del self.__handlers[type_]  
         
+        if not handlerList:
+            del self.handlers[type_]
+    
+    #----------------------------------------------------------------------
+    def getHandlers(self, type_):
+        """获取快照处理函数列表"""
+        return self.handlers.get(type_, [])
+    
     #----------------------------------------------------------------------
     def put(self, event):
-        """向事件队列中存入事件"""
-        self.__queue.put(event)
+        """
+        存入事件，若该合约已有待处理的快照则直接替换并返回None，
+        否则返回需要存入队列的快照合并事件
+        """
+        data = event.dict_.get('data', None)
+        key = (event.type_, getattr(data, 'vtSymbol', None))
+        
+        with self.lock:
+            pending = key in self.latestDict
+            self.latestDict[key] = event
+            
+            if pending:
+                self.count += 1
+                return None
+        
+        marker = Event(type_=EVENT_SNAPSHOT)
+        marker.dict_['key'] = key
+        return marker
+    
+    #----------------------------------------------------------------------
+    def pop(self, marker):
+        """取出快照合并事件对应的最新事件"""
+        with self.lock:
+            return self.latestDict.pop(marker.dict_['key'], None)
+    
+    #----------------------------------------------------------------------
+    def getStatus(self):
+        """查询合并状态"""
+        return {
+            'pending': len(self.latestDict),
+            'conflated': self.count
+        }
+
+
+########################################################################
+class EventLane(object):
+    """
+    事件处理通道，拥有独立的事件队列和处理线程
+    """
 
     #----------------------------------------------------------------------
-    def registerGeneralHandler(self, handler):
-        """注册通用事件处理函数监听"""
-        if handler not in self.__generalHandlers:
-            self.__generalHandlers.append(handler)
+    def __init__(self, name, process):
+        """
+        Constructor
+        name：通道名称
+        process：处理函数，输入参数为(lane, event, callType)
+        """
+        self.name = name
+        self.process = process
+        
+        self.queue = Queue()            # 事件队列
+        self.active = False             # 通道开关
+        self.thread = Thread(target=self.run)
+        
+        self.count = 0                  # 已处理的事件数量
+        self.maxDepth = 0               # 队列出现过的最大深度
+    
+    #----------------------------------------------------------------------
+    def run(self):
+        """通道运行"""
+        while self.active:
+            try:
+                event, callType = self.queue.get(block=True, timeout=1)
+                self.process(self, event, callType)
+                self.count += 1
+            except Empty:
+                pass
+    
+    #----------------------------------------------------------------------
+    def put(self, event, callType=True):
+        """
+        存入事件
+        callType为False时只调用通用处理函数（由其他通道转发过来的事件）
+        """
+        self.queue.put((event, callType))
+        
+        depth = self.queue.qsize()
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+    
+    #----------------------------------------------------------------------
+    def start(self):
+        """启动"""
+        self.active = True
+        self.thread.start()
+    
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止"""
+        self.active = False
+        self.thread.join()
+    
+    #----------------------------------------------------------------------
+    def getStatus(self):
+        """查询通道状态"""
+        return {
+            'depth': self.queue.qsize(),
+            'maxDepth': self.maxDepth,
+            'count': self.count
+        }
+    
+    #----------------------------------------------------------------------
+    def resetMaxDepth(self):
+        """重置最大深度统计"""
+        self.maxDepth = self.queue.qsize()
+
+
+########################################################################
+class LaneEventEngine(EventEngineBase):
+    """
+    分通道处理的事件驱动引擎，接口和EventEngine2一致
+    
+    EventEngine2中所有事件共用一个队列和处理线程，日志入库、数据记录、
+    界面更新等较慢的处理函数会延迟行情和委托事件推送到策略。本引擎根据
+    事件类型的前缀将事件分配到不同的通道，每个通道拥有独立的队列和线程：
+    
+    fast：行情、委托、成交等接口推送的事件
+    slow：日志、计时器等其他所有事件，通用处理函数也统一在该通道中调用
+    
+    同一事件类型总是在同一通道中按顺序处理，但不同通道的处理函数运行在
+    不同线程中，若处理函数之间共享状态则需要自行注意线程安全。
+    """
+    
+    LANE_FAST = 'fast'
+    LANE_SLOW = 'slow'
+    
+    # 默认分配到快速通道的事件类型前缀，对应vnpy.trader.vtEvent中的接口事件
+    FAST_PREFIX_LIST = ['eTick.', 'eOrder.', 'eTrade.', 'ePosition.', 
+                        'eAccount.', 'eContract.', 'eError.']
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """初始化事件引擎"""
+        super(LaneEventEngine, self).__init__()
+        
+        # 事件引擎开关
+        self.__active = False
+        
+        # 事件通道
+        self.__laneDict = OrderedDict()     # 通道名称:通道对象
+        self.__prefixList = []              # (事件类型前缀, 通道对象)
+        self.__routeDict = {}               # 事件类型:通道对象，路由结果缓存
+        
+        self.addLane(self.LANE_FAST, self.FAST_PREFIX_LIST)
+        self.addLane(self.LANE_SLOW)
+        
+        # 未匹配任何前缀的事件以及通用处理函数使用的通道
+        self.__defaultLane = self.__laneDict[self.LANE_SLOW]
+        
+        # 计时器，用于触发计时器事件
+        self.__timer = Thread(target = self.__runTimer)
+        self.__timerActive = False                      # 计时器工作状态
+        self.__timerSleep = 1                           # 计时器触发间隔（默认1秒）        
+    
+    #----------------------------------------------------------------------
+    def addLane(self, name, prefixList=None):
+        """
+        添加事件通道（需在引擎启动前调用）
+        prefixList：分配到该通道的事件类型前缀列表，匹配多个前缀时以最长的为准
+        """
+        if name not in self.__laneDict:
+            self.__laneDict[name] = EventLane(name, self.__process)
+        lane = self.__laneDict[name]
+        
+        if prefixList:
+            for prefix in prefixList:
+                self.__prefixList.append((prefix, lane))
+        
+        self.__routeDict.clear()
+    
+    #----------------------------------------------------------------------
+    def __route(self, type_):
+        """获取事件类型对应的通道"""
+        lane = self.__routeDict.get(type_, None)
+        
+        if lane is None:
+            lane = self.__defaultLane
+            length = 0
+            
+            for prefix, l in self.__prefixList:
+                if type_.startswith(prefix) and len(prefix) > length:
+                    lane = l
+                    length = len(prefix)
             
+            self.__routeDict[type_] = lane
+        
+        return lane
+    
     #----------------------------------------------------------------------
-    def unregisterGeneralHandler(self, handler):
-        """注销通用事件处理函数监听"""
-        if handler in self.__generalHandlers:
-            self.__generalHandlers.remove(handler)
+    def __process(self, lane, event, callType):
+        """处理事件"""
+        # 通用处理函数只在默认通道中调用，其他通道的事件转发过去
+        callGeneral = lane is self.__defaultLane
+        self.processEvent(event, callType, callGeneral)
+        
+        if (not callGeneral and self.hasGeneralHandler() and
+            event.type_ != EVENT_SNAPSHOT):
+            self.__defaultLane.put(event, False)
+    
+    #----------------------------------------------------------------------
+    def __runTimer(self):
+        """运行在计时器线程中的循环函数"""
+        while self.__timerActive:
+            # 创建计时器事件
+            event = Event(type_=EVENT_TIMER)
+        
+            # 向队列中存入计时器事件
+            self.put(event)    
+            
+            # 等待
+            sleep(self.__timerSleep)
+    
+    #----------------------------------------------------------------------
+    def start(self, timer=True):
+        """
+        引擎启动
+        timer：是否要启动计时器
+        """
+        # 将引擎设为启动
+        self.__active = True
+        
+        # 启动所有通道的处理线程
+        for lane in self.__laneDict.values():
+            lane.start()
+        
+        # 启动计时器，计时器事件间隔默认设定为1秒
+        if timer:
+            self.__timerActive = True
+            self.__timer.start()
+    
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止引擎"""
+        # 将引擎设为停止
+        self.__active = False
+        
+        # 停止计时器
+        if self.__timerActive:
+            self.__timerActive = False
+            self.__timer.join()
+        
+        # 等待所有通道的处理线程退出
+        for lane in self.__laneDict.values():
+            lane.stop()
+    
+    #----------------------------------------------------------------------
+    def put(self, event):
+        """向事件对应的通道中存入事件"""
+        if self.prepareEvent(event):
+            self.__route(event.type_).put(event)
+    
+    #----------------------------------------------------------------------
+    def getQueueSize(self):
+        """查询所有通道中等待处理的事件数量"""
+        return sum([lane.queue.qsize() for lane in self.__laneDict.values()])
+    
+    #----------------------------------------------------------------------
+    def getLaneStatus(self):
+        """查询各通道的队列深度等状态，返回字典，key为通道名称"""
+        d = OrderedDict()
+        for name, lane in self.__laneDict.items():
+            d[name] = lane.getStatus()
+        return d
+    
+    #----------------------------------------------------------------------
+    def getEventLane(self, type_):
+        """查询事件类型所在的通道名称"""
+        return self.__route(type_).name
 
 
 ########################################################################
@@ -330,6 +733,7 @@ class Event:
         """Constructor"""
         self.type_ = type_      # 事件类型
         self.dict_ = {}         # 字典用于保存具体的事件数据
+        self.putTime = 0        # 存入队列的时间戳（开启事件监控时记录）
 
 
 #----------------------------------------------------------------------
@@ -0,0 +1,241 @@
+# encoding: UTF-8
+
+'''
+事件引擎的延时监控
+
+开启后事件在存入队列时记录时间戳，处理时统计每种事件类型在队列中的等待时间，
+以及每个处理函数的执行耗时，用于定位拖慢行情处理的函数。监控默认关闭，
+关闭时事件引擎的处理流程不受影响。
+'''
+
+from __future__ import division
+from __future__ import print_function
+
+from time import time
+from bisect import bisect_left
+
+from .eventType import EVENT_TIMER
+
+
+# 直方图分桶上限（秒），超过最后一档的计入溢出桶
+HISTOGRAM_BOUNDS = [0.00001, 0.00005, 0.0001, 0.0005,
+                    0.001, 0.005, 0.01, 0.05,
+                    0.1, 0.5, 1.0]
+
+
+########################################################################
+class LatencyHistogram(object):
+    """延时直方图"""
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.count = 0                                      # 次数
+        self.total = 0.0                                    # 总耗时
+        self.max = 0.0                                      # 最大耗时
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)    # 分桶计数
+
+    #----------------------------------------------------------------------
+    def add(self, value):
+        """记录一次耗时（秒）"""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+
+    #----------------------------------------------------------------------
+    def getPercentile(self, percent):
+        """估算分位数，返回所在分桶的上限（溢出桶返回最大值）"""
+        if not self.count:
+            return 0.0
+
+        target = self.count * percent / 100
+        n = 0
+        for i, c in enumerate(self.buckets):
+            n += c
+            if n >= target:
+                if i < len(HISTOGRAM_BOUNDS):
+                    return min(HISTOGRAM_BOUNDS[i], self.max)
+                break
+        return self.max
+
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取统计结果，时间单位为秒"""
+        if self.count:
+            mean = self.total / self.count
+        else:
+            mean = 0.0
+
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': mean,
+            'max': self.max,
+            'p50': self.getPercentile(50),
+            'p99': self.getPercentile(99),
+            'buckets': list(zip(HISTOGRAM_BOUNDS + [None], self.buckets))
+        }
+
+
+########################################################################
+class EventMonitor(object):
+    """
+    事件引擎监控器
+
+    使用方法：
+    monitor = EventMonitor(eventEngine, interval=60, logFunc=mainEngine.writeLog)
+    monitor.start()
+
+    interval为输出汇总日志的计时器事件间隔数（0则不输出），每次输出后清空统计，
+    因此日志反映的是最近一个间隔内的情况。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, eventEngine, interval=60, logFunc=None, topN=5):
+        """Constructor"""
+        self.eventEngine = eventEngine
+        self.interval = interval            # 汇总日志间隔（计时器事件次数）
+        self.logFunc = logFunc or print     # 日志输出函数
+        self.topN = topN                    # 汇总日志中显示的条目数量
+
+        self.count = 0                      # 计时器计数
+        self.active = False
+
+        self.waitDict = {}                  # 事件类型:等待时间直方图
+        self.handlerDict = {}               # 处理函数名称:执行耗时直方图
+        self.nameDict = {}                  # 处理函数:名称，缓存
+        self.maxDepth = 0                   # 计时器采样到的最大队列深度
+
+    #----------------------------------------------------------------------
+    def start(self):
+        """启动监控"""
+        self.active = True
+        self.eventEngine.setMonitor(self)
+        self.eventEngine.register(EVENT_TIMER, self.processTimerEvent)
+
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止监控"""
+        self.active = False
+        self.eventEngine.setMonitor(None)
+        self.eventEngine.unregister(EVENT_TIMER, self.processTimerEvent)
+
+    #----------------------------------------------------------------------
+    def stamp(self, event):
+        """事件存入队列时记录时间戳"""
+        event.putTime = time()
+
+    #----------------------------------------------------------------------
+    def recordWait(self, event):
+        """记录事件在队列中的等待时间"""
+        putTime = event.putTime
+
+        # 监控启动前已经在队列中的事件没有时间戳
+        if not putTime:
+            return
+
+        histogram = self.waitDict.get(event.type_, None)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.waitDict[event.type_] = histogram
+        histogram.add(time() - putTime)
+
+    #----------------------------------------------------------------------
+    def callHandlers(self, event, handlerList):
+        """调用处理函数并记录执行耗时"""
+        for handler in handlerList:
+            start = time()
+            handler(event)
+            cost = time() - start
+
+            name = self.getHandlerName(handler)
+            histogram = self.handlerDict.get(name, None)
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self.handlerDict[name] = histogram
+            histogram.add(cost)
+
+    #----------------------------------------------------------------------
+    def getHandlerName(self, handler):
+        """获取处理函数名称，绑定方法显示为类名.方法名"""
+        name = self.nameDict.get(handler, None)
+
+        if name is None:
+            obj = getattr(handler, '__self__', None)
+            funcName = getattr(handler, '__name__', repr(handler))
+
+            if obj is not None:
+                name = '.'.join([obj.__class__.__name__, funcName])
+            else:
+                name = funcName
+
+            self.nameDict[handler] = name
+
+        return name
+
+    #----------------------------------------------------------------------
+    def getQueueDepth(self):
+        """查询事件引擎当前的队列深度"""
+        return self.eventEngine.getQueueSize()
+
+    #----------------------------------------------------------------------
+    def getWaitStats(self):
+        """查询各事件类型的队列等待时间统计，字典key为事件类型"""
+        return {type_: histogram.getStats() for type_, histogram in list(self.waitDict.items())}
+
+    #----------------------------------------------------------------------
+    def getHandlerStats(self):
+        """查询各处理函数的执行耗时统计，字典key为处理函数名称"""
+        return {name: histogram.getStats() for name, histogram in list(self.handlerDict.items())}
+
+    #----------------------------------------------------------------------
+    def reset(self):
+        """清空统计数据"""
+        self.waitDict = {}
+        self.handlerDict = {}
+        self.maxDepth = 0
+
+    #----------------------------------------------------------------------
+    def getSummary(self):
+        """生成汇总信息，返回字符串列表"""
+        l = []
+        l.append(u'事件监控：当前队列深度%s，最大队列深度%s' %(self.getQueueDepth(), self.maxDepth))
+
+        # 最大等待时间最长的事件类型
+        waitStats = self.getWaitStats()
+        typeList = sorted(waitStats.keys(), key=lambda t: waitStats[t]['max'], reverse=True)
+        for type_ in typeList[:self.topN]:
+            d = waitStats[type_]
+            l.append(u'队列等待 %s：次数%s，平均%.3fms，P99 %.3fms，最大%.3fms' %(type_, d['count'],
+                                                                           d['mean']*1000, d['p99']*1000, d['max']*1000))
+
+        # 总耗时最长的处理函数
+        handlerStats = self.getHandlerStats()
+        nameList = sorted(handlerStats.keys(), key=lambda n: handlerStats[n]['total'], reverse=True)
+        for name in nameList[:self.topN]:
+            d = handlerStats[name]
+            l.append(u'处理函数 %s：次数%s，总计%.3fms，平均%.3fms，P99 %.3fms，最大%.3fms' %(name, d['count'], d['total']*1000,
+                                                                                      d['mean']*1000, d['p99']*1000, d['max']*1000))
+
+        return l
+
+    #----------------------------------------------------------------------
+    def processTimerEvent(self, event):
+        """定时采样队列深度并输出汇总日志"""
+        depth = self.getQueueDepth()
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+
+        if not self.interval:
+            return
+
+        self.count += 1
+        if self.count < self.interval:
+            return
+        self.count = 0
+
+        for content in self.getSummary():
+            self.logFunc(content)
+        self.reset()
@@ -14,6 +14,7 @@ from __future__ import print_function
 
 
 EVENT_TIMER = 'eTimer'                  # 计时器事件，每隔1秒发送一次
+EVENT_SNAPSHOT = 'eSnapshot'            # 快照合并事件，事件引擎内部使用
  
 
 
@@ -0,0 +1,232 @@
+# encoding: UTF-8
+
+'''
+Black-Scholes期权定价模型的向量化实现，主要用于标的物为股票的欧式期权的定价
+
+变量说明
+s：标的物股票价格
+k：行权价
+r：无风险利率
+t：剩余到期时间（年）
+v：隐含波动率
+cp：期权类型，+1/-1对应call/put
+price：期权价格
+
+所有参数均可以是数值或者NumPy数组（按NumPy规则广播），传入数组时
+一次调用即可完成整条期权链或者整个组合的计算，传入数值时返回数值，
+因此也可以直接作为OptionMaster的定价模型使用。
+
+希腊值使用解析公式计算，一次调用只计算一遍d1、d2和正态分布函数，
+结果采用和bsCython一致的百分比变动数值，具体定义如下
+delta：当s变动1%时，price的变动
+gamma：当s变动1%时，delta的变动
+theta：当t变动1天时，price的变动（国内交易日每年240天）
+vega：当v涨跌1个点时，price的变动（如从16%涨到17%）
+
+其中gamma为原始gamma * s * s * 0.0001，和bs.py的数值不同：bs.py对已经转换为
+百分比数值的delta再做差分，结果相当于(原始delta + s * 原始gamma) * s * s * 0.000001，
+例如s=k=3、r=0.03、t=0.5、v=0.2的看涨期权，bs.py为3.0e-5，本文件为8.3e-4。
+price、delta、theta和vega和bs.py一致（差分误差以内），在OptionMaster中由bs切换
+到本模型时，持仓gamma的数值会发生变化。
+
+波动率或者剩余时间不大于0的期权，价格为内在价值，希腊值为0。
+'''
+
+from __future__ import division
+
+import numpy as np
+from scipy.special import ndtr as cdf
+
+
+# 支持数组参数，OptionMaster中可以按期权链批量计算
+VECTORIZED = True
+
+# 计算隐含波动率时用的参数
+DX_TARGET = 0.00001
+MAX_ITERATIONS = 50
+INITIAL_VOL = 0.3         # 无法估算初始值时使用的波动率
+MIN_VOL = 0.0001
+MAX_VOL = 10.0
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+DAYS_PER_YEAR = 240
+
+
+#----------------------------------------------------------------------
+def pdf(x):
+    """标准正态分布的概率密度"""
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+#----------------------------------------------------------------------
+def toResult(a):
+    """数值输入时返回数值，数组输入时返回数组"""
+    return a[()]
+
+#----------------------------------------------------------------------
+def prepare(s, k, r, t, v, cp):
+    """转换为数组并计算d1、d2，无效的波动率和剩余时间替换为1以避免除0"""
+    s, k, r, t, v, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                              for x in (s, k, r, t, v, cp)])
+    valid = (v > 0) & (t > 0)
+
+    vt = np.where(valid, v, 1.0)
+    tt = np.where(valid, t, 1.0)
+    sqrtT = np.sqrt(tt)
+
+    d1 = (np.log(s / k) + (r + 0.5 * vt * vt) * tt) / (vt * sqrtT)
+    d2 = d1 - vt * sqrtT
+
+    return s, k, r, tt, vt, cp, valid, sqrtT, d1, d2
+
+#----------------------------------------------------------------------
+def calculatePrice(s, k, r, t, v, cp):
+    """计算期权价格"""
+    s, k, r, t, v, cp, valid, sqrtT, d1, d2 = prepare(s, k, r, t, v, cp)
+
+    price = cp * (s * cdf(cp * d1) - k * cdf(cp * d2) * np.exp(-r * t))
+
+    # 无效的期权直接返回内在价值
+    price = np.where(valid, price, np.maximum(0, cp * (s - k)))
+    return toResult(price)
+
+#----------------------------------------------------------------------
+def calculateGreeks(s, k, r, t, v, cp):
+    """计算期权的价格和希腊值"""
+    s, k, r, t, v, cp, valid, sqrtT, d1, d2 = prepare(s, k, r, t, v, cp)
+
+    discount = np.exp(-r * t)
+    nd1 = cdf(cp * d1)
+    nd2 = cdf(cp * d2)
+    pd1 = pdf(d1)
+
+    price = cp * (s * nd1 - k * nd2 * discount)
+    delta = cp * nd1
+    gamma = pd1 / (s * v * sqrtT)
+    theta = -0.5 * s * pd1 * v / sqrtT - cp * r * k * discount * nd2
+    vega = s * pd1 * sqrtT
+
+    # 转换为百分比变动数值
+    delta = delta * s * 0.01
+    gamma = gamma * s * s * 0.0001
+    theta = theta / DAYS_PER_YEAR
+    vega = vega / 100
+
+    price = np.where(valid, price, np.maximum(0, cp * (s - k)))
+    delta = np.where(valid, delta, 0)
+    gamma = np.where(valid, gamma, 0)
+    theta = np.where(valid, theta, 0)
+    vega = np.where(valid, vega, 0)
+
+    return toResult(price), toResult(delta), toResult(gamma), toResult(theta), toResult(vega)
+
+#----------------------------------------------------------------------
+def calculateDelta(s, k, r, t, v, cp):
+    """计算Delta值"""
+    return calculateGreeks(s, k, r, t, v, cp)[1]
+
+#----------------------------------------------------------------------
+def calculateGamma(s, k, r, t, v, cp):
+    """计算Gamma值"""
+    return calculateGreeks(s, k, r, t, v, cp)[2]
+
+#----------------------------------------------------------------------
+def calculateTheta(s, k, r, t, v, cp):
+    """计算Theta值"""
+    return calculateGreeks(s, k, r, t, v, cp)[3]
+
+#----------------------------------------------------------------------
+def calculateVega(s, k, r, t, v, cp):
+    """计算Vega值"""
+    return calculateGreeks(s, k, r, t, v, cp)[4]
+
+#----------------------------------------------------------------------
+def calculateOriginalVega(s, k, r, t, v, cp):
+    """计算原始vega值"""
+    s, k, r, t, v, cp, valid, sqrtT, d1, d2 = prepare(s, k, r, t, v, cp)
+    vega = np.where(valid, s * pdf(d1) * sqrtT, 0)
+    return toResult(vega)
+
+#----------------------------------------------------------------------
+def calculatePriceVega(s, k, r, t, v, cp):
+    """同时计算期权价格和原始vega值，用于隐含波动率迭代（参数需为有效的数组）"""
+    s, k, r, t, v, cp, valid, sqrtT, d1, d2 = prepare(s, k, r, t, v, cp)
+    price = cp * (s * cdf(cp * d1) - k * cdf(cp * d2) * np.exp(-r * t))
+    vega = s * pdf(d1) * sqrtT
+    return price, vega
+
+#----------------------------------------------------------------------
+def calculateImpv(price, s, k, r, t, cp):
+    """
+    计算隐含波动率，参数可以是数值或者数组，数组时整条期权链同时迭代求解
+    
+    使用Corrado-Miller近似公式作为初始猜测，之后采用解析vega的Newton Raphson方法迭代，
+    同时维护每个期权的波动率区间，Newton步长超出区间或者vega接近0时改用二分法，
+    因此深度虚值等vega很小的期权也能收敛。
+    
+    价格不为正数、不满足最小价值或者超过理论上限的期权返回0，结果保留4位小数。
+    """
+    price, s, k, r, t, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                  for x in (price, s, k, r, t, cp)])
+    impv = np.zeros(price.shape)
+    
+    # 检查期权价格必须为正数，且满足最小价值（即到期行权价值）
+    discount = np.exp(-r * t)
+    meet = (price > 0) & (t > 0) & np.where(cp == 1, price > (s - k) * discount, price > k * discount - s)
+    
+    index = np.flatnonzero(meet)
+    if not index.size:
+        return toResult(impv)
+    
+    target, s, k, r, t, cp, discount = [a.ravel()[index] for a in (price, s, k, r, t, cp, discount)]
+    
+    # 检查期权价格不超过最大波动率对应的价格
+    solvable = calculatePrice(s, k, r, t, MAX_VOL, cp) > target
+    index = index[solvable]
+    target, s, k, r, t, cp, discount = [a[solvable] for a in (target, s, k, r, t, cp, discount)]
+    
+    # Corrado-Miller近似公式估算初始波动率，看跌期权通过平价关系转换为看涨期权价格
+    spot = s
+    strike = k * discount
+    call = np.where(cp == 1, target, target + spot - strike)
+    a = call - (spot - strike) / 2
+    b = np.sqrt(np.maximum(a * a - (spot - strike) ** 2 / np.pi, 0))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v = SQRT_2PI / (spot + strike) * (a + b) / np.sqrt(t)
+    v = np.where(np.isfinite(v) & (v > MIN_VOL), v, INITIAL_VOL)
+    v = np.minimum(v, MAX_VOL / 2)
+    
+    low = np.zeros(v.shape)             # 波动率区间下限
+    high = np.full(v.shape, MAX_VOL)    # 波动率区间上限
+    active = np.arange(v.size)          # 尚未收敛的期权
+    
+    for i in range(MAX_ITERATIONS):
+        if not active.size:
+            break
+        
+        va = v[active]
+        p, vega = calculatePriceVega(s[active], k[active], r[active], t[active], va, cp[active])
+        diff = p - target[active]
+        
+        # 根据价格误差缩小区间
+        la = np.where(diff < 0, va, low[active])
+        ha = np.where(diff > 0, va, high[active])
+        low[active] = la
+        high[active] = ha
+        
+        # 计算Newton步长，超出区间时改用区间中点
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dx = diff / vega
+        newV = va - dx
+        bisect = ~np.isfinite(newV) | (newV <= la) | (newV >= ha)
+        newV = np.where(bisect, (la + ha) / 2, newV)
+        
+        # 检查误差是否满足要求
+        done = (np.abs(dx) < DX_TARGET) | (ha - la < DX_TARGET)
+        v[active] = np.where(done, va, newV)
+        active = active[~done]
+    
+    # 保留4位小数
+    impv.flat[index] = np.round(v, 4)
+    
+    return toResult(impv)
@@ -0,0 +1,313 @@
+# encoding: UTF-8
+
+'''
+Cox-Ross-Rubinstein二叉树期权定价模型的向量化实现，主要用于标的物为期货的美式期权的定价
+
+变量说明
+f：标的物期货价格
+k：行权价
+r：无风险利率
+t：剩余到期时间（年）
+v：隐含波动率
+cp：期权类型，+1/-1对应call/put
+n: 二叉树高度
+price：期权价格
+
+和crr.py的区别：
+1. 逆推时每一层的节点作为数组整体计算，所有参数均可以是数值或者NumPy数组，
+   传入数组时多个期权在同一次逆推中完成计算，传入数值时返回数值
+2. 逆推使用的数组按（期权数量，树高度）缓存复用，不会每次重新分配
+3. delta、gamma和theta直接使用二叉树前两层的节点计算，不再重新定价，
+   vega将上下调整波动率的两组期权和原始期权放在同一次逆推中计算
+4. 每一步使用exp(-r*dt)折现（r为0时和crr.py结果一致）
+
+因此树高度取100-500时也可以用于实时的风险计算。
+
+希腊值采用和bsNumpy一致的百分比变动数值，具体定义如下
+delta：当f变动1%时，price的变动
+gamma：当f变动1%时，delta的变动
+theta：当t变动1天时，price的变动（国内交易日每年240天）
+vega：当v涨跌1个点时，price的变动（如从16%涨到17%）
+
+其中gamma为原始gamma * f * f * 0.0001，和bsNumpy一样与crr.py的数值不同（crr.py对
+百分比delta再做差分，见bsNumpy中的说明）。
+
+波动率或者剩余时间不大于0的期权，价格为内在价值，希腊值为0。
+'''
+
+from __future__ import division
+
+import numpy as np
+
+from vnpy.pricing import blackNumpy
+
+
+# 支持数组参数，OptionMaster中可以按期权链批量计算
+VECTORIZED = True
+
+# 默认二叉树高度
+DEFAULT_STEPS = 100
+MIN_STEPS = 2
+
+# 计算vega时波动率的调整比例
+STEP_CHANGE = 0.001
+STEP_UP = 1 + STEP_CHANGE
+STEP_DOWN = 1 - STEP_CHANGE
+STEP_DIFF = STEP_CHANGE * 2
+
+# 计算隐含波动率时用的参数
+DX_TARGET = 0.00001
+MAX_ITERATIONS = 50
+INITIAL_VOL = 0.3
+MAX_VOL = 10.0
+
+DAYS_PER_YEAR = 240
+
+# 逆推使用的数组缓存，key为(期权数量, 树高度)
+LATTICE_DICT = {}
+LATTICE_CACHE_SIZE = 16
+
+
+#----------------------------------------------------------------------
+def toResult(a):
+    """数值输入时返回数值，数组输入时返回数组"""
+    return a[()]
+
+#----------------------------------------------------------------------
+def getLattice(m, n):
+    """
+    获取逆推使用的数组：期权价值、标的价格和计算用的临时数组
+    数组形状为（树高度+1，期权数量），每一层的节点在内存中连续
+    """
+    key = (m, n)
+    lattice = LATTICE_DICT.get(key, None)
+
+    if lattice is None:
+        if len(LATTICE_DICT) >= LATTICE_CACHE_SIZE:
+            LATTICE_DICT.clear()
+
+        lattice = tuple([np.empty((n+1, m)) for i in range(4)])
+        LATTICE_DICT[key] = lattice
+
+    return lattice
+
+#----------------------------------------------------------------------
+def induce(f, k, r, t, v, cp, n):
+    """
+    对一组期权进行逆推（参数为长度相同的一维数组，且波动率和剩余时间均为正数）
+    返回期权价格，以及第1层和第2层的期权价值、标的价格（形状为（节点数，期权数量））
+    """
+    m = len(f)
+    dt = t / n
+    u = np.exp(v * np.sqrt(dt))
+    d = 1 / u
+
+    # 计算风险平价概率（期货期权），并折现到上一层
+    p = (1 - d) / (u - d)
+    discount = np.exp(-r * dt)
+    pu = p * discount
+    pd = (1 - p) * discount
+
+    oTree, uTree, hold, exercise = getLattice(m, n)
+
+    # 到期时的标的价格和期权价值
+    np.power(u, (n - 2 * np.arange(n+1))[:, None], out=uTree)
+    uTree *= f
+    np.subtract(uTree, k, out=oTree)
+    oTree *= cp
+    np.maximum(oTree, 0, out=oTree)
+
+    levelDict = {}
+
+    for i in range(n-1, -1, -1):
+        oLevel = oTree[:i+1]
+        uLevel = uTree[:i+1]
+        h = hold[:i+1]
+        e = exercise[:i+1]
+
+        uLevel *= d
+
+        # 存续价值和行权价值取大
+        np.multiply(oLevel, pu, out=h)
+        np.multiply(oTree[1:i+2], pd, out=e)
+        h += e
+
+        np.subtract(uLevel, k, out=e)
+        e *= cp
+
+        np.maximum(h, e, out=oLevel)
+
+        if i <= 2:
+            levelDict[i] = (oLevel.copy(), uLevel.copy())
+
+    return levelDict[0][0][0], levelDict[1], levelDict[2]
+
+#----------------------------------------------------------------------
+def prepare(f, k, r, t, v, cp, n):
+    """转换为一维数组，无效的波动率和剩余时间替换为1以避免除0"""
+    f, k, r, t, v, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                              for x in (f, k, r, t, v, cp)])
+    shape = f.shape
+    f, k, r, t, v, cp = [a.ravel() for a in (f, k, r, t, v, cp)]
+
+    valid = (v > 0) & (t > 0)
+    v = np.where(valid, v, 1.0)
+    t = np.where(valid, t, 1.0)
+
+    n = max(int(n), MIN_STEPS)
+    intrinsic = np.maximum(0, cp * (f - k))
+
+    return f, k, r, t, v, cp, n, shape, valid, intrinsic
+
+#----------------------------------------------------------------------
+def calculatePrice(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算期权价格"""
+    f, k, r, t, v, cp, n, shape, valid, intrinsic = prepare(f, k, r, t, v, cp, n)
+
+    price = induce(f, k, r, t, v, cp, n)[0]
+    price = np.where(valid, price, intrinsic)
+
+    return toResult(price.reshape(shape))
+
+#----------------------------------------------------------------------
+def calculateGreeks(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算期权的价格和希腊值"""
+    f, k, r, t, v, cp, n, shape, valid, intrinsic = prepare(f, k, r, t, v, cp, n)
+    m = len(f)
+
+    # 原始波动率和上下调整后的波动率在同一次逆推中计算
+    price, level1, level2 = induce(np.tile(f, 3), np.tile(k, 3), np.tile(r, 3), np.tile(t, 3),
+                                   np.concatenate([v, v*STEP_UP, v*STEP_DOWN]),
+                                   np.tile(cp, 3), n)
+
+    o1, u1 = level1[0][:, :m], level1[1][:, :m]
+    o2, u2 = level2[0][:, :m], level2[1][:, :m]
+
+    # 使用第1层节点计算delta
+    delta = (o1[0] - o1[1]) / (u1[0] - u1[1])
+
+    # 使用第2层节点计算gamma
+    deltaUp = (o2[0] - o2[1]) / (u2[0] - u2[1])
+    deltaDown = (o2[1] - o2[2]) / (u2[1] - u2[2])
+    gamma = (deltaUp - deltaDown) / ((u2[0] - u2[2]) / 2)
+
+    # 第2层中间节点的标的价格不变，经过了两个时间步长
+    theta = (o2[1] - price[:m]) / (2 * t / n)
+
+    vega = (price[m:2*m] - price[2*m:]) / (v * STEP_DIFF)
+
+    # 转换为百分比变动数值
+    delta = delta * f * 0.01
+    gamma = gamma * f * f * 0.0001
+    theta = theta / DAYS_PER_YEAR
+    vega = vega / 100
+
+    result = [np.where(valid, price[:m], intrinsic)]
+    for greek in (delta, gamma, theta, vega):
+        result.append(np.where(valid, greek, 0))
+
+    return tuple([toResult(a.reshape(shape)) for a in result])
+
+#----------------------------------------------------------------------
+def calculateDelta(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算Delta值"""
+    return calculateGreeks(f, k, r, t, v, cp, n)[1]
+
+#----------------------------------------------------------------------
+def calculateGamma(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算Gamma值"""
+    return calculateGreeks(f, k, r, t, v, cp, n)[2]
+
+#----------------------------------------------------------------------
+def calculateTheta(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算Theta值"""
+    return calculateGreeks(f, k, r, t, v, cp, n)[3]
+
+#----------------------------------------------------------------------
+def calculateVega(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算Vega值"""
+    return calculateGreeks(f, k, r, t, v, cp, n)[4]
+
+#----------------------------------------------------------------------
+def calculateOriginalVega(f, k, r, t, v, cp, n=DEFAULT_STEPS):
+    """计算原始vega值"""
+    return calculateVega(f, k, r, t, v, cp, n) * 100
+
+#----------------------------------------------------------------------
+def calculatePriceVega(f, k, r, t, v, cp, n):
+    """同时计算期权价格和原始vega值，用于隐含波动率迭代（参数需为有效的一维数组）"""
+    m = len(f)
+    price = induce(np.tile(f, 3), np.tile(k, 3), np.tile(r, 3), np.tile(t, 3),
+                   np.concatenate([v, v*STEP_UP, v*STEP_DOWN]),
+                   np.tile(cp, 3), n)[0]
+
+    vega = (price[m:2*m] - price[2*m:]) / (v * STEP_DIFF)
+    return price[:m], vega
+
+#----------------------------------------------------------------------
+def calculateImpv(price, f, k, r, t, cp, n=DEFAULT_STEPS):
+    """
+    计算隐含波动率，参数可以是数值或者数组，数组时整条期权链同时迭代求解
+
+    使用Black76模型的隐含波动率作为初始猜测，之后和blackNumpy一样采用
+    带区间保护的Newton Raphson方法迭代。
+
+    价格不为正数、不满足最小价值或者超过理论上限的期权返回0，结果保留4位小数。
+    """
+    price, f, k, r, t, cp = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                  for x in (price, f, k, r, t, cp)])
+    impv = np.zeros(price.shape)
+    n = max(int(n), MIN_STEPS)
+
+    # 检查期权价格必须为正数，且满足最小价值（即到期行权价值）
+    meet = (price > 0) & (t > 0) & (price > cp * (f - k))
+
+    index = np.flatnonzero(meet)
+    if not index.size:
+        return toResult(impv)
+
+    target, f, k, r, t, cp = [a.ravel()[index] for a in (price, f, k, r, t, cp)]
+
+    # 检查期权价格不超过最大波动率对应的价格
+    solvable = induce(f, k, r, t, np.full(f.shape, MAX_VOL), cp, n)[0] > target
+    index = index[solvable]
+    target, f, k, r, t, cp = [a[solvable] for a in (target, f, k, r, t, cp)]
+
+    # 欧式期权的隐含波动率作为初始猜测
+    v = blackNumpy.calculateImpv(target, f, k, r, t, cp)
+    v = np.where((v > 0) & (v < MAX_VOL), v, INITIAL_VOL)
+
+    low = np.zeros(v.shape)             # 波动率区间下限
+    high = np.full(v.shape, MAX_VOL)    # 波动率区间上限
+    active = np.arange(v.size)          # 尚未收敛的期权
+
+    for i in range(MAX_ITERATIONS):
+        if not active.size:
+            break
+
+        va = v[active]
+        p, vega = calculatePriceVega(f[active], k[active], r[active], t[active], va, cp[active], n)
+        diff = p - target[active]
+
+        # 根据价格误差缩小区间
+        la = np.where(diff < 0, va, low[active])
+        ha = np.where(diff > 0, va, high[active])
+        low[active] = la
+        high[active] = ha
+
+        # 计算Newton步长，超出区间时改用区间中点
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dx = diff / vega
+        newV = va - dx
+        bisect = ~np.isfinite(newV) | (newV <= la) | (newV >= ha)
+        newV = np.where(bisect, (la + ha) / 2, newV)
+
+        # 检查误差是否满足要求
+        done = (np.abs(dx) < DX_TARGET) | (ha - la < DX_TARGET)
+        v[active] = np.where(done, va, newV)
+        active = active[~done]
+
+    # 保留4位小数
+    impv.flat[index] = np.round(v, 4)
+
+    return toResult(impv)
@@ -1,3 +1,4 @@
 # encoding: UTF-8
 
-from .vnrpc import RpcServer, RpcClient, RemoteException
\ No newline at end of file
+from .vnrpc import (RpcServer, RpcClient, AsyncRpcClient, RpcFuture,
+                    RemoteException, TimeoutException)
\ No newline at end of file
@@ -3,6 +3,9 @@
 import threading
 import traceback
 import signal
+from time import time
+from itertools import count
+from queue import Queue, Empty
 
 import zmq
 from msgpack import packb, unpackb
@@ -31,12 +34,19 @@ class RpcObject(object):
     因此建议尽量使用msgpack，如果要和某些语言通讯没有提供msgpack时再使用json，
     当传送的数据包含很多自定义的Python对象时建议使用cPickle。
 
+    此外可以通过useMsgpackExt传入扩展类型的编解码函数，用msgpack传送自定义对象，
+    publishOnly为True时只用于广播推送的数据，请求回应仍使用原有的序列化工具。
+
     如果希望使用其他的序列化工具也可以在这里添加。
     """
 
     #----------------------------------------------------------------------
     def __init__(self):
         """Constructor"""
+        # 扩展类型的编解码函数
+        self.__encodeHook = None
+        self.__decodeHook = None
+
         # 默认使用msgpack作为序列化工具
         #self.useMsgpack()
         self.usePickle()
@@ -51,6 +61,16 @@ class RpcObject(object):
         """解包"""
         pass
 
+    #----------------------------------------------------------------------
+    def packPublish(self, data):
+        """打包广播数据"""
+        pass
+
+    #----------------------------------------------------------------------
+    def unpackPublish(self, data):
+        """解包广播数据"""
+        pass
+
     #----------------------------------------------------------------------
     def __jsonPack(self, data):
         """使用json打包"""
@@ -81,31 +101,69 @@ class RpcObject(object):
         """使用cPickle解包"""
         return pLoads(data)
 
+    #----------------------------------------------------------------------
+    def __msgpackExtPack(self, data):
+        """使用带扩展类型的msgpack打包"""
+        return packb(data, default=self.__encodeHook, use_bin_type=True)
+
+    #----------------------------------------------------------------------
+    def __msgpackExtUnpack(self, data):
+        """使用带扩展类型的msgpack解包"""
+        return unpackb(data, ext_hook=self.__decodeHook, raw=False)
+
     #----------------------------------------------------------------------
     def useJson(self):
         """使用json作为序列化工具"""
-        self.pack = self.__jsonPack
-        self.unpack = self.__jsonUnpack
+        self.pack = self.packPublish = self.__jsonPack
+        self.unpack = self.unpackPublish = self.__jsonUnpack
 
     #----------------------------------------------------------------------
     def useMsgpack(self):
         """使用msgpack作为序列化工具"""
-        self.pack = self.__msgpackPack
-        self.unpack = self.__msgpackUnpack
+        self.pack = self.packPublish = self.__msgpackPack
+        self.unpack = self.unpackPublish = self.__msgpackUnpack
 
     #----------------------------------------------------------------------
     def usePickle(self):
         """使用cPickle作为序列化工具"""
-        self.pack = self.__picklePack
-        self.unpack = self.__pickleUnpack
+        self.pack = self.packPublish = self.__picklePack
+        self.unpack = self.unpackPublish = self.__pickleUnpack
+
+    #----------------------------------------------------------------------
+    def useMsgpackExt(self, encodeHook, decodeHook, publishOnly=False):
+        """
+        使用带扩展类型的msgpack作为序列化工具
+        encodeHook：打包自定义对象的函数，返回msgpack.ExtType
+        decodeHook：解包扩展类型的函数，输入参数为(code, data)
+        publishOnly：是否只用于广播推送的数据
+        """
+        self.__encodeHook = encodeHook
+        self.__decodeHook = decodeHook
+
+        self.packPublish = self.__msgpackExtPack
+        self.unpackPublish = self.__msgpackExtUnpack
+
+        if not publishOnly:
+            self.pack = self.__msgpackExtPack
+            self.unpack = self.__msgpackExtUnpack
 
 
 ########################################################################
 class RpcServer(RpcObject):
-    """RPC服务器"""
+    """
+    RPC服务器
+
+    workerCount为0时使用REP socket，在单个线程中逐个处理请求；
+
+    workerCount大于0时使用ROUTER socket，收到的请求放入队列由多个工作线程
+    并发处理，处理完成的回复通过inproc socket交回服务器线程发出。请求中
+    负载数据之前的所有帧（客户端标识、分隔帧、请求编号等）都会原样返回，
+    因此同时兼容REQ客户端和使用请求编号的DEALER客户端。
+    注意并发模式下注册的函数会在多个线程中同时运行，需要自行保证线程安全。
+    """
 
     #----------------------------------------------------------------------
-    def __init__(self, repAddress, pubAddress):
+    def __init__(self, repAddress, pubAddress, workerCount=0):
         """Constructor"""
         super(RpcServer, self).__init__()
 
@@ -115,7 +173,10 @@ class RpcServer(RpcObject):
         # zmq端口相关
         self.__context = zmq.Context()
 
-        self.__socketREP = self.__context.socket(zmq.REP)   # 请求回应socket
+        if workerCount:
+            self.__socketREP = self.__context.socket(zmq.ROUTER)    # 请求路由socket
+        else:
+            self.__socketREP = self.__context.socket(zmq.REP)       # 请求回应socket
         self.__socketREP.bind(repAddress)
 
         self.__socketPUB = self.__context.socket(zmq.PUB)   # 数据广播socket
@@ -125,6 +186,12 @@ class RpcServer(RpcObject):
         self.__active = False                             # 服务器的工作状态
         self.__thread = threading.Thread(target=self.run) # 服务器的工作线程
 
+        # 并发模式相关
+        self.__workerCount = workerCount                  # 工作线程数量
+        self.__workerList = []                            # 工作线程列表
+        self.__requestQueue = Queue()                     # 待处理的请求队列
+        self.__replyAddress = 'inproc://rpc-reply-%s' %id(self)  # 回复汇总地址
+
     #----------------------------------------------------------------------
     def start(self):
         """启动服务器"""
@@ -148,33 +215,101 @@ class RpcServer(RpcObject):
     #----------------------------------------------------------------------
     def run(self):
         """服务器运行函数"""
+        if self.__workerCount:
+            self.__runRouter()
+            return
+
         while self.__active:
             # 使用poll来等待事件到达，等待1秒（1000毫秒）
             if not self.__socketREP.poll(1000):
                 continue
 
-            # 从请求响应socket收取请求数据
-            reqb = self.__socketREP.recv()
+            # 从请求响应socket收取请求数据，最后一帧之前为请求编号（若有）
+            frames = self.__socketREP.recv_multipart()
 
-            # 序列化解包
-            req = self.unpack(reqb)
+            # 处理请求
+            repb = self.__process(frames[-1])
+
+            # 通过请求响应socket返回调用结果
+            self.__socketREP.send_multipart(frames[:-1] + [repb])
+
+    #----------------------------------------------------------------------
+    def __process(self, reqb):
+        """处理请求数据，返回打包后的回应数据"""
+        # 序列化解包
+        req = self.unpack(reqb)
+
+        # 获取函数名和参数
+        name, args, kwargs = req
+
+        # 获取引擎中对应的函数对象，并执行调用，如果有异常则捕捉后返回
+        try:
+            func = self.__functions[name]
+            r = func(*args, **kwargs)
+            rep = [True, r]
+        except Exception as e:
+            rep = [False, traceback.format_exc()]
+
+        # 序列化打包，返回值无法打包时同样作为异常返回
+        try:
+            return self.pack(rep)
+        except Exception as e:
+            return self.pack([False, traceback.format_exc()])
+
+    #----------------------------------------------------------------------
+    def __runRouter(self):
+        """并发模式下的服务器运行函数，负责收发请求和回复"""
+        # 工作线程的回复汇总到该socket
+        socketReply = self.__context.socket(zmq.PULL)
+        socketReply.bind(self.__replyAddress)
+
+        # 启动工作线程
+        self.__workerList = []
+        for i in range(self.__workerCount):
+            worker = threading.Thread(target=self.__runWorker)
+            worker.start()
+            self.__workerList.append(worker)
+
+        poller = zmq.Poller()
+        poller.register(self.__socketREP, zmq.POLLIN)
+        poller.register(socketReply, zmq.POLLIN)
+
+        while self.__active:
+            events = dict(poller.poll(1000))
 
-            # 获取函数名和参数
-            name, args, kwargs = req
+            # 收到请求，放入队列等待空闲的工作线程处理
+            if self.__socketREP in events:
+                frames = self.__socketREP.recv_multipart()
+                self.__requestQueue.put(frames)
 
-            # 获取引擎中对应的函数对象，并执行调用，如果有异常则捕捉后返回
+            # 收到工作线程的回复，通过路由socket返回给对应客户端
+            if socketReply in events:
+                frames = socketReply.recv_multipart()
+                self.__socketREP.send_multipart(frames)
+
+        # 等待工作线程退出
+        for worker in self.__workerList:
+            worker.join()
+
+        socketReply.close()
+
+    #----------------------------------------------------------------------
+    def __runWorker(self):
+        """工作线程运行函数"""
+        socketPush = self.__context.socket(zmq.PUSH)
+        socketPush.connect(self.__replyAddress)
+
+        while self.__active:
             try:
-                func = self.__functions[name]
-                r = func(*args, **kwargs)
-                rep = [True, r]
-            except Exception as e:
-                rep = [False, traceback.format_exc()]
+                frames = self.__requestQueue.get(block=True, timeout=1)
+            except Empty:
+                continue
 
-            # 序列化打包
-            repb = self.pack(rep)
+            # 最后一帧为请求数据，之前的帧为路由信息和请求编号，原样返回
+            repb = self.__process(frames[-1])
+            socketPush.send_multipart(frames[:-1] + [repb])
 
-            # 通过请求响应socket返回调用结果
-            self.__socketREP.send(repb)
+        socketPush.close()
 
     #----------------------------------------------------------------------
     def publish(self, topic, data):
@@ -184,7 +319,7 @@ class RpcServer(RpcObject):
         data：具体的数据
         """
         # 序列化数据
-        datab = self.pack(data)
+        datab = self.packPublish(data)
 
         # 通过广播socket发送数据
         self.__socketPUB.send_multipart([topic, datab])
@@ -278,7 +413,7 @@ class RpcClient(RpcObject):
             topic, datab = self.__socketSUB.recv_multipart()
 
             # 序列化解包
-            data = self.unpack(datab)
+            data = self.unpackPublish(datab)
 
             # 调用回调函数处理
             self.callback(topic, data)
@@ -299,6 +434,300 @@ class RpcClient(RpcObject):
         """
         self.__socketSUB.setsockopt(zmq.SUBSCRIBE, topic)
 
+    #----------------------------------------------------------------------
+    def unsubscribeTopic(self, topic):
+        """取消订阅特定主题的广播数据"""
+        self.__socketSUB.setsockopt(zmq.UNSUBSCRIBE, topic)
+
+
+########################################################################
+class RpcFuture(object):
+    """异步调用的结果对象"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, reqId, timeout=None):
+        """Constructor"""
+        self.reqId = reqId
+
+        # 超时时间点，为None时不限制
+        if timeout:
+            self.deadline = time() + timeout
+        else:
+            self.deadline = None
+
+        self.__event = threading.Event()
+        self.__result = None
+        self.__exception = None
+        self.__callbacks = []
+
+    #----------------------------------------------------------------------
+    def done(self):
+        """是否已经完成"""
+        return self.__event.is_set()
+
+    #----------------------------------------------------------------------
+    def result(self, timeout=None):
+        """
+        等待并返回调用结果
+        timeout为None时使用调用时设置的超时时间，超时则触发TimeoutException，
+        远程调用失败时触发RemoteException
+        """
+        if timeout is None and self.deadline:
+            timeout = max(self.deadline - time(), 0)
+
+        if not self.__event.wait(timeout):
+            raise TimeoutException(u'请求%s等待回应超时' %self.reqId)
+
+        if self.__exception:
+            raise self.__exception
+        return self.__result
+
+    #----------------------------------------------------------------------
+    def exception(self):
+        """返回调用失败的异常，未完成或成功时返回None"""
+        return self.__exception
+
+    #----------------------------------------------------------------------
+    def addDoneCallback(self, func):
+        """添加完成回调函数，输入参数为该结果对象（在客户端工作线程中调用）"""
+        if self.done():
+            func(self)
+        else:
+            self.__callbacks.append(func)
+
+    #----------------------------------------------------------------------
+    def setResult(self, result):
+        """设置调用结果"""
+        self.__result = result
+        self.__finish()
+
+    #----------------------------------------------------------------------
+    def setException(self, exception):
+        """设置调用异常"""
+        self.__exception = exception
+        self.__finish()
+
+    #----------------------------------------------------------------------
+    def __finish(self):
+        """完成调用"""
+        self.__event.set()
+
+        for func in self.__callbacks:
+            func(self)
+        self.__callbacks = []
+
+
+########################################################################
+class AsyncRpcClient(RpcObject):
+    """
+    异步RPC客户端
+
+    基于DEALER socket，调用远程函数时立即返回RpcFuture对象，允许同时
+    发出多个请求，回应通过请求编号与请求对应。使用方法：
+
+    client = AsyncRpcClient(reqAddress, subAddress)
+    client.start()
+    future = client.add(1, 3)       # 不阻塞
+    print(future.result())          # 等待结果
+
+    为了保证zmq socket只在单个线程中使用，调用线程通过各自的inproc socket
+    将请求交给工作线程发出，工作线程同时负责接收回应和订阅推送的数据。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, reqAddress, subAddress, timeout=30):
+        """
+        Constructor
+        timeout：默认的调用超时时间（秒），为0时不限制
+        """
+        super(AsyncRpcClient, self).__init__()
+
+        # zmq端口相关
+        self.__reqAddress = reqAddress
+        self.__subAddress = subAddress
+        self.__sendAddress = 'inproc://rpc-send-%s' %id(self)
+
+        self.__context = zmq.Context()
+        self.__socketDEALER = self.__context.socket(zmq.DEALER) # 请求发出socket
+        self.__socketSUB = self.__context.socket(zmq.SUB)       # 广播订阅socket
+        self.__socketSEND = self.__context.socket(zmq.PULL)     # 汇总调用线程请求的socket
+        self.__socketSEND.bind(self.__sendAddress)
+
+        self.__local = threading.local()        # 保存各调用线程的inproc socket
+
+        # 请求相关
+        self.__timeout = timeout                # 默认超时时间
+        self.__reqCount = count()               # 请求编号生成器
+        self.__futureDict = {}                  # 等待回应的请求，key为请求编号
+
+        # 工作线程相关
+        self.__active = False                                   # 客户端的工作状态
+        self.__thread = threading.Thread(target=self.run)       # 客户端的工作线程
+
+    #----------------------------------------------------------------------
+    def __getattr__(self, name):
+        """实现远程调用功能，返回RpcFuture对象"""
+        # 以双下划线开头的属性不做远程调用，避免影响copy、pickle等内置功能
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def dorpc(*args, **kwargs):
+            return self.callAsync(name, args, kwargs)
+
+        return dorpc
+
+    #----------------------------------------------------------------------
+    def callAsync(self, name, args=(), kwargs=None, timeout=None):
+        """
+        发出远程调用请求，返回RpcFuture对象
+        timeout为None时使用默认超时时间
+        """
+        if timeout is None:
+            timeout = self.__timeout
+
+        # 生成请求编号和结果对象
+        reqId = str(next(self.__reqCount)).encode('ascii')
+        future = RpcFuture(reqId, timeout)
+        self.__futureDict[reqId] = future
+
+        # 序列化打包请求
+        req = [name, args, kwargs or {}]
+        reqb = self.pack(req)
+
+        # 通过本线程的inproc socket交给工作线程发出
+        self.__getSendSocket().send_multipart([reqId, reqb])
+
+        return future
+
+    #----------------------------------------------------------------------
+    def __getSendSocket(self):
+        """获取当前调用线程的inproc socket"""
+        socket = getattr(self.__local, 'socket', None)
+        if not socket:
+            socket = self.__context.socket(zmq.PUSH)
+            socket.connect(self.__sendAddress)
+            self.__local.socket = socket
+        return socket
+
+    #----------------------------------------------------------------------
+    def setTimeout(self, timeout):
+        """设置默认超时时间（秒）"""
+        self.__timeout = timeout
+
+    #----------------------------------------------------------------------
+    def getPendingCount(self):
+        """查询尚未收到回应的请求数量"""
+        return len(self.__futureDict)
+
+    #----------------------------------------------------------------------
+    def start(self):
+        """启动客户端"""
+        # 连接端口
+        self.__socketDEALER.connect(self.__reqAddress)
+        self.__socketSUB.connect(self.__subAddress)
+
+        # 将客户端设为启动
+        self.__active = True
+
+        # 启动工作线程
+        if not self.__thread.isAlive():
+            self.__thread.start()
+
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止客户端"""
+        # 将客户端设为停止
+        self.__active = False
+
+        # 等待工作线程退出
+        if self.__thread.isAlive():
+            self.__thread.join()
+
+        # 尚未完成的请求全部以超时结束
+        for reqId in list(self.__futureDict.keys()):
+            future = self.__futureDict.pop(reqId, None)
+            if future:
+                future.setException(TimeoutException(u'客户端已停止'))
+
+    #----------------------------------------------------------------------
+    def run(self):
+        """客户端运行函数"""
+        poller = zmq.Poller()
+        poller.register(self.__socketDEALER, zmq.POLLIN)
+        poller.register(self.__socketSEND, zmq.POLLIN)
+        poller.register(self.__socketSUB, zmq.POLLIN)
+
+        while self.__active:
+            # 使用poll来等待事件到达，等待1秒（1000毫秒）
+            events = dict(poller.poll(1000))
+
+            # 发出调用线程的请求，空帧用于兼容服务端的REP/ROUTER socket
+            if self.__socketSEND in events:
+                reqId, reqb = self.__socketSEND.recv_multipart()
+                self.__socketDEALER.send_multipart([b'', reqId, reqb])
+
+            # 收到回应，根据请求编号找到对应的结果对象
+            if self.__socketDEALER in events:
+                frames = self.__socketDEALER.recv_multipart()
+                self.processReply(frames[-2], frames[-1])
+
+            # 收到广播数据
+            if self.__socketSUB in events:
+                topic, datab = self.__socketSUB.recv_multipart()
+                data = self.unpackPublish(datab)
+                self.callback(topic, data)
+
+            # 检查超时的请求
+            self.checkTimeout()
+
+    #----------------------------------------------------------------------
+    def processReply(self, reqId, repb):
+        """处理回应"""
+        # 已经超时的请求直接忽略
+        future = self.__futureDict.pop(reqId, None)
+        if not future:
+            return
+
+        # 序列化解包回应
+        rep = self.unpack(repb)
+
+        # 若正常则设置结果，调用失败则设置异常
+        if rep[0]:
+            future.setResult(rep[1])
+        else:
+            future.setException(RemoteException(rep[1]))
+
+    #----------------------------------------------------------------------
+    def checkTimeout(self):
+        """清除超时的请求"""
+        now = time()
+
+        for reqId, future in list(self.__futureDict.items()):
+            if future.deadline and now >= future.deadline:
+                self.__futureDict.pop(reqId, None)
+                future.setException(TimeoutException(u'请求%s等待回应超时' %reqId))
+
+    #----------------------------------------------------------------------
+    def callback(self, topic, data):
+        """回调函数，必须由用户实现"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def subscribeTopic(self, topic):
+        """
+        订阅特定主题的广播数据
+
+        可以使用topic=''来订阅所有的主题
+
+        注意topic必须是ascii编码
+        """
+        self.__socketSUB.setsockopt(zmq.SUBSCRIBE, topic)
+
+    #----------------------------------------------------------------------
+    def unsubscribeTopic(self, topic):
+        """取消订阅特定主题的广播数据"""
+        self.__socketSUB.setsockopt(zmq.UNSUBSCRIBE, topic)
+
 
 ########################################################################
 class RemoteException(Exception):
@@ -313,3 +742,26 @@ class RemoteException(Exception):
     def __str__(self):
         """输出错误信息"""
         return self.__value
+
+
+########################################################################
+class TimeoutException(Exception):
+    """RPC调用超时异常"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, value):
+        """Constructor"""
+        self.__value = value
+
+    #----------------------------------------------------------------------
+    def __str__(self):
+        """输出错误信息（Python 2中unicode信息编码为utf-8字节串，避免输出时的编码错误）"""
+        value = self.__value
+        if not isinstance(value, str):
+            value = value.encode('utf-8')
+        return value
+
+    #----------------------------------------------------------------------
+    def __unicode__(self):
+        """输出unicode错误信息"""
+        return self.__value
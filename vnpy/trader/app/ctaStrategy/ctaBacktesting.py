@@ -10,8 +10,15 @@ from __future__ import print_function
 from datetime import datetime, timedelta
 from collections import OrderedDict
 from itertools import product
+from bisect import bisect_left
+from heapq import heappush, heappop
+from threading import Lock
 import multiprocessing
 import copy
+import os
+import sys
+import shutil
+import tempfile
 
 import pymongo
 import pandas as pd
@@ -30,6 +37,10 @@ except ImportError:
 
 from vnpy.trader.vtGlobal import globalSetting
 from vnpy.trader.vtObject import VtTickData, VtBarData
+from vnpy.trader.vtStore import (HistoryStore, DATATYPE_BAR, DATATYPE_TICK,
+                                  makeArray, makeDataList, iterDict,
+                                  saveSnapshot, loadSnapshot)
+from vnpy.trader.vtJournal import DataJournal
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtGateway import VtOrderData, VtTradeData
 
@@ -46,6 +57,14 @@ class BacktestingEngine(object):
     
     TICK_MODE = 'tick'
     BAR_MODE = 'bar'
+    
+    # 向量化回放中每根K线的撮合阶段，和newBar中的顺序一致
+    LIMIT_PHASE = 0         # 撮合限价单
+    STOP_PHASE = 1          # 撮合停止单
+    BAR_PHASE = 2           # 推送K线到策略
+    
+    SEARCH_WINDOW = 64          # 向前搜索触发K线的初始窗口
+    MAX_SEARCH_WINDOW = 4096    # 窗口逐次翻倍的上限
 
     #----------------------------------------------------------------------
     def __init__(self):
@@ -56,6 +75,7 @@ class BacktestingEngine(object):
         # 本地停止单字典, key为stopOrderID，value为stopOrder对象
         self.stopOrderDict = {}             # 停止单撤销后不会从本字典中删除
         self.workingStopOrderDict = {}      # 停止单撤销后会从本字典中删除
+        self.stopOrderBook = StopOrderBook()    # 活动停止单按触发价排序，和实盘引擎一致
         
         self.engineType = ENGINETYPE_BACKTESTING    # 引擎类型为回测
         
@@ -75,6 +95,9 @@ class BacktestingEngine(object):
         self.dbClient = None        # 数据库客户端
         self.dbCursor = None        # 数据库指针
         self.hdsClient = None       # 历史数据服务器客户端
+        self.historyStore = None    # 本地列式数据库
+        self.dataJournal = None     # 数据记录生成的本地日志
+        self.snapshotPath = ''      # 多进程优化时共享的数据快照路径
         
         self.initData = []          # 初始化用的数据
         self.dbName = ''            # 回测数据库名
@@ -100,6 +123,20 @@ class BacktestingEngine(object):
         
         # 日线回测结果计算用
         self.dailyResultDict = OrderedDict()
+        
+        # 向量化K线回放相关
+        self.vectorMode = False     # 是否启用向量化回放（仅K线模式有效）
+        self.barArray = {}          # 按列存储的K线数组，key为字段名
+        self.barArrayKey = None     # 已载入数组对应的数据范围，用于多次回测时复用
+        
+        self.orderHeap = []         # 按撮合K线位置排序的委托队列
+        self.vectorIndex = -1       # 当前回放的K线位置，-1表示不在向量化回放中
+        self.vectorPhase = self.LIMIT_PHASE     # 当前K线的撮合阶段
+        self.vectorCount = 0        # 回放的K线数量
+        self.openList = []          # 撮合时逐个读取的价格列表
+        self.highList = []
+        self.lowList = []
+        self.crossArrayDict = {}    # 搜索触发K线用的价格数组，key为(撮合阶段, 方向)
     
     #------------------------------------------------
     # 通用功能
@@ -150,6 +187,16 @@ class BacktestingEngine(object):
         """设置回测模式"""
         self.mode = mode
     
+    #----------------------------------------------------------------------
+    def setVectorMode(self, vectorMode):
+        """
+        设置是否使用向量化K线回放
+        
+        向量化只用于委托撮合，策略的onBar仍然逐根K线调用，
+        因此加速效果取决于撮合在回测耗时中的占比
+        """
+        self.vectorMode = vectorMode
+    
     #----------------------------------------------------------------------
     def setDatabase(self, dbName, symbol):
         """设置历史数据所用的数据库"""
@@ -197,6 +244,27 @@ class BacktestingEngine(object):
     #----------------------------------------------------------------------
     def loadHistoryData(self):
         """载入历史数据"""
+        # 向量化模式下，若数据范围未变则直接复用已载入的数组
+        if self.isVectorMode() and self.barArrayKey == self.getDataRangeKey():
+            self.output(u'使用已载入的K线数组，数据量：%s' %(len(self.initData) + 
+                                                          len(self.barArray['close'])))
+            return
+        
+        # 多进程优化时从父进程创建的快照载入
+        if self.snapshotPath:
+            self.loadSnapshotData()
+            return
+        
+        # 优先从本地列式数据库载入
+        if self.historyStore and self.historyStore.hasData(self.dbName, self.symbol):
+            self.loadStoreData()
+            return
+        
+        # 其次从数据记录生成的本地日志载入
+        if self.dataJournal and self.dataJournal.hasData(self.dbName, self.symbol):
+            self.loadStoreData(self.dataJournal)
+            return
+        
         self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
         collection = self.dbClient[self.dbName][self.symbol]          
 
@@ -246,7 +314,190 @@ class BacktestingEngine(object):
             count = len(initCursor) + len(self.dbCursor)
         else:
             count = initCursor.count() + self.dbCursor.count()
+        
+        # 向量化模式下将回测数据一次性转换为按列存储的数组
+        if self.isVectorMode():
+            self.barArray = self.loadBarArray(self.dbCursor)
+            self.barArrayKey = self.getDataRangeKey()
+            self.dbCursor = None
+        
         self.output(u'载入完成，数据量：%s' %count)
+    
+    #----------------------------------------------------------------------
+    def loadStoreData(self, store=None):
+        """从本地列式数据库（或者接口相同的本地日志）载入历史数据"""
+        if not store:
+            store = self.historyStore
+        
+        self.output(u'开始从本地数据库载入数据')
+        
+        # 载入初始化需要用的数据
+        self.initData = store.loadData(self.dbName, self.symbol,
+                                       self.dataStartDate,
+                                       self.strategyStartDate)
+        
+        # 载入回测数据
+        arrayDict = store.loadArray(self.dbName, self.symbol,
+                                    self.strategyStartDate,
+                                    self.dataEndDate,
+                                    includeEnd=True)
+        
+        if self.isVectorMode():
+            self.barArray = self.makeBarArray(arrayDict)
+            self.barArrayKey = self.getDataRangeKey()
+            self.dbCursor = None
+            count = len(self.barArray['close'])
+        else:
+            self.dbCursor = store.iterDict(arrayDict)
+            count = len(arrayDict.get('datetime', []))
+        
+        self.output(u'载入完成，数据量：%s' %(len(self.initData) + count))
+    
+    #----------------------------------------------------------------------
+    def setDataSnapshot(self, path):
+        """设置数据快照路径，设置后直接从快照载入历史数据"""
+        self.snapshotPath = path
+    
+    #----------------------------------------------------------------------
+    def createDataSnapshot(self, path):
+        """载入历史数据并保存为快照，供多进程优化时各进程以内存映射方式共享"""
+        # 快照中保存的是原始数据，因此载入时暂时关闭向量化模式
+        vectorMode = self.vectorMode
+        self.vectorMode = False
+        self.loadHistoryData()
+        self.vectorMode = vectorMode
+        
+        if self.mode == self.BAR_MODE:
+            dataType = DATATYPE_BAR
+        else:
+            dataType = DATATYPE_TICK
+        
+        saveSnapshot(os.path.join(path, 'init'), makeArray(self.initData, dataType))
+        saveSnapshot(os.path.join(path, 'data'), makeArray(list(self.dbCursor), dataType))
+        self.dbCursor = None
+    
+    #----------------------------------------------------------------------
+    def loadSnapshotData(self):
+        """从数据快照载入历史数据，数组以只读内存映射方式打开"""
+        initArray = loadSnapshot(os.path.join(self.snapshotPath, 'init'))
+        self.initData = makeDataList(initArray)
+        
+        dataArray = loadSnapshot(os.path.join(self.snapshotPath, 'data'))
+        if self.isVectorMode():
+            self.barArray = self.makeBarArray(dataArray)
+            self.barArrayKey = self.getDataRangeKey()
+            self.dbCursor = None
+        else:
+            self.dbCursor = iterDict(dataArray)
+    
+    #----------------------------------------------------------------------
+    def initHistoryStore(self, path=''):
+        """初始化本地列式数据库，path为空时使用默认路径"""
+        self.historyStore = HistoryStore(path)
+    
+    #----------------------------------------------------------------------
+    def initDataJournal(self, path=''):
+        """初始化数据记录生成的本地日志，path为空时使用默认路径"""
+        self.dataJournal = DataJournal(path)
+    
+    #----------------------------------------------------------------------
+    def isVectorMode(self):
+        """是否使用向量化K线回放"""
+        return self.vectorMode and self.mode == self.BAR_MODE
+    
+    #----------------------------------------------------------------------
+    def getDataRangeKey(self):
+        """获取当前回测数据范围的标识"""
+        return (self.dbName, self.symbol, self.dataStartDate, 
+                self.strategyStartDate, self.dataEndDate)
+    
+    #----------------------------------------------------------------------
+    def loadBarArray(self, cursor):
+        """将K线数据转换为按列存储的numpy数组"""
+        openList = []
+        highList = []
+        lowList = []
+        closeList = []
+        volumeList = []
+        openInterestList = []
+        datetimeList = []
+        dateList = []
+        timeList = []
+        
+        vtSymbol = symbol = exchange = EMPTY_STRING
+        
+        for d in cursor:
+            openList.append(d['open'])
+            highList.append(d['high'])
+            lowList.append(d['low'])
+            closeList.append(d['close'])
+            volumeList.append(d.get('volume', 0))
+            openInterestList.append(d.get('openInterest', 0))
+            datetimeList.append(d['datetime'])
+            dateList.append(d.get('date', EMPTY_STRING))
+            timeList.append(d.get('time', EMPTY_STRING))
+            
+            if not vtSymbol:
+                vtSymbol = d.get('vtSymbol', EMPTY_STRING)
+                symbol = d.get('symbol', EMPTY_STRING)
+                exchange = d.get('exchange', EMPTY_STRING)
+        
+        barArray = {
+            'open': np.array(openList, dtype=float),
+            'high': np.array(highList, dtype=float),
+            'low': np.array(lowList, dtype=float),
+            'close': np.array(closeList, dtype=float),
+            'volume': np.array(volumeList, dtype=float),
+            'openInterest': np.array(openInterestList, dtype=float),
+            'datetime': datetimeList,
+            'date': dateList,
+            'time': timeList,
+            'vtSymbol': vtSymbol,
+            'symbol': symbol,
+            'exchange': exchange
+        }
+        
+        # 预先计算每日收盘价，回放时无需逐根K线更新
+        barArray['dailyClose'] = self.calculateDailyClose(datetimeList, 
+                                                          barArray['close'])
+        
+        return barArray
+    
+    #----------------------------------------------------------------------
+    def makeBarArray(self, arrayDict):
+        """将本地数据库读取的按列数据转换为回放用的K线数组"""
+        if not arrayDict:
+            return self.loadBarArray([])
+        
+        barArray = {}
+        for field in HistoryStore.BAR_FIELDS:
+            barArray[field] = arrayDict[field]
+        
+        for field in HistoryStore.META_FIELDS:
+            barArray[field] = arrayDict[field]
+        
+        barArray['datetime'] = arrayDict['datetime'].tolist()
+        barArray['date'] = arrayDict['date'].tolist()
+        barArray['time'] = arrayDict['time'].tolist()
+        
+        barArray['dailyClose'] = self.calculateDailyClose(barArray['datetime'], 
+                                                          barArray['close'])
+        
+        return barArray
+    
+    #----------------------------------------------------------------------
+    def calculateDailyClose(self, datetimeList, closeArray):
+        """基于K线数组计算每日收盘价，返回(日期, 收盘价)列表"""
+        if not datetimeList:
+            return []
+        
+        dateArray = np.array([dt.date() for dt in datetimeList])
+        
+        # 数据已按时间排序，每个交易日的最后一根K线即为日期变化前的位置
+        lastIndex = np.append(np.nonzero(dateArray[1:] != dateArray[:-1])[0], 
+                              len(dateArray) - 1)
+        
+        return list(zip(dateArray[lastIndex], closeArray[lastIndex].tolist()))
         
     #----------------------------------------------------------------------
     def runBacktesting(self):
@@ -273,13 +524,214 @@ class BacktestingEngine(object):
         self.output(u'策略启动完成')
         
         self.output(u'开始回放数据')
-
-        for d in self.dbCursor:
-            data = dataClass()
-            data.__dict__ = d
-            func(data)     
+        
+        if self.isVectorMode():
+            self.runVectorBacktesting()
+        else:
+            for d in self.dbCursor:
+                data = dataClass()
+                data.__dict__ = d
+                func(data)     
             
         self.output(u'数据回放结束')
+    
+    #----------------------------------------------------------------------
+    def runVectorBacktesting(self):
+        """
+        基于K线数组回放数据
+        
+        每个委托直接在价格数组中向前搜索会触发它的K线，只在该K线上撮合，
+        没有委托触发的K线跳过撮合。K线仍然逐根创建VtBarData对象推送给策略，
+        这部分开销和逐根回放相同：委托长时间挂单时撮合开销大幅减少，
+        策略每根K线都撤单重发时和逐根回放的速度基本一致。
+        """
+        barArray = self.barArray
+        
+        # 每日收盘价已预先计算，直接生成每日结果
+        self.dailyResultDict = OrderedDict()
+        for date, closePrice in barArray['dailyClose']:
+            self.dailyResultDict[date] = DailyResult(date, closePrice)
+        
+        # 转换为python列表，避免逐个访问numpy元素的开销
+        self.openList = openList = barArray['open'].tolist()
+        self.highList = highList = barArray['high'].tolist()
+        self.lowList = lowList = barArray['low'].tolist()
+        closeList = barArray['close'].tolist()
+        volumeList = barArray['volume'].tolist()
+        openInterestList = barArray['openInterest'].tolist()
+        datetimeList = barArray['datetime']
+        dateList = barArray['date']
+        timeList = barArray['time']
+        
+        vtSymbol = barArray['vtSymbol']
+        symbol = barArray['symbol']
+        exchange = barArray['exchange']
+        
+        # 价格为0的K线上限价单无法成交，预先替换为不会触发的价格
+        lowArray = barArray['low']
+        highArray = barArray['high']
+        self.crossArrayDict = {
+            (self.LIMIT_PHASE, DIRECTION_LONG): np.where(lowArray > 0, lowArray, np.inf),
+            (self.LIMIT_PHASE, DIRECTION_SHORT): np.where(highArray > 0, highArray, -np.inf),
+            (self.STOP_PHASE, DIRECTION_LONG): highArray,
+            (self.STOP_PHASE, DIRECTION_SHORT): lowArray
+        }
+        
+        onBar = self.strategy.onBar
+        orderHeap = self.orderHeap = []
+        self.vectorCount = len(closeList)
+        
+        # 策略初始化和启动时发出的委托从第一根K线开始撮合
+        for orderID, order in self.workingLimitOrderDict.items():
+            self.addVectorOrder(self.LIMIT_PHASE, order, 0, int(orderID))
+        for stopOrderID, so in self.workingStopOrderDict.items():
+            self.addVectorOrder(self.STOP_PHASE, so, 0, 
+                                int(stopOrderID[len(STOPORDERPREFIX):]))
+        
+        try:
+            for i in range(self.vectorCount):
+                self.vectorIndex = i
+                self.vectorPhase = self.LIMIT_PHASE
+                self.dt = datetimeList[i]
+                
+                # 只有委托在当前K线上需要处理时才撮合
+                if orderHeap and orderHeap[0][0] == i:
+                    self.crossVectorOrder(i)
+                
+                bar = VtBarData()
+                bar.__dict__ = {
+                    'gatewayName': EMPTY_STRING,
+                    'rawData': None,
+                    'vtSymbol': vtSymbol,
+                    'symbol': symbol,
+                    'exchange': exchange,
+                    'open': openList[i],
+                    'high': highList[i],
+                    'low': lowList[i],
+                    'close': closeList[i],
+                    'date': dateList[i],
+                    'time': timeList[i],
+                    'datetime': datetimeList[i],
+                    'volume': volumeList[i],
+                    'openInterest': openInterestList[i]
+                }
+                
+                self.bar = bar
+                self.vectorPhase = self.BAR_PHASE
+                onBar(bar)
+        finally:
+            self.vectorIndex = -1
+            self.orderHeap = []
+    
+    #----------------------------------------------------------------------
+    def addVectorOrder(self, phase, order, start, seq):
+        """
+        新委托加入向量化撮合队列，从第start根K线开始撮合，seq为发出的顺序
+        
+        队列中保存(K线位置, 撮合阶段, seq, window, 委托)，其中window为0时表示
+        委托在该K线上触发，为-1时表示不触发，大于0时表示从该K线开始在数组中
+        搜索window根K线。超出回放范围的位置不会被处理。
+        """
+        # 开始撮合的K线已知，直接判断是否立即触发
+        if start >= self.vectorCount:
+            return
+        elif self.isOrderTriggered(phase, order, start):
+            heappush(self.orderHeap, (start, phase, seq, 0, order))
+        # 限价单仍需在该K线上推送未成交状态
+        elif phase == self.LIMIT_PHASE:
+            heappush(self.orderHeap, (start, phase, seq, -1, order))
+        else:
+            heappush(self.orderHeap, (start+1, phase, seq, self.SEARCH_WINDOW, order))
+    
+    #----------------------------------------------------------------------
+    def isOrderTriggered(self, phase, order, i):
+        """判断委托是否在第i根K线上触发，规则和crossLimitOrder、crossStopOrder一致"""
+        if phase == self.LIMIT_PHASE:
+            if order.direction == DIRECTION_LONG:
+                low = self.lowList[i]
+                return order.price >= low and low > 0
+            else:
+                high = self.highList[i]
+                return order.price <= high and high > 0
+        else:
+            if order.direction == DIRECTION_LONG:
+                return order.price <= self.highList[i]
+            else:
+                return order.price >= self.lowList[i]
+    
+    #----------------------------------------------------------------------
+    def searchTrigger(self, phase, order, start, window):
+        """在K线数组的[start, start+window)范围内搜索第一根触发委托的K线，没有则返回-1"""
+        a = self.crossArrayDict[(phase, order.direction)][start:start+window]
+        
+        # 买入限价单和卖出停止单在价格下跌到委托价时触发，其余在上涨到委托价时触发
+        if (phase == self.LIMIT_PHASE) == (order.direction == DIRECTION_LONG):
+            cross = a <= order.price
+        else:
+            cross = a >= order.price
+        
+        n = cross.argmax()
+        if cross[n]:
+            return start + n
+        return -1
+    
+    #----------------------------------------------------------------------
+    def crossVectorOrder(self, i):
+        """撮合安排在第i根K线上处理的委托，先限价单后停止单，同类委托按发出的先后"""
+        orderHeap = self.orderHeap
+        workingLimitOrderDict = self.workingLimitOrderDict
+        workingStopOrderDict = self.workingStopOrderDict
+        openPrice = self.openList[i]
+        
+        while orderHeap and orderHeap[0][0] == i:
+            index, phase, seq, window, order = heappop(orderHeap)
+            self.vectorPhase = phase
+            
+            # 已成交或撤销的委托直接丢弃
+            if phase == self.LIMIT_PHASE:
+                if order.orderID not in workingLimitOrderDict:
+                    continue
+                
+                # 推送委托进入队列（未成交）的状态更新
+                if not order.status:
+                    order.status = STATUS_NOTTRADED
+                    self.strategy.onOrder(order)
+                    
+                    # 可能在回调中被撤销
+                    if order.orderID not in workingLimitOrderDict:
+                        continue
+            elif order.stopOrderID not in workingStopOrderDict:
+                continue
+            
+            # 当前K线不触发，从下一根K线开始搜索
+            start = i
+            if window < 0:
+                start = i + 1
+                window = self.SEARCH_WINDOW
+                if start >= self.vectorCount:
+                    continue
+            
+            # 在数组中搜索会触发的K线，找不到则扩大窗口继续
+            if window > 0:
+                n = self.searchTrigger(phase, order, start, window)
+                if n < 0:
+                    heappush(orderHeap, (start+window, phase, seq, 
+                                         min(window*2, self.MAX_SEARCH_WINDOW), order))
+                    continue
+                elif n > i:
+                    heappush(orderHeap, (n, phase, seq, 0, order))
+                    continue
+            
+            if phase == self.LIMIT_PHASE:
+                if order.direction == DIRECTION_LONG:
+                    self.fillLimitOrder(order, min(order.price, openPrice))
+                else:
+                    self.fillLimitOrder(order, max(order.price, openPrice))
+            else:
+                if order.direction == DIRECTION_LONG:
+                    self.fillStopOrder(order, max(openPrice, order.price))
+                else:
+                    self.fillStopOrder(order, min(openPrice, order.price))
         
     #----------------------------------------------------------------------
     def newBar(self, bar):
@@ -345,46 +797,51 @@ class BacktestingEngine(object):
                          order.price<=sellCrossPrice and
                          sellCrossPrice > 0)    # 国内的tick行情在跌停时bidPrice1为0，此时卖无法成交
             
-            # 如果发生了成交
-            if buyCross or sellCross:
-                # 推送成交数据
-                self.tradeCount += 1            # 成交编号自增1
-                tradeID = str(self.tradeCount)
-                trade = VtTradeData()
-                trade.vtSymbol = order.vtSymbol
-                trade.tradeID = tradeID
-                trade.vtTradeID = tradeID
-                trade.orderID = order.orderID
-                trade.vtOrderID = order.orderID
-                trade.direction = order.direction
-                trade.offset = order.offset
-                
-                # 以买入为例：
-                # 1. 假设当根K线的OHLC分别为：100, 125, 90, 110
-                # 2. 假设在上一根K线结束(也是当前K线开始)的时刻，策略发出的委托为限价105
-                # 3. 则在实际中的成交价会是100而不是105，因为委托发出时市场的最优价格是100
-                if buyCross:
-                    trade.price = min(order.price, buyBestCrossPrice)
-                    self.strategy.pos += order.totalVolume
-                else:
-                    trade.price = max(order.price, sellBestCrossPrice)
-                    self.strategy.pos -= order.totalVolume
-                
-                trade.volume = order.totalVolume
-                trade.tradeTime = self.dt.strftime('%H:%M:%S')
-                trade.dt = self.dt
-                self.strategy.onTrade(trade)
-                
-                self.tradeDict[tradeID] = trade
-                
-                # 推送委托数据
-                order.tradedVolume = order.totalVolume
-                order.status = STATUS_ALLTRADED
-                self.strategy.onOrder(order)
-                
-                # 从字典中删除该限价单
-                if orderID in self.workingLimitOrderDict:
-                    del self.workingLimitOrderDict[orderID]
+            # 以买入为例：
+            # 1. 假设当根K线的OHLC分别为：100, 125, 90, 110
+            # 2. 假设在上一根K线结束(也是当前K线开始)的时刻，策略发出的委托为限价105
+            # 3. 则在实际中的成交价会是100而不是105，因为委托发出时市场的最优价格是100
+            if buyCross:
+                self.fillLimitOrder(order, min(order.price, buyBestCrossPrice))
+            elif sellCross:
+                self.fillLimitOrder(order, max(order.price, sellBestCrossPrice))
+    
+    #----------------------------------------------------------------------
+    def fillLimitOrder(self, order, price):
+        """限价单以price全部成交"""
+        # 推送成交数据
+        self.tradeCount += 1            # 成交编号自增1
+        tradeID = str(self.tradeCount)
+        trade = VtTradeData()
+        trade.vtSymbol = order.vtSymbol
+        trade.tradeID = tradeID
+        trade.vtTradeID = tradeID
+        trade.orderID = order.orderID
+        trade.vtOrderID = order.orderID
+        trade.direction = order.direction
+        trade.offset = order.offset
+        trade.price = price
+        
+        if order.direction == DIRECTION_LONG:
+            self.strategy.pos += order.totalVolume
+        else:
+            self.strategy.pos -= order.totalVolume
+        
+        trade.volume = order.totalVolume
+        trade.tradeTime = self.dt.strftime('%H:%M:%S')
+        trade.dt = self.dt
+        self.strategy.onTrade(trade)
+        
+        self.tradeDict[tradeID] = trade
+        
+        # 推送委托数据
+        order.tradedVolume = order.totalVolume
+        order.status = STATUS_ALLTRADED
+        self.strategy.onOrder(order)
+        
+        # 从字典中删除该限价单
+        if order.orderID in self.workingLimitOrderDict:
+            del self.workingLimitOrderDict[order.orderID]
                 
     #----------------------------------------------------------------------
     def crossStopOrder(self):
@@ -399,66 +856,73 @@ class BacktestingEngine(object):
             sellCrossPrice = self.tick.lastPrice
             bestCrossPrice = self.tick.lastPrice
         
-        # 遍历停止单字典中的所有停止单
-        for stopOrderID, so in self.workingStopOrderDict.items():
-            # 判断是否会成交
-            buyCross = so.direction==DIRECTION_LONG and so.price<=buyCrossPrice
-            sellCross = so.direction==DIRECTION_SHORT and so.price>=sellCrossPrice
+        # 从停止单簿中取出会成交的停止单
+        for so in self.stopOrderBook.getTriggered(buyCrossPrice, sellCrossPrice):
+            # 可能已经在之前的回调中被撤销
+            if so.stopOrderID not in self.workingStopOrderDict:
+                continue
             
-            # 如果发生了成交
-            if buyCross or sellCross:
-                # 更新停止单状态，并从字典中删除该停止单
-                so.status = STOPORDER_TRIGGERED
-                if stopOrderID in self.workingStopOrderDict:
-                    del self.workingStopOrderDict[stopOrderID]                        
-
-                # 推送成交数据
-                self.tradeCount += 1            # 成交编号自增1
-                tradeID = str(self.tradeCount)
-                trade = VtTradeData()
-                trade.vtSymbol = so.vtSymbol
-                trade.tradeID = tradeID
-                trade.vtTradeID = tradeID
-                
-                if buyCross:
-                    self.strategy.pos += so.volume
-                    trade.price = max(bestCrossPrice, so.price)
-                else:
-                    self.strategy.pos -= so.volume
-                    trade.price = min(bestCrossPrice, so.price)                
-                
-                self.limitOrderCount += 1
-                orderID = str(self.limitOrderCount)
-                trade.orderID = orderID
-                trade.vtOrderID = orderID
-                trade.direction = so.direction
-                trade.offset = so.offset
-                trade.volume = so.volume
-                trade.tradeTime = self.dt.strftime('%H:%M:%S')
-                trade.dt = self.dt
-                
-                self.tradeDict[tradeID] = trade
-                
-                # 推送委托数据
-                order = VtOrderData()
-                order.vtSymbol = so.vtSymbol
-                order.symbol = so.vtSymbol
-                order.orderID = orderID
-                order.vtOrderID = orderID
-                order.direction = so.direction
-                order.offset = so.offset
-                order.price = so.price
-                order.totalVolume = so.volume
-                order.tradedVolume = so.volume
-                order.status = STATUS_ALLTRADED
-                order.orderTime = trade.tradeTime
-                
-                self.limitOrderDict[orderID] = order
-                
-                # 按照顺序推送数据
-                self.strategy.onStopOrder(so)
-                self.strategy.onOrder(order)
-                self.strategy.onTrade(trade)
+            if so.direction == DIRECTION_LONG:
+                self.fillStopOrder(so, max(bestCrossPrice, so.price))
+            else:
+                self.fillStopOrder(so, min(bestCrossPrice, so.price))
+    
+    #----------------------------------------------------------------------
+    def fillStopOrder(self, so, price):
+        """停止单触发后以price全部成交"""
+        stopOrderID = so.stopOrderID
+        
+        # 更新停止单状态，并从字典中删除该停止单
+        so.status = STOPORDER_TRIGGERED
+        del self.workingStopOrderDict[stopOrderID]
+        self.stopOrderBook.removeStopOrder(so)
+
+        # 推送成交数据
+        self.tradeCount += 1            # 成交编号自增1
+        tradeID = str(self.tradeCount)
+        trade = VtTradeData()
+        trade.vtSymbol = so.vtSymbol
+        trade.tradeID = tradeID
+        trade.vtTradeID = tradeID
+        trade.price = price
+        
+        if so.direction == DIRECTION_LONG:
+            self.strategy.pos += so.volume
+        else:
+            self.strategy.pos -= so.volume
+        
+        self.limitOrderCount += 1
+        orderID = str(self.limitOrderCount)
+        trade.orderID = orderID
+        trade.vtOrderID = orderID
+        trade.direction = so.direction
+        trade.offset = so.offset
+        trade.volume = so.volume
+        trade.tradeTime = self.dt.strftime('%H:%M:%S')
+        trade.dt = self.dt
+        
+        self.tradeDict[tradeID] = trade
+        
+        # 推送委托数据
+        order = VtOrderData()
+        order.vtSymbol = so.vtSymbol
+        order.symbol = so.vtSymbol
+        order.orderID = orderID
+        order.vtOrderID = orderID
+        order.direction = so.direction
+        order.offset = so.offset
+        order.price = so.price
+        order.totalVolume = so.volume
+        order.tradedVolume = so.volume
+        order.status = STATUS_ALLTRADED
+        order.orderTime = trade.tradeTime
+        
+        self.limitOrderDict[orderID] = order
+        
+        # 按照顺序推送数据
+        self.strategy.onStopOrder(so)
+        self.strategy.onOrder(order)
+        self.strategy.onTrade(trade)
     
     #------------------------------------------------
     # 策略接口相关
@@ -496,6 +960,11 @@ class BacktestingEngine(object):
         self.workingLimitOrderDict[orderID] = order
         self.limitOrderDict[orderID] = order
         
+        # 向量化回放中，当前K线上发出的限价单从下一根K线开始撮合
+        if self.vectorIndex >= 0:
+            self.addVectorOrder(self.LIMIT_PHASE, order, self.vectorIndex+1, 
+                                self.limitOrderCount)
+        
         return [orderID]
     
     #----------------------------------------------------------------------
@@ -541,6 +1010,14 @@ class BacktestingEngine(object):
         # 保存stopOrder对象到字典中
         self.stopOrderDict[stopOrderID] = so
         self.workingStopOrderDict[stopOrderID] = so
+        self.stopOrderBook.addStopOrder(so)
+        
+        # 向量化回放中，限价单成交回调里发出的停止单仍参与当前K线的撮合
+        if self.vectorIndex >= 0:
+            index = self.vectorIndex
+            if self.vectorPhase != self.LIMIT_PHASE:
+                index += 1
+            self.addVectorOrder(self.STOP_PHASE, so, index, self.stopOrderCount)
         
         # 推送停止单初始更新
         self.strategy.onStopOrder(so)        
@@ -555,6 +1032,7 @@ class BacktestingEngine(object):
             so = self.workingStopOrderDict[stopOrderID]
             so.status = STOPORDER_CANCELLED
             del self.workingStopOrderDict[stopOrderID]
+            self.stopOrderBook.removeStopOrder(so)
             self.strategy.onStopOrder(so)
     
     #----------------------------------------------------------------------
@@ -887,6 +1365,7 @@ class BacktestingEngine(object):
         self.stopOrderCount = 0
         self.stopOrderDict.clear()
         self.workingStopOrderDict.clear()
+        self.stopOrderBook.clear()
         
         # 清空成交相关
         self.tradeCount = 0
@@ -938,21 +1417,36 @@ class BacktestingEngine(object):
         if not settingList or not targetName:
             self.output(u'优化设置有问题，请检查')
         
-        # 多进程优化，启动一个对应CPU核心数量的进程池
-        pool = multiprocessing.Pool(multiprocessing.cpu_count())
-        l = []
-
-        for setting in settingList:
-            l.append(pool.apply_async(optimize, (strategyClass, setting,
-                                                 targetName, self.mode, 
-                                                 self.startDate, self.initDays, self.endDate,
-                                                 self.slippage, self.rate, self.size, self.priceTick,
-                                                 self.dbName, self.symbol)))
-        pool.close()
-        pool.join()
+        # 在父进程中只载入一次历史数据，保存为快照后由各进程内存映射读取
+        snapshotPath = tempfile.mkdtemp(prefix='vnpy_backtesting_')
+        pool = None
+        
+        try:
+            self.output(u'创建历史数据快照：%s' %snapshotPath)
+            self.createDataSnapshot(snapshotPath)
+            
+            # 多进程优化，启动一个对应CPU核心数量的进程池
+            pool = multiprocessing.Pool(multiprocessing.cpu_count())
+            l = []
+    
+            for setting in settingList:
+                l.append(pool.apply_async(optimize, (strategyClass, setting,
+                                                     targetName, self.mode, 
+                                                     self.startDate, self.initDays, self.endDate,
+                                                     self.slippage, self.rate, self.size, self.priceTick,
+                                                     self.dbName, self.symbol, self.vectorMode,
+                                                     snapshotPath)))
+            pool.close()
+            pool.join()
+            
+            resultList = [res.get() for res in l]
+        finally:
+            # 出现异常时也要结束进程池并清除快照
+            if pool:
+                pool.terminate()
+            shutil.rmtree(snapshotPath, ignore_errors=True)
         
         # 显示结果
-        resultList = [res.get() for res in l]
         resultList.sort(reverse=True, key=lambda result:result[1])
         self.output('-' * 30)
         self.output(u'优化结果：')
@@ -1293,53 +1787,298 @@ class OptimizationSetting(object):
         self.optimizeTarget = target
 
 
+########################################################################
+class HistorySegment(object):
+    """历史数据缓存中的一段连续数据，覆盖[start, end)的时间范围"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, start, end, history):
+        """Constructor"""
+        self.start = start                                      # 开始时间（包含）
+        self.end = end                                          # 结束时间（不包含）
+        self.history = history                                  # 按时间排序的数据字典列表
+        self.dtList = [d['datetime'] for d in history]          # 用于二分查找的时间列表
+        self.size = self.estimateSize()                         # 估算的内存占用（字节）
+
+    #----------------------------------------------------------------------
+    def estimateSize(self):
+        """以第一条数据估算内存占用，每条数据另计两个列表中的指针"""
+        if not self.history:
+            return 0
+
+        d = self.history[0]
+        recordSize = sys.getsizeof(d) + sum([sys.getsizeof(v) for v in d.values()])
+        return len(self.history) * (recordSize + 16)
+
+    #----------------------------------------------------------------------
+    def covers(self, start, end):
+        """检查是否完整覆盖[start, end)"""
+        return self.start <= start and end <= self.end
+
+    #----------------------------------------------------------------------
+    def getSlice(self, start, end):
+        """获取[start, end)范围内的数据"""
+        startIndex = bisect_left(self.dtList, start)
+        endIndex = bisect_left(self.dtList, end)
+        return self.history[startIndex:endIndex]
+
+
+########################################################################
+class HistoryCache(object):
+    """
+    历史数据内存缓存
+    
+    每个合约缓存若干段互不重叠的连续数据，请求的时间范围被某段数据完整覆盖时直接切片返回，
+    和已缓存数据部分重叠时只加载缺失的部分，再合并为一段新的连续数据。
+    缓存总量超过上限时按最近最少使用（LRU）的顺序淘汰数据段。
+    
+    结束时间为None表示不限制，缓存中以datetime.max表示。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, loadFunc, maxSize=1024):
+        """
+        Constructor
+        loadFunc：加载数据的函数，参数为(dbName, symbol, start, end)
+        maxSize：缓存上限，单位为MB
+        """
+        self.loadFunc = loadFunc
+        self.maxSize = maxSize * 1024 * 1024
+
+        self.segmentDict = {}           # (dbName, symbol):数据段列表（按开始时间排序）
+        self.lruDict = OrderedDict()    # 数据段:(dbName, symbol)，最近使用的排在最后
+        self.size = 0                   # 当前缓存占用
+
+        self.lock = Lock()              # 缓存数据结构的锁
+        self.loadLockDict = {}          # (dbName, symbol):加载数据的锁，同一合约不重复加载
+
+        # 统计信息
+        self.hitCount = 0               # 完整命中
+        self.partialCount = 0           # 部分命中，只加载缺失部分
+        self.missCount = 0              # 未命中
+        self.evictCount = 0             # 淘汰的数据段数量
+
+    #----------------------------------------------------------------------
+    def get(self, dbName, symbol, start, end):
+        """获取[start, end)范围内的数据"""
+        key = (dbName, symbol)
+        start = start or datetime.min
+        end = end or datetime.max
+
+        # 首先检查是否完整命中
+        history = self.getCached(key, start, end)
+        if history is not None:
+            return history
+
+        # 同一合约的加载串行处理，等待期间其他线程加载的数据可以直接使用
+        with self.lock:
+            loadLock = self.loadLockDict.setdefault(key, Lock())
+
+        with loadLock:
+            history = self.getCached(key, start, end)
+            if history is not None:
+                return history
+
+            # 找出重叠或相邻的数据段，计算缺失的时间范围
+            with self.lock:
+                segmentList = [segment for segment in self.segmentDict.get(key, [])
+                               if segment.start <= end and start <= segment.end]
+
+                if segmentList:
+                    self.partialCount += 1
+                else:
+                    self.missCount += 1
+
+            newStart = min([start] + [segment.start for segment in segmentList])
+            newEnd = max([end] + [segment.end for segment in segmentList])
+
+            # 依次加载数据段之间的空缺，按时间顺序拼接
+            history = []
+            cursor = newStart
+            for segment in segmentList + [None]:
+                if segment:
+                    gapEnd = segment.start
+                else:
+                    gapEnd = newEnd
+
+                if cursor < gapEnd:
+                    history.extend(self.load(dbName, symbol, cursor, gapEnd))
+
+                if segment:
+                    history.extend(segment.history)
+                    cursor = segment.end
+
+            newSegment = HistorySegment(newStart, newEnd, history)
+
+            with self.lock:
+                for segment in segmentList:
+                    self.removeSegment(key, segment)
+                self.addSegment(key, newSegment)
+
+            return newSegment.getSlice(start, end)
+
+    #----------------------------------------------------------------------
+    def getCached(self, key, start, end):
+        """查找完整覆盖请求范围的数据段，找到则返回切片，否则返回None"""
+        with self.lock:
+            for segment in self.segmentDict.get(key, []):
+                if segment.covers(start, end):
+                    self.lruDict[segment] = self.lruDict.pop(segment)
+                    self.hitCount += 1
+                    return segment.getSlice(start, end)
+        return None
+
+    #----------------------------------------------------------------------
+    def load(self, dbName, symbol, start, end):
+        """加载数据，将缓存内部使用的时间边界还原为None"""
+        if start == datetime.min:
+            start = None
+        if end == datetime.max:
+            end = None
+        return self.loadFunc(dbName, symbol, start, end)
+
+    #----------------------------------------------------------------------
+    def addSegment(self, key, segment):
+        """添加数据段，超过上限时淘汰最久未使用的数据段"""
+        # 单段数据超过上限时不缓存
+        if segment.size > self.maxSize:
+            return
+
+        l = self.segmentDict.setdefault(key, [])
+        l.append(segment)
+        l.sort(key=lambda s: s.start)
+
+        self.lruDict[segment] = key
+        self.size += segment.size
+
+        while self.size > self.maxSize:
+            oldSegment = next(iter(self.lruDict))
+            self.removeSegment(self.lruDict[oldSegment], oldSegment)
+            self.evictCount += 1
+
+    #----------------------------------------------------------------------
+    def removeSegment(self, key, segment):
+        """移除数据段（已被其他线程淘汰的直接忽略）"""
+        if segment not in self.lruDict:
+            return
+
+        del self.lruDict[segment]
+        self.size -= segment.size
+
+        l = self.segmentDict[key]
+        l.remove(segment)
+        if not l:
+            del self.segmentDict[key]
+
+    #----------------------------------------------------------------------
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.segmentDict.clear()
+            self.lruDict.clear()
+            self.size = 0
+
+    #----------------------------------------------------------------------
+    def getStatus(self):
+        """查询缓存统计信息"""
+        with self.lock:
+            count = self.hitCount + self.partialCount + self.missCount
+            if count:
+                hitRatio = self.hitCount / count
+            else:
+                hitRatio = 0
+
+            return {
+                'hitCount': self.hitCount,
+                'partialCount': self.partialCount,
+                'missCount': self.missCount,
+                'hitRatio': hitRatio,
+                'evictCount': self.evictCount,
+                'symbolCount': len(self.segmentDict),
+                'segmentCount': len(self.lruDict),
+                'size': self.size / 1024 / 1024,
+                'maxSize': self.maxSize / 1024 / 1024
+            }
+
+
 ########################################################################
 class HistoryDataServer(RpcServer):
     """历史数据缓存服务器"""
 
     #----------------------------------------------------------------------
-    def __init__(self, repAddress, pubAddress):
-        """Constructor"""
-        super(HistoryDataServer, self).__init__(repAddress, pubAddress)
+    def __init__(self, repAddress, pubAddress, storePath='', workerCount=0, cacheSize=1024):
+        """
+        Constructor
+        cacheSize：内存缓存上限，单位为MB
+        """
+        super(HistoryDataServer, self).__init__(repAddress, pubAddress, workerCount)
         
         self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], 
                                             globalSetting['mongoPort'])
         
-        self.historyDict = {}
+        # 本地列式数据库，传入路径时启用
+        self.historyStore = None
+        if storePath:
+            self.historyStore = HistoryStore(storePath)
+        
+        self.historyCache = HistoryCache(self.loadData, cacheSize)
         
         self.register(self.loadHistoryData)
+        self.register(self.getCacheStatus)
+        self.register(self.clearCache)
     
     #----------------------------------------------------------------------
     def loadHistoryData(self, dbName, symbol, start, end):
-        """"""
-        # 首先检查是否有缓存，如果有则直接返回
-        history = self.historyDict.get((dbName, symbol, start, end), None)
-        if history:
-            print(u'找到内存缓存：%s %s %s %s' %(dbName, symbol, start, end))
+        """加载[start, end)范围内的历史数据，优先使用内存缓存"""
+        return self.historyCache.get(dbName, symbol, start, end)
+    
+    #----------------------------------------------------------------------
+    def loadData(self, dbName, symbol, start, end):
+        """从本地列式数据库或者MongoDB加载数据"""
+        # 优先从本地列式数据库加载
+        if self.historyStore and self.historyStore.hasData(dbName, symbol):
+            arrayDict = self.historyStore.loadArray(dbName, symbol, start, end)
+            history = list(self.historyStore.iterDict(arrayDict))
+            
+            print(u'从本地数据库加载：%s %s %s %s' %(dbName, symbol, start, end))
             return history
         
         # 否则从数据库加载
         collection = self.dbClient[dbName][symbol]
         
+        flt = {}
+        if start:
+            flt['$gte'] = start
         if end:
-            flt = {'datetime':{'$gte':start, '$lt':end}}        
+            flt['$lt'] = end
+        
+        if flt:
+            cx = collection.find({'datetime': flt}).sort('datetime')
         else:
-            flt = {'datetime':{'$gte':start}}        
-            
-        cx = collection.find(flt).sort('datetime')
+            cx = collection.find().sort('datetime')
         history = [d for d in cx]
         
-        self.historyDict[(dbName, symbol, start, end)] = history
         print(u'从数据库加载：%s %s %s %s' %(dbName, symbol, start, end))
         return history
     
+    #----------------------------------------------------------------------
+    def getCacheStatus(self):
+        """查询内存缓存的命中率和内存占用"""
+        return self.historyCache.getStatus()
+    
+    #----------------------------------------------------------------------
+    def clearCache(self):
+        """清空内存缓存"""
+        self.historyCache.clear()
+    
 #----------------------------------------------------------------------
-def runHistoryDataServer():
+def runHistoryDataServer(storePath='', workerCount=4, cacheSize=1024):
     """"""
     repAddress = 'tcp://*:5555'
     pubAddress = 'tcp://*:7777'
 
-    hds = HistoryDataServer(repAddress, pubAddress)
+    # 使用多个工作线程，避免单个较慢的数据库查询阻塞其他回测进程
+    hds = HistoryDataServer(repAddress, pubAddress, storePath, workerCount, cacheSize)
     hds.start()
 
     print(u'按任意键退出')
@@ -1357,10 +2096,12 @@ def formatNumber(n):
 def optimize(strategyClass, setting, targetName,
              mode, startDate, initDays, endDate,
              slippage, rate, size, priceTick,
-             dbName, symbol):
+             dbName, symbol, vectorMode=False, snapshotPath=''):
     """多进程优化时跑在每个进程中运行的函数"""
     engine = BacktestingEngine()
     engine.setBacktestingMode(mode)
+    engine.setVectorMode(vectorMode)
+    engine.setDataSnapshot(snapshotPath)
     engine.setStartDate(startDate, initDays)
     engine.setEndDate(endDate)
     engine.setSlippage(slippage)
@@ -4,8 +4,11 @@
 本文件中包含了CTA模块中用到的一些基础设置、类和常量等。
 '''
 
+from bisect import bisect_left, bisect_right
+from itertools import count
+
 # CTA引擎中涉及的数据类定义
-from vnpy.trader.vtConstant import EMPTY_UNICODE, EMPTY_STRING, EMPTY_FLOAT, EMPTY_INT
+from vnpy.trader.vtConstant import EMPTY_UNICODE, EMPTY_STRING, EMPTY_FLOAT, EMPTY_INT, DIRECTION_LONG
 
 # 常量定义
 # CTA引擎中涉及到的交易方向类型
@@ -55,4 +58,94 @@ class StopOrder(object):
         
         self.strategy = None             # 下停止单的策略对象
         self.stopOrderID = EMPTY_STRING  # 停止单的本地编号 
-        self.status = EMPTY_STRING       # 停止单状态
\ No newline at end of file
+        self.status = EMPTY_STRING       # 停止单状态
+
+
+########################################################################
+class StopOrderBook(object):
+    """
+    单个合约的本地停止单簿
+    
+    买入停止单按触发价从低到高排序，价格上涨到触发价时触发；卖出停止单按触发价
+    从高到低排序（保存为负价格），价格下跌到触发价时触发。每次行情只需要二分查找
+    出被触发的前缀，不用遍历所有停止单。同价格的停止单按发出的先后排序。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.buyKeyList = []        # 买入停止单的排序键(触发价, 序号)
+        self.buyOrderList = []      # 和排序键对应的停止单
+        self.sellKeyList = []       # 卖出停止单的排序键(-触发价, 序号)
+        self.sellOrderList = []
+        
+        self.keyDict = {}           # stopOrderID:排序键
+        self.counter = count()
+    
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """停止单数量"""
+        return len(self.keyDict)
+    
+    #----------------------------------------------------------------------
+    def getLists(self, so):
+        """获取停止单所在方向的排序键列表和停止单列表"""
+        if so.direction == DIRECTION_LONG:
+            return self.buyKeyList, self.buyOrderList
+        else:
+            return self.sellKeyList, self.sellOrderList
+    
+    #----------------------------------------------------------------------
+    def addStopOrder(self, so):
+        """添加停止单"""
+        if so.direction == DIRECTION_LONG:
+            key = (so.price, next(self.counter))
+        else:
+            key = (-so.price, next(self.counter))
+        
+        keyList, orderList = self.getLists(so)
+        i = bisect_right(keyList, key)
+        keyList.insert(i, key)
+        orderList.insert(i, so)
+        
+        self.keyDict[so.stopOrderID] = key
+    
+    #----------------------------------------------------------------------
+    def removeStopOrder(self, so):
+        """移除停止单，返回是否存在"""
+        key = self.keyDict.pop(so.stopOrderID, None)
+        if key is None:
+            return False
+        
+        keyList, orderList = self.getLists(so)
+        i = bisect_left(keyList, key)
+        del keyList[i]
+        del orderList[i]
+        return True
+    
+    #----------------------------------------------------------------------
+    def getTriggered(self, buyPrice, sellPrice):
+        """
+        获取被触发的停止单列表（不移除），按发出的先后排序
+        buyPrice为买入停止单的触发判断价格，sellPrice为卖出停止单的触发判断价格
+        """
+        # 触发价小于等于buyPrice的买入停止单
+        buyCount = bisect_right(self.buyKeyList, (buyPrice, float('inf')))
+        
+        # 触发价大于等于sellPrice的卖出停止单
+        sellCount = bisect_right(self.sellKeyList, (-sellPrice, float('inf')))
+        
+        l = self.buyOrderList[:buyCount] + self.sellOrderList[:sellCount]
+        if len(l) > 1:
+            keyDict = self.keyDict
+            l.sort(key=lambda so: keyDict[so.stopOrderID][1])
+        return l
+    
+    #----------------------------------------------------------------------
+    def clear(self):
+        """清空"""
+        del self.buyKeyList[:]
+        del self.buyOrderList[:]
+        del self.sellKeyList[:]
+        del self.sellOrderList[:]
+        self.keyDict.clear()
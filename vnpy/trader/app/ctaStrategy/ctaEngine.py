@@ -9,7 +9,7 @@ from __future__ import division
 import json
 import os
 import traceback
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from copy import copy
 
@@ -18,7 +18,9 @@ from vnpy.trader.vtEvent import *
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import VtTickData, VtBarData
 from vnpy.trader.vtGateway import VtSubscribeReq, VtOrderReq, VtCancelOrderReq, VtLogData
-from vnpy.trader.vtFunction import todayDate, getJsonPath
+from vnpy.trader.vtFunction import todayDate, getJsonPath, DatetimeParser
+from vnpy.trader.vtGlobal import globalSetting
+from vnpy.trader.vtStore import HistoryStore
 from vnpy.trader.app import AppEngine
 
 from .ctaBase import *
@@ -51,6 +53,9 @@ class CtaEngine(AppEngine):
         # value为包含所有相关strategy对象的list
         self.tickStrategyDict = {}
         
+        # 行情时间解析器（接口推送时未能生成datetime的tick使用）
+        self.datetimeParser = DatetimeParser()
+        
         # 保存vtOrderID和strategy对象映射的字典（用于推送order和trade数据）
         # key为vtOrderID，value为strategy对象
         self.orderStrategyDict = {}     
@@ -64,16 +69,28 @@ class CtaEngine(AppEngine):
         self.stopOrderDict = {}             # 停止单撤销后不会从本字典中删除
         self.workingStopOrderDict = {}      # 停止单撤销后会从本字典中删除
         
+        # 按合约保存的活动停止单簿，key为vtSymbol，value为StopOrderBook对象
+        self.stopOrderBookDict = {}
+        
         # 保存策略名称和委托号列表的字典
         # key为name，value为保存orderID（限价+本地停止）的集合
         self.strategyOrderDict = {}
         
-        # 成交号集合，用来过滤已经收到过的成交推送
+        # 成交号集合，用来过滤已经收到过的策略成交推送
+        # 只保留最近的成交号，超出数量时按收到的先后顺序移除，0表示不限制
         self.tradeSet = set()
+        self.tradeQueue = deque()
+        self.tradeFilterSize = globalSetting.get('tradeFilterSize', 100000)
         
         # 引擎类型为实盘
         self.engineType = ENGINETYPE_TRADING
         
+        # 本地列式数据库，在全局配置中设置了路径时启用
+        self.historyStore = None
+        storePath = globalSetting.get('historyStorePath', '')
+        if storePath:
+            self.historyStore = HistoryStore(storePath)
+        
         # 注册日式事件类型
         self.mainEngine.registerLogEvent(EVENT_CTA_LOG)
         
@@ -184,6 +201,10 @@ class CtaEngine(AppEngine):
         self.stopOrderDict[stopOrderID] = so
         self.workingStopOrderDict[stopOrderID] = so
         
+        if vtSymbol not in self.stopOrderBookDict:
+            self.stopOrderBookDict[vtSymbol] = StopOrderBook()
+        self.stopOrderBookDict[vtSymbol].addStopOrder(so)
+        
         # 保存stopOrderID到策略委托号集合中
         self.strategyOrderDict[strategy.name].add(stopOrderID)
         
@@ -205,6 +226,7 @@ class CtaEngine(AppEngine):
             
             # 从活动停止单字典中移除
             del self.workingStopOrderDict[stopOrderID]
+            self.stopOrderBookDict[so.vtSymbol].removeStopOrder(so)
             
             # 从策略委托号集合中移除
             s = self.strategyOrderDict[strategy.name]
@@ -219,45 +241,48 @@ class CtaEngine(AppEngine):
         """收到行情后处理本地停止单（检查是否要立即发出）"""
         vtSymbol = tick.vtSymbol
         
-        # 首先检查是否有策略交易该合约
-        if vtSymbol in self.tickStrategyDict:
-            # 遍历等待中的停止单，检查是否会被触发
-            for so in self.workingStopOrderDict.values():
-                if so.vtSymbol == vtSymbol:
-                    longTriggered = so.direction==DIRECTION_LONG and tick.lastPrice>=so.price        # 多头停止单被触发
-                    shortTriggered = so.direction==DIRECTION_SHORT and tick.lastPrice<=so.price     # 空头停止单被触发
-                    
-                    if longTriggered or shortTriggered:
-                        # 买入和卖出分别以涨停跌停价发单（模拟市价单）
-                        if so.direction==DIRECTION_LONG:
-                            price = tick.upperLimit
-                        else:
-                            price = tick.lowerLimit
-                        
-                        # 发出市价委托
-                        vtOrderID = self.sendOrder(so.vtSymbol, so.orderType, 
-                                                   price, so.volume, so.strategy)
-                        
-                        # 检查因为风控流控等原因导致的委托失败（无委托号）
-                        if vtOrderID:
-                            # 从活动停止单字典中移除该停止单
-                            del self.workingStopOrderDict[so.stopOrderID]
-                            
-                            # 从策略委托号集合中移除
-                            s = self.strategyOrderDict[so.strategy.name]
-                            if so.stopOrderID in s:
-                                s.remove(so.stopOrderID)
-                            
-                            # 更新停止单状态，并通知策略
-                            so.status = STOPORDER_TRIGGERED
-                            so.strategy.onStopOrder(so)
+        # 首先检查是否有策略交易该合约，以及该合约是否有停止单
+        book = self.stopOrderBookDict.get(vtSymbol, None)
+        if vtSymbol not in self.tickStrategyDict or not book:
+            return
+        
+        # 从停止单簿中取出被触发的停止单（多头价格上涨到触发价，空头价格下跌到触发价）
+        for so in book.getTriggered(tick.lastPrice, tick.lastPrice):
+            # 可能已经在之前的回调中被撤销
+            if so.stopOrderID not in self.workingStopOrderDict:
+                continue
+            
+            # 买入和卖出分别以涨停跌停价发单（模拟市价单）
+            if so.direction==DIRECTION_LONG:
+                price = tick.upperLimit
+            else:
+                price = tick.lowerLimit
+            
+            # 发出市价委托
+            vtOrderID = self.sendOrder(so.vtSymbol, so.orderType, 
+                                       price, so.volume, so.strategy)
+            
+            # 检查因为风控流控等原因导致的委托失败（无委托号）
+            if vtOrderID:
+                # 从活动停止单字典和停止单簿中移除该停止单
+                del self.workingStopOrderDict[so.stopOrderID]
+                book.removeStopOrder(so)
+                
+                # 从策略委托号集合中移除
+                s = self.strategyOrderDict[so.strategy.name]
+                if so.stopOrderID in s:
+                    s.remove(so.stopOrderID)
+                
+                # 更新停止单状态，并通知策略
+                so.status = STOPORDER_TRIGGERED
+                so.strategy.onStopOrder(so)
 
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
         """处理行情推送"""
         tick = event.dict_['data']
         
-        tick = copy(tick)
+        # tick对象和其他模块共享，不再复制，策略中只能读取不能修改
         
         # 收到tick行情后，先处理本地停止单（检查是否要立即发出）
         self.processStopOrder(tick)
@@ -266,9 +291,9 @@ class CtaEngine(AppEngine):
         if tick.vtSymbol in self.tickStrategyDict:
             # tick时间可能出现异常数据，使用try...except实现捕捉和过滤
             try:
-                # 添加datetime字段
+                # 添加datetime字段（通常已由接口在推送时生成）
                 if not tick.datetime:
-                    tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
+                    tick.datetime = self.datetimeParser.parse(tick.date, tick.time)
             except ValueError:
                 self.writeCtaLog(traceback.format_exc())
                 return
@@ -301,13 +326,18 @@ class CtaEngine(AppEngine):
         """处理成交推送"""
         trade = event.dict_['data']
         
-        # 过滤已经收到过的成交回报
-        if trade.vtTradeID in self.tradeSet:
-            return
-        self.tradeSet.add(trade.vtTradeID)
-        
         # 将成交推送到策略对象中
         if trade.vtOrderID in self.orderStrategyDict:
+            # 过滤已经收到过的成交回报
+            vtTradeID = trade.vtTradeID
+            if vtTradeID in self.tradeSet:
+                return
+            self.tradeSet.add(vtTradeID)
+            self.tradeQueue.append(vtTradeID)
+            
+            if self.tradeFilterSize and len(self.tradeQueue) > self.tradeFilterSize:
+                self.tradeSet.discard(self.tradeQueue.popleft())
+            
             strategy = self.orderStrategyDict[trade.vtOrderID]
             
             # 计算策略持仓
@@ -331,13 +361,18 @@ class CtaEngine(AppEngine):
     #----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是VtTickData或者VtBarData）"""
-        self.mainEngine.dbInsert(dbName, collectionName, data.__dict__)
+        # 复制一份字典，数据库插入时添加的_id字段不会修改到共享的数据对象
+        self.mainEngine.dbInsert(dbName, collectionName, dict(data.__dict__))
     
     #----------------------------------------------------------------------
     def loadBar(self, dbName, collectionName, days):
         """从数据库中读取Bar数据，startDate是datetime对象"""
         startDate = self.today - timedelta(days)
         
+        # 优先从本地列式数据库读取
+        if self.historyStore and self.historyStore.hasData(dbName, collectionName):
+            return self.historyStore.loadData(dbName, collectionName, startDate)
+        
         d = {'datetime':{'$gte':startDate}}
         barData = self.mainEngine.dbQuery(dbName, collectionName, d, 'datetime')
         
@@ -353,6 +388,10 @@ class CtaEngine(AppEngine):
         """从数据库中读取Tick数据，startDate是datetime对象"""
         startDate = self.today - timedelta(days)
         
+        # 优先从本地列式数据库读取
+        if self.historyStore and self.historyStore.hasData(dbName, collectionName):
+            return self.historyStore.loadData(dbName, collectionName, startDate)
+        
         d = {'datetime':{'$gte':startDate}}
         tickData = self.mainEngine.dbQuery(dbName, collectionName, d, 'datetime')
         
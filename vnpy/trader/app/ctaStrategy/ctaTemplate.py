@@ -4,6 +4,10 @@
 本文件包含了CTA引擎中的策略开发用模板，开发策略时需要继承CtaTemplate类。
 '''
 
+from __future__ import division
+
+from collections import deque
+
 import numpy as np
 import talib
 
@@ -79,7 +83,7 @@ class CtaTemplate(object):
 
     #----------------------------------------------------------------------
     def onTick(self, tick):
-        """收到行情TICK推送（必须由用户继承实现）"""
+        """收到行情TICK推送（必须由用户继承实现），tick对象和其他模块共享，只能读取不能修改"""
         raise NotImplementedError
 
     #----------------------------------------------------------------------
@@ -466,8 +470,12 @@ class ArrayManager(object):
     """
 
     #----------------------------------------------------------------------
-    def __init__(self, size=100):
-        """Constructor"""
+    def __init__(self, size=100, streaming=False):
+        """
+        Constructor
+        streaming为True时，sma/ema/std/atr/rsi/donchian等指标在只获取最新值时
+        使用增量计算（首次获取时注册，之后随updateBar以O(1)更新）
+        """
         self.count = 0                      # 缓存计数
         self.size = size                    # 缓存大小
         self.inited = False                 # True if count>=size
@@ -478,6 +486,9 @@ class ArrayManager(object):
         self.closeArray = np.zeros(size)
         self.volumeArray = np.zeros(size)
         
+        self.streaming = streaming          # 是否使用增量计算指标
+        self.indicatorDict = {}             # 已注册的增量指标，key为(指标名, 参数)
+        
     #----------------------------------------------------------------------
     def updateBar(self, bar):
         """更新K线"""
@@ -497,6 +508,32 @@ class ArrayManager(object):
         self.closeArray[-1] = bar.close
         self.volumeArray[-1] = bar.volume
         
+        self.updateIndicator(bar)
+        
+    #----------------------------------------------------------------------
+    def updateIndicator(self, bar):
+        """更新已注册的增量指标"""
+        if self.indicatorDict:
+            for indicator in self.indicatorDict.values():
+                indicator.update(bar.high, bar.low, bar.close)
+    
+    #----------------------------------------------------------------------
+    def getIndicator(self, key, indicatorClass, *args):
+        """获取增量指标，首次获取时注册，并使用当前缓存的序列进行预热"""
+        indicator = self.indicatorDict.get(key, None)
+        
+        if indicator is None:
+            indicator = indicatorClass(*args)
+            
+            for high, low, close in zip(self.high.tolist(), 
+                                        self.low.tolist(), 
+                                        self.close.tolist()):
+                indicator.update(high, low, close)
+            
+            self.indicatorDict[key] = indicator
+        
+        return indicator
+        
     #----------------------------------------------------------------------
     @property
     def open(self):
@@ -530,6 +567,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def sma(self, n, array=False):
         """简单均线"""
+        if self.streaming and not array:
+            return self.getIndicator(('sma', n), SmaIndicator, n).value
+        
         result = talib.SMA(self.close, n)
         if array:
             return result
@@ -538,11 +578,25 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def std(self, n, array=False):
         """标准差"""
+        if self.streaming and not array:
+            return self.getIndicator(('std', n), StdIndicator, n).value
+        
         result = talib.STDDEV(self.close, n)
         if array:
             return result
         return result[-1]
     
+    #----------------------------------------------------------------------
+    def ema(self, n, array=False):
+        """指数均线"""
+        if self.streaming and not array:
+            return self.getIndicator(('ema', n), EmaIndicator, n).value
+        
+        result = talib.EMA(self.close, n)
+        if array:
+            return result
+        return result[-1]
+    
     #----------------------------------------------------------------------
     def cci(self, n, array=False):
         """CCI指标"""
@@ -554,6 +608,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def atr(self, n, array=False):
         """ATR指标"""
+        if self.streaming and not array:
+            return self.getIndicator(('atr', n), AtrIndicator, n).value
+        
         result = talib.ATR(self.high, self.low, self.close, n)
         if array:
             return result
@@ -562,6 +619,9 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def rsi(self, n, array=False):
         """RSI指标"""
+        if self.streaming and not array:
+            return self.getIndicator(('rsi', n), RsiIndicator, n).value
+        
         result = talib.RSI(self.close, n)
         if array:
             return result
@@ -609,6 +669,11 @@ class ArrayManager(object):
     #----------------------------------------------------------------------
     def donchian(self, n, array=False):
         """唐奇安通道"""
+        if self.streaming and not array:
+            up = self.getIndicator(('max', n), MaxIndicator, n).value
+            down = self.getIndicator(('min', n), MinIndicator, n).value
+            return up, down
+        
         up = talib.MAX(self.high, n)
         down = talib.MIN(self.low, n)
         
@@ -617,6 +682,322 @@ class ArrayManager(object):
         return up[-1], down[-1]
     
 
+########################################################################
+class RingArrayManager(ArrayManager):
+    """
+    基于环形缓冲区的K线序列管理工具，接口和ArrayManager完全一致
+    
+    ArrayManager每次更新都要平移整个数组，开销随size线性增长，
+    这里每个数据同时写入两倍长度缓冲区中相隔size的两个位置，
+    使得任意时刻按时间排序的序列都是缓冲区中的一段连续内存，
+    更新K线为O(1)，只有在获取序列（计算指标）时才生成切片视图，无需复制数据。
+    适用于size较大（如1000以上）的长周期策略。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, size=100, streaming=False):
+        """Constructor"""
+        self.count = 0                      # 缓存计数
+        self.size = size                    # 缓存大小
+        self.inited = False                 # True if count>=size
+        
+        self.streaming = streaming          # 是否使用增量计算指标
+        self.indicatorDict = {}             # 已注册的增量指标，key为(指标名, 参数)
+        
+        self.index = 0                      # 下一根K线的写入位置
+        
+        self.openBuffer = np.zeros(size*2)  # OHLC
+        self.highBuffer = np.zeros(size*2)
+        self.lowBuffer = np.zeros(size*2)
+        self.closeBuffer = np.zeros(size*2)
+        self.volumeBuffer = np.zeros(size*2)
+    
+    #----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """更新K线"""
+        self.count += 1
+        if not self.inited and self.count >= self.size:
+            self.inited = True
+        
+        i = self.index
+        j = i + self.size
+        
+        self.openBuffer[i] = self.openBuffer[j] = bar.open
+        self.highBuffer[i] = self.highBuffer[j] = bar.high
+        self.lowBuffer[i] = self.lowBuffer[j] = bar.low
+        self.closeBuffer[i] = self.closeBuffer[j] = bar.close
+        self.volumeBuffer[i] = self.volumeBuffer[j] = bar.volume
+        
+        self.index = (i + 1) % self.size
+        
+        self.updateIndicator(bar)
+    
+    #----------------------------------------------------------------------
+    @property
+    def openArray(self):
+        """开盘价序列视图"""
+        return self.openBuffer[self.index:self.index+self.size]
+    
+    #----------------------------------------------------------------------
+    @property
+    def highArray(self):
+        """最高价序列视图"""
+        return self.highBuffer[self.index:self.index+self.size]
+    
+    #----------------------------------------------------------------------
+    @property
+    def lowArray(self):
+        """最低价序列视图"""
+        return self.lowBuffer[self.index:self.index+self.size]
+    
+    #----------------------------------------------------------------------
+    @property
+    def closeArray(self):
+        """收盘价序列视图"""
+        return self.closeBuffer[self.index:self.index+self.size]
+    
+    #----------------------------------------------------------------------
+    @property
+    def volumeArray(self):
+        """成交量序列视图"""
+        return self.volumeBuffer[self.index:self.index+self.size]
+    
+
+########################################################################
+class SmaIndicator(object):
+    """增量计算的简单均线"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.window = deque()       # 最近n个收盘价
+        self.total = 0              # 窗口内收盘价之和
+        self.count = 0              # 更新次数
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        self.window.append(close)
+        self.total += close
+        
+        if len(self.window) > self.n:
+            self.total -= self.window.popleft()
+        
+        # 每n次更新重新求和一次，消除累加带来的浮点误差
+        self.count += 1
+        if not self.count % self.n:
+            self.total = sum(self.window)
+        
+        if len(self.window) == self.n:
+            self.value = self.total / self.n
+
+
+########################################################################
+class StdIndicator(object):
+    """增量计算的标准差（总体标准差，和talib.STDDEV一致）"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.window = deque()
+        self.total = 0              # 窗口内收盘价之和
+        self.squareTotal = 0        # 窗口内收盘价平方之和
+        self.count = 0
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        self.window.append(close)
+        self.total += close
+        self.squareTotal += close * close
+        
+        if len(self.window) > self.n:
+            old = self.window.popleft()
+            self.total -= old
+            self.squareTotal -= old * old
+        
+        self.count += 1
+        if not self.count % self.n:
+            self.total = sum(self.window)
+            self.squareTotal = sum([x * x for x in self.window])
+        
+        if len(self.window) == self.n:
+            mean = self.total / self.n
+            variance = self.squareTotal / self.n - mean * mean
+            self.value = np.sqrt(max(variance, 0))
+
+
+########################################################################
+class EmaIndicator(object):
+    """增量计算的指数均线（初始值为前n个数据的简单均值，和AtrIndicator一样与talib存在极小的差异）"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.alpha = 2 / (n + 1)    # 平滑系数
+        self.count = 0
+        self.total = 0
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        self.count += 1
+        
+        if self.count < self.n:
+            self.total += close
+        elif self.count == self.n:
+            self.total += close
+            self.value = self.total / self.n
+        else:
+            self.value += self.alpha * (close - self.value)
+
+
+########################################################################
+class AtrIndicator(object):
+    """
+    增量计算的ATR（Wilder平滑）
+    talib在每次计算时都从序列起点重新开始平滑，这里的平滑从指标注册时
+    的缓存序列起点开始连续进行，因此数值会和talib存在极小的差异
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.preClose = None
+        self.count = 0              # 已计算的真实波幅数量
+        self.total = 0
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        if self.preClose is None:
+            self.preClose = close
+            return
+        
+        tr = max(high - low, abs(high - self.preClose), abs(low - self.preClose))
+        self.preClose = close
+        self.count += 1
+        
+        if self.count < self.n:
+            self.total += tr
+        elif self.count == self.n:
+            self.total += tr
+            self.value = self.total / self.n
+        else:
+            self.value = (self.value * (self.n - 1) + tr) / self.n
+
+
+########################################################################
+class RsiIndicator(object):
+    """增量计算的RSI（Wilder平滑，和AtrIndicator一样与talib存在极小的差异）"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.preClose = None
+        self.count = 0
+        self.gainTotal = 0
+        self.lossTotal = 0
+        self.avgGain = 0
+        self.avgLoss = 0
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        if self.preClose is None:
+            self.preClose = close
+            return
+        
+        diff = close - self.preClose
+        self.preClose = close
+        gain = max(diff, 0)
+        loss = max(-diff, 0)
+        self.count += 1
+        
+        if self.count < self.n:
+            self.gainTotal += gain
+            self.lossTotal += loss
+            return
+        elif self.count == self.n:
+            self.avgGain = (self.gainTotal + gain) / self.n
+            self.avgLoss = (self.lossTotal + loss) / self.n
+        else:
+            self.avgGain = (self.avgGain * (self.n - 1) + gain) / self.n
+            self.avgLoss = (self.avgLoss * (self.n - 1) + loss) / self.n
+        
+        total = self.avgGain + self.avgLoss
+        if total:
+            self.value = 100 * self.avgGain / total
+        else:
+            self.value = 0
+
+
+########################################################################
+class MaxIndicator(object):
+    """增量计算的滚动最高价（单调队列，均摊O(1)）"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.queue = deque()        # (序号, 最高价)，最高价单调递减
+        self.count = 0
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        self.count += 1
+        
+        while self.queue and self.queue[-1][1] <= high:
+            self.queue.pop()
+        self.queue.append((self.count, high))
+        
+        if self.queue[0][0] <= self.count - self.n:
+            self.queue.popleft()
+        
+        if self.count >= self.n:
+            self.value = self.queue[0][1]
+
+
+########################################################################
+class MinIndicator(object):
+    """增量计算的滚动最低价（单调队列，均摊O(1)）"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        self.n = n
+        self.queue = deque()        # (序号, 最低价)，最低价单调递增
+        self.count = 0
+        self.value = np.nan
+        
+    #----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """更新数据"""
+        self.count += 1
+        
+        while self.queue and self.queue[-1][1] >= low:
+            self.queue.pop()
+        self.queue.append((self.count, low))
+        
+        if self.queue[0][0] <= self.count - self.n:
+            self.queue.popleft()
+        
+        if self.count >= self.n:
+            self.value = self.queue[0][1]
+
+
 ########################################################################
 class CtaSignal(object):
     """
@@ -6,21 +6,28 @@
 使用DR_setting.json来配置需要收集的合约，以及主力合约代码。
 '''
 
+from __future__ import division
+
 import json
 import csv
 import os
 import copy
 import traceback
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta, time
-from Queue import Queue, Empty
+from time import sleep
+from timeit import default_timer
+from Queue import Queue, Empty, Full
 from threading import Thread
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import BulkWriteError
 
 from vnpy.event import Event
 from vnpy.trader.vtEvent import *
-from vnpy.trader.vtFunction import todayDate, getJsonPath
+from vnpy.trader.vtGlobal import globalSetting
+from vnpy.trader.vtFunction import todayDate, getJsonPath, DatetimeParser
 from vnpy.trader.vtObject import VtSubscribeReq, VtLogData, VtBarData, VtTickData
+from vnpy.trader.vtStore import HistoryStore, DATATYPE_BAR, DATATYPE_TICK
+from vnpy.trader.vtJournal import DataJournal
 from vnpy.trader.app.ctaStrategy.ctaTemplate import BarGenerator
 
 from .drBase import *
@@ -33,6 +40,16 @@ class DrEngine(object):
     
     settingFileName = 'DR_setting.json'
     settingFilePath = getJsonPath(settingFileName, __file__)  
+    
+    # 插入队列已满时的处理方式
+    POLICY_BLOCK = 'block'      # 阻塞等待（会拖慢事件引擎）
+    POLICY_DROP = 'drop'        # 丢弃新数据
+    
+    STATUS_INTERVAL = 60        # 输出插入状态日志的间隔（秒）
+    
+    # 数据写入目标
+    SINK_MONGO = 'mongo'        # 写入MongoDB
+    SINK_JOURNAL = 'journal'    # 写入本地追加日志，收盘后合并到本地列式数据库
 
     #----------------------------------------------------------------------
     def __init__(self, mainEngine, eventEngine):
@@ -52,14 +69,47 @@ class DrEngine(object):
         # K线合成器字典
         self.bgDict = {}
         
+        # 行情时间解析器（接口推送时未能生成datetime的tick使用）
+        self.datetimeParser = DatetimeParser()
+        
         # 配置字典
         self.settingDict = OrderedDict()
         
         # 负责执行数据库插入的单独线程相关
         self.active = False                     # 工作状态
-        self.queue = Queue()                    # 队列
+        self.queue = None                       # 队列
         self.thread = Thread(target=self.run)   # 线程
         
+        # 批量插入相关，可在配置文件中修改
+        self.batchSize = 500                    # 单次批量插入的最大数据量
+        self.flushInterval = 1.0                # 缓存数据的最长写入间隔（秒）
+        self.queueSize = 100000                 # 队列长度上限，0表示不限制
+        self.queueFullPolicy = self.POLICY_BLOCK
+        self.retryCount = 3                     # 插入失败（如数据库断线）时的重试次数
+        self.retryInterval = 1.0                # 重试间隔（秒）
+        
+        # 插入统计
+        self.putCount = 0                       # 进入队列的数据量
+        self.dropCount = 0                      # 丢弃的数据量
+        self.writeCount = 0                     # 写入的数据量
+        self.failCount = 0                      # 重试后仍然写入失败的数据量
+        self.batchCount = 0                     # 批量插入次数
+        self.lag = 0                            # 最近一次写入时数据在队列中的延时（秒）
+        self.maxLag = 0                         # 最大延时
+        self.maxQueueSize = 0                   # 定时采样到的最大队列长度
+        self.writeSpeed = 0                     # 最近一个统计周期的写入速度（条/秒）
+        self.statusCount = 0                    # 状态统计计时
+        self.lastWriteCount = 0                 # 上次统计时的写入数量
+        self.lastDropCount = 0                  # 上次统计时的丢弃数量
+        
+        # 本地日志相关，可在配置文件中修改
+        self.sink = self.SINK_MONGO             # 数据写入目标
+        self.journal = None                     # 日志对象
+        self.journalPath = ''                   # 日志目录，为空则使用默认路径
+        self.fsyncInterval = 1                  # 日志落盘间隔（秒）
+        self.fsyncCount = 0                     # 日志落盘计时
+        self.compactThread = None               # 日志合并线程
+        
         # 收盘相关
         self.marketCloseTime = None             # 收盘时间
         self.timerCount = 0                     # 定时器计数
@@ -68,6 +118,13 @@ class DrEngine(object):
         # 载入设置，订阅行情
         self.loadSetting()
         
+        # 创建插入队列
+        self.queue = Queue(maxsize=self.queueSize)
+        
+        # 创建本地日志
+        if self.sink == self.SINK_JOURNAL:
+            self.journal = DataJournal(self.journalPath)
+        
         # 启动数据插入线程
         self.start()
     
@@ -79,6 +136,19 @@ class DrEngine(object):
         """加载配置"""
         with open(self.settingFilePath) as f:
             drSetting = json.load(f)
+            
+            # 加载批量插入配置
+            self.batchSize = drSetting.get('batchSize', self.batchSize)
+            self.flushInterval = drSetting.get('flushInterval', self.flushInterval)
+            self.queueSize = drSetting.get('queueSize', self.queueSize)
+            self.queueFullPolicy = drSetting.get('queueFullPolicy', self.queueFullPolicy)
+            self.retryCount = drSetting.get('retryCount', self.retryCount)
+            self.retryInterval = drSetting.get('retryInterval', self.retryInterval)
+            
+            # 加载数据写入目标配置
+            self.sink = drSetting.get('sink', self.sink)
+            self.journalPath = drSetting.get('journalPath', self.journalPath)
+            self.fsyncInterval = drSetting.get('fsyncInterval', self.fsyncInterval)
 
             # 如果working设为False则不启动行情记录功能
             working = drSetting['working']
@@ -183,12 +253,9 @@ class DrEngine(object):
         tick = event.dict_['data']
         vtSymbol = tick.vtSymbol
         
-        # 生成datetime对象
+        # 生成datetime对象（通常已由接口在推送时生成）
         if not tick.datetime:
-            if '.' in tick.time:
-                tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
-            else:
-                tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S')
+            tick.datetime = self.datetimeParser.parse(tick.date, tick.time)
 
         self.onTick(tick)
         
@@ -199,6 +266,16 @@ class DrEngine(object):
     #----------------------------------------------------------------------
     def processTimerEvent(self, event):
         """处理定时事件"""
+        # 更新插入统计
+        self.updateStatus()
+        
+        # 定时将日志落盘
+        if self.journal:
+            self.fsyncCount += 1
+            if self.fsyncCount >= self.fsyncInterval:
+                self.fsyncCount = 0
+                self.journal.flush()
+        
         # 如果没有设置收盘时间，则无需处理
         if not self.marketCloseTime:
             return
@@ -222,6 +299,9 @@ class DrEngine(object):
             # 强制所有的K线生成器立即完成K线
             for bg in self.bgDict.values():
                 bg.generate()
+            
+            # 将当日日志合并到本地列式数据库
+            self.compactJournal()
         
         # 记录新的时间
         self.lastTimerTime = currentTime
@@ -272,28 +352,198 @@ class DrEngine(object):
     #----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是VtTickData或者VtBarData）"""
-        self.queue.put((dbName, collectionName, data.__dict__))
+        # 使用本地日志时直接追加写入，不经过插入队列
+        if self.journal:
+            if isinstance(data, VtBarData):
+                dataType = DATATYPE_BAR
+            else:
+                dataType = DATATYPE_TICK
+            self.journal.append(dbName, collectionName, data, dataType)
+            return
+        
+        # 复制一份字典，数据库插入时添加的_id字段不会修改到共享的数据对象
+        item = (dbName, collectionName, dict(data.__dict__), default_timer())
+        
+        # 队列已满时根据配置选择丢弃或者阻塞等待
+        if self.queueFullPolicy == self.POLICY_DROP:
+            try:
+                self.queue.put(item, block=False)
+            except Full:
+                self.dropCount += 1
+                return
+        else:
+            self.queue.put(item)
+        
+        self.putCount += 1
         
     #----------------------------------------------------------------------
     def run(self):
         """运行插入线程"""
+        # 按照(数据库, 集合)缓存待插入的数据
+        bufferDict = defaultdict(list)
+        lastFlush = default_timer()
+        
         while self.active:
+            timeout = max(lastFlush + self.flushInterval - default_timer(), 0.01)
+            
             try:
-                dbName, collectionName, d = self.queue.get(block=True, timeout=1)
+                dbName, collectionName, d, putTime = self.queue.get(block=True, timeout=timeout)
+                
+                self.lag = default_timer() - putTime
+                self.maxLag = max(self.lag, self.maxLag)
                 
-                # 这里采用MongoDB的update模式更新数据，在记录tick数据时会由于查询
-                # 过于频繁，导致CPU占用和硬盘读写过高后系统卡死，因此不建议使用
-                #flt = {'datetime': d['datetime']}
-                #self.mainEngine.dbUpdate(dbName, collectionName, d, flt, True)
+                # 单个集合缓存的数据达到上限后立即写入
+                key = (dbName, collectionName)
+                l = bufferDict[key]
+                l.append(d)
                 
-                # 使用insert模式更新数据，可能存在时间戳重复的情况，需要用户自行清洗
-                try:
-                    self.mainEngine.dbInsert(dbName, collectionName, d)
-                except DuplicateKeyError:
-                    self.writeDrLog(u'键值重复插入失败，报错信息：%s' %traceback.format_exc())
+                if len(l) >= self.batchSize:
+                    self.writeBatch(dbName, collectionName, l)
+                    del bufferDict[key]
             except Empty:
                 pass
             
+            # 定时写入所有缓存的数据
+            if default_timer() - lastFlush >= self.flushInterval:
+                self.flushBuffer(bufferDict)
+                lastFlush = default_timer()
+        
+        # 退出前写入队列中剩余的数据
+        while True:
+            try:
+                dbName, collectionName, d, putTime = self.queue.get(block=False)
+                bufferDict[(dbName, collectionName)].append(d)
+            except Empty:
+                break
+        self.flushBuffer(bufferDict)
+    
+    #----------------------------------------------------------------------
+    def flushBuffer(self, bufferDict):
+        """写入缓存中的所有数据"""
+        for (dbName, collectionName), l in bufferDict.items():
+            # 单次写入不超过批量上限
+            for i in range(0, len(l), self.batchSize):
+                self.writeBatch(dbName, collectionName, l[i:i+self.batchSize])
+        bufferDict.clear()
+    
+    #----------------------------------------------------------------------
+    def writeBatch(self, dbName, collectionName, l):
+        """批量插入数据"""
+        # 这里采用MongoDB的update模式更新数据，在记录tick数据时会由于查询
+        # 过于频繁，导致CPU占用和硬盘读写过高后系统卡死，因此不建议使用
+        #flt = {'datetime': d['datetime']}
+        #self.mainEngine.dbUpdate(dbName, collectionName, d, flt, True)
+        
+        # 使用insert模式更新数据，可能存在时间戳重复的情况，需要用户自行清洗
+        # 非顺序插入模式下，个别数据失败（如键值重复）不影响其他数据写入
+        self.batchCount += 1
+        
+        # 数据库断线等错误时保留该批数据重试，不能让插入线程退出
+        for n in range(self.retryCount + 1):
+            if n:
+                self.writeDrLog(text.INSERT_RETRY.format(dbName=dbName,
+                                                         collection=collectionName,
+                                                         n=n,
+                                                         interval=self.retryInterval,
+                                                         error=error))
+                sleep(self.retryInterval)
+            
+            try:
+                if self.mainEngine.dbInsertMany(dbName, collectionName, l):
+                    self.writeCount += len(l)
+                    return
+                error = text.DATABASE_NOT_CONNECTED
+            
+            # 部分数据写入失败（如键值重复），重试也无法解决
+            except BulkWriteError as e:
+                errorList = e.details.get('writeErrors', [])
+                self.writeCount += len(l) - len(errorList)
+                
+                if errorList:
+                    error = errorList[0].get('errmsg', '')
+                else:
+                    error = traceback.format_exc()
+                
+                self.writeDrLog(text.INSERT_ERROR.format(dbName=dbName, 
+                                                         collection=collectionName,
+                                                         count=len(errorList), 
+                                                         error=error))
+                return
+            
+            except Exception:
+                error = traceback.format_exc()
+        
+        # 重试后仍然失败的数据单独统计
+        self.failCount += len(l)
+        self.writeDrLog(text.INSERT_ERROR.format(dbName=dbName, 
+                                                 collection=collectionName,
+                                                 count=len(l), 
+                                                 error=error))
+    
+    #----------------------------------------------------------------------
+    def updateStatus(self):
+        """定时统计插入状态"""
+        self.maxQueueSize = max(self.queue.qsize(), self.maxQueueSize)
+        
+        self.statusCount += 1
+        if self.statusCount < self.STATUS_INTERVAL:
+            return
+        self.statusCount = 0
+        
+        self.writeSpeed = (self.writeCount - self.lastWriteCount) / self.STATUS_INTERVAL
+        self.lastWriteCount = self.writeCount
+        
+        # 有数据被丢弃时输出日志
+        dropped = self.dropCount - self.lastDropCount
+        self.lastDropCount = self.dropCount
+        if dropped:
+            self.writeDrLog(text.DATA_DROPPED.format(count=dropped))
+        
+        self.writeDrLog(text.INSERT_STATUS.format(queue=self.queue.qsize(),
+                                                  lag=self.lag,
+                                                  speed=self.writeSpeed,
+                                                  drop=self.dropCount))
+    
+    #----------------------------------------------------------------------
+    def getStatus(self):
+        """查询插入状态"""
+        d = {
+            'queueSize': self.queue.qsize(),
+            'maxQueueSize': self.maxQueueSize,
+            'lag': self.lag,
+            'maxLag': self.maxLag,
+            'putCount': self.putCount,
+            'dropCount': self.dropCount,
+            'writeCount': self.writeCount,
+            'failCount': self.failCount,
+            'batchCount': self.batchCount,
+            'writeSpeed': self.writeSpeed
+        }
+        return d
+            
+    #----------------------------------------------------------------------
+    def compactJournal(self):
+        """在后台线程中将本地日志合并到本地列式数据库"""
+        if not self.journal:
+            return
+        
+        if self.compactThread and self.compactThread.is_alive():
+            return
+        
+        self.compactThread = Thread(target=self.runCompact)
+        self.compactThread.start()
+    
+    #----------------------------------------------------------------------
+    def runCompact(self):
+        """合并本地日志"""
+        store = HistoryStore(globalSetting.get('historyStorePath', ''))
+        
+        try:
+            count = self.journal.compact(store)
+            self.writeDrLog(text.JOURNAL_COMPACTED.format(count=count, path=store.path))
+        except Exception:
+            self.writeDrLog(text.JOURNAL_COMPACT_FAILED.format(error=traceback.format_exc()))
+    
     #----------------------------------------------------------------------
     def start(self):
         """启动"""
@@ -307,6 +557,12 @@ class DrEngine(object):
             self.active = False
             self.thread.join()
         
+        if self.compactThread:
+            self.compactThread.join()
+        
+        if self.journal:
+            self.journal.close()
+        
     #----------------------------------------------------------------------
     def writeDrLog(self, content):
         """快速发出日志事件"""
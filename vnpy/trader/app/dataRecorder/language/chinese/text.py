@@ -13,4 +13,12 @@ DOMINANT_CONTRACT = u'主力合约'
 DOMINANT_SYMBOL = u'主力代码'
 
 TICK_LOGGING_MESSAGE = u'记录Tick数据{symbol}，时间:{time}, last:{last}, bid:{bid}, ask:{ask}'
-BAR_LOGGING_MESSAGE = u'记录分钟线数据{symbol}，时间:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
\ No newline at end of file
+BAR_LOGGING_MESSAGE = u'记录分钟线数据{symbol}，时间:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
+
+DATA_DROPPED = u'数据插入队列已满，丢弃{count}条数据'
+INSERT_ERROR = u'批量插入{dbName}.{collection}时{count}条数据失败，首条报错信息：{error}'
+INSERT_RETRY = u'批量插入{dbName}.{collection}失败，{interval}秒后第{n}次重试，报错信息：{error}'
+DATABASE_NOT_CONNECTED = u'数据库未连接'
+JOURNAL_COMPACTED = u'本地日志合并完成，共{count}条数据，数据库路径：{path}'
+JOURNAL_COMPACT_FAILED = u'本地日志合并失败，报错信息：{error}'
+INSERT_STATUS = u'数据插入队列{queue}条，延时{lag:.3f}秒，写入速度{speed:.1f}条/秒，累计丢弃{drop}条'
\ No newline at end of file
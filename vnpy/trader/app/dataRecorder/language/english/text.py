@@ -12,4 +12,12 @@ DOMINANT_CONTRACT = u'Dominant Contract'
 DOMINANT_SYMBOL = u'Dominant Symbol'
 
 TICK_LOGGING_MESSAGE = u'Record Tick Data {symbol}, Time:{time}, last:{last}, bid:{bid}, ask:{ask}'
-BAR_LOGGING_MESSAGE = u'Record Bar Data {symbol}, Time:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
\ No newline at end of file
+BAR_LOGGING_MESSAGE = u'Record Bar Data {symbol}, Time:{time}, O:{open}, H:{high}, L:{low}, C:{close}'
+
+DATA_DROPPED = u'Insert queue is full, {count} records dropped'
+INSERT_ERROR = u'{count} records failed in bulk insert to {dbName}.{collection}, first error: {error}'
+INSERT_RETRY = u'Bulk insert to {dbName}.{collection} failed, retry {n} in {interval}s, error: {error}'
+DATABASE_NOT_CONNECTED = u'Database not connected'
+JOURNAL_COMPACTED = u'Journal compacted, {count} records, store path: {path}'
+JOURNAL_COMPACT_FAILED = u'Journal compaction failed, error: {error}'
+INSERT_STATUS = u'Insert queue {queue}, lag {lag:.3f}s, write speed {speed:.1f}/s, dropped {drop} in total'
\ No newline at end of file
@@ -5,6 +5,9 @@ from __future__ import division
 from copy import copy
 from collections import OrderedDict
 from math import log1p
+from time import time
+
+import numpy as np
 
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import VtTickData
@@ -23,6 +26,17 @@ EVENT_OM_LOG = 'eOmLog'
 EVENT_OM_STRATEGY = 'eOmStrategy.'
 EVENT_OM_STRATEGYLOG = 'eOmStrategyLog'
 
+# 参与组合汇总的期权链持仓字段
+POS_FIELDS = ('longPos', 'shortPos', 'posValue', 'posDelta', 'posGamma', 'posTheta', 'posVega')
+
+# 数组期权链中按期权位置保存在数组里的字段
+ARRAY_FLOAT_FIELDS = ('r', 't', 'lastPrice', 'bidPrice1', 'askPrice1', 'midPrice',
+                      'bidImpv', 'askImpv', 'midImpv', 'pricingImpv',
+                      'theoPrice', 'theoDelta', 'theoGamma', 'theoTheta', 'theoVega',
+                      'posValue', 'posDelta', 'posGamma', 'posTheta', 'posVega')
+ARRAY_INT_FIELDS = ('volume', 'openInterest', 'bidVolume1', 'askVolume1',
+                    'longPos', 'shortPos', 'netPos')
+
 
 ########################################################################
 class OmInstrument(VtTickData):
@@ -139,6 +153,7 @@ class OmUnderlying(OmInstrument):
         super(OmUnderlying, self).newTick(tick)
         
         self.theoDelta = self.size * self.midPrice / 100
+        self.calculatePosGreeks()
         
         # 遍历推送自己的行情到期权链中
         for chain in self.chainDict.values():
@@ -187,6 +202,7 @@ class OmOption(OmInstrument):
         self.calculatePrice = model.calculatePrice
         self.calculateGreeks = model.calculateGreeks
         self.calculateImpv = model.calculateImpv
+        self.vectorized = getattr(model, 'VECTORIZED', False)   # 是否支持数组批量计算
     
         # 模型定价
         self.pricingImpv = EMPTY_FLOAT
@@ -203,6 +219,10 @@ class OmOption(OmInstrument):
         self.posTheta = EMPTY_FLOAT
         self.posVega = EMPTY_FLOAT 
         
+        # 上一次计算时的输入，输入不变时跳过重复计算
+        self.impvInput = None
+        self.greeksInput = None
+        
         # 期权链
         self.chain = None
         
@@ -213,6 +233,11 @@ class OmOption(OmInstrument):
         if not underlyingPrice or not self.t:
             return        
         
+        impvInput = (self.askPrice1, self.bidPrice1, underlyingPrice, self.r, self.t)
+        if impvInput == self.impvInput:
+            return
+        self.impvInput = impvInput
+        
         self.askImpv = self.calculateImpv(self.askPrice1, underlyingPrice, self.k,
                                           self.r, self.t, self.cp)
         if self.askImpv > 1:        # 正常情况下波动率不应该超过100%
@@ -226,10 +251,15 @@ class OmOption(OmInstrument):
     
     #----------------------------------------------------------------------
     def calculateTheoGreeks(self):
-        """计算理论希腊值"""
+        """计算理论希腊值，返回是否重新计算"""
         underlyingPrice = self.underlying.midPrice
         if not underlyingPrice or not self.pricingImpv:
-            return
+            return False
+        
+        greeksInput = (underlyingPrice, self.pricingImpv, self.r, self.t)
+        if greeksInput == self.greeksInput:
+            return False
+        self.greeksInput = greeksInput
         
         self.theoPrice, delta, gamma, theta, vega = self.calculateGreeks(underlyingPrice, 
                                                                          self.k, 
@@ -243,6 +273,8 @@ class OmOption(OmInstrument):
         self.theoTheta = theta * self.size
         self.theoVega = vega * self.size
         
+        return True
+        
     #----------------------------------------------------------------------
     def calculatePosGreeks(self):
         """计算持仓希腊值"""
@@ -256,6 +288,8 @@ class OmOption(OmInstrument):
     def newTick(self, tick):
         """行情更新"""
         super(OmOption, self).newTick(tick)
+        
+        # 买卖价不变时隐含波动率不变
         self.calculateOptionImpv()
     
     #----------------------------------------------------------------------
@@ -284,10 +318,17 @@ class OmOption(OmInstrument):
 
 ########################################################################
 class OmChain(object):
-    """期权链"""
+    """
+    期权链
+    
+    标的行情更新时只重新计算输入（标的价格、买卖价、定价波动率等）发生变化的期权，
+    持仓希腊值按变化的差值更新。创建时以及标记resync后的下一次计算会全量汇总持仓，
+    差值更新都以此为基准。throttle为限频间隔（毫秒），大于0时两次计算之间
+    的标的行情只标记dirty，由之后的行情或者定时器事件（flush）补算。
+    """
 
     #----------------------------------------------------------------------
-    def __init__(self, symbol, callList, putList):
+    def __init__(self, symbol, callList, putList, throttle=0):
         """Constructor"""
         self.symbol = symbol
         
@@ -316,14 +357,109 @@ class OmChain(object):
         self.posGamma = EMPTY_FLOAT
         self.posTheta = EMPTY_FLOAT
         self.posVega = EMPTY_FLOAT
+        
+        # 定价模型支持数组时，标的行情更新后整条期权链一次计算隐含波动率
+        self.vectorized = bool(self.optionDict) and all([option.vectorized for option in self.optionDict.values()])
+        
+        # 限频计算
+        self.throttle = throttle / 1000     # 限频间隔（秒）
+        self.calcTime = 0                   # 上一次计算的时间
+        self.dirty = False                  # 是否有推迟的计算
+        self.resync = False                 # 下一次计算时是否全量汇总持仓
+        
+        # 汇总期权载入的初始持仓
+        self.calculatePosGreeks()
+    
+    #----------------------------------------------------------------------
+    def calculateImpv(self):
+        """批量计算期权链中输入发生变化的期权的买卖价隐含波动率"""
+        optionList = []
+        
+        for option in self.optionDict.values():
+            underlyingPrice = option.underlying.midPrice
+            if not underlyingPrice or not option.t:
+                continue
+            
+            impvInput = (option.askPrice1, option.bidPrice1, underlyingPrice, option.r, option.t)
+            if impvInput != option.impvInput:
+                option.impvInput = impvInput
+                optionList.append(option)
+        
+        if not optionList:
+            return
+        
+        n = len(optionList)
+        s = np.array([option.underlying.midPrice for option in optionList])
+        k = np.array([option.k for option in optionList])
+        r = np.array([option.r for option in optionList])
+        t = np.array([option.t for option in optionList])
+        cp = np.array([option.cp for option in optionList])
+        ask = np.array([option.askPrice1 for option in optionList])
+        bid = np.array([option.bidPrice1 for option in optionList])
+        
+        # 卖价和买价拼接后一次求解
+        calculateImpv = optionList[0].calculateImpv
+        impv = calculateImpv(np.concatenate([ask, bid]), np.tile(s, 2), np.tile(k, 2),
+                             np.tile(r, 2), np.tile(t, 2), np.tile(cp, 2))
+        
+        # 正常情况下波动率不应该超过100%，若超过则大概率为溢出，调整为1%
+        impv[impv > 1] = 0.01
+        impv = impv.tolist()
+        
+        for i, option in enumerate(optionList):
+            option.askImpv = impv[i]
+            option.bidImpv = impv[n+i]
+            option.midImpv = (option.askImpv + option.bidImpv) / 2
+    
+    #----------------------------------------------------------------------
+    def calculateTheoGreeks(self):
+        """批量计算期权链中输入发生变化的期权的理论希腊值，返回重新计算的期权列表"""
+        optionList = []
+        
+        for option in self.optionDict.values():
+            underlyingPrice = option.underlying.midPrice
+            if not underlyingPrice or not option.pricingImpv:
+                continue
+            
+            greeksInput = (underlyingPrice, option.pricingImpv, option.r, option.t)
+            if greeksInput != option.greeksInput:
+                option.greeksInput = greeksInput
+                optionList.append(option)
+        
+        if not optionList:
+            return optionList
+        
+        s, v, r, t = np.array([option.greeksInput for option in optionList]).T
+        k = np.array([option.k for option in optionList])
+        cp = np.array([option.cp for option in optionList])
+        size = np.array([option.size for option in optionList])
+        
+        calculateGreeks = optionList[0].calculateGreeks
+        price, delta, gamma, theta, vega = calculateGreeks(s, k, r, t, v, cp)
+        
+        price = price.tolist()
+        delta = (delta * size).tolist()
+        gamma = (gamma * size).tolist()
+        theta = (theta * size).tolist()
+        vega = (vega * size).tolist()
+        
+        for i, option in enumerate(optionList):
+            option.theoPrice = price[i]
+            option.theoDelta = delta[i]
+            option.theoGamma = gamma[i]
+            option.theoTheta = theta[i]
+            option.theoVega = vega[i]
+        
+        return optionList
     
     #----------------------------------------------------------------------
     def calculatePosGreeks(self):
-        """计算持仓希腊值"""
+        """全量计算持仓希腊值"""
         # 清空数据
         self.longPos = 0
         self.shortPos = 0
         self.netPos = 0
+        self.posValue = 0
         self.posDelta = 0
         self.posGamma = 0
         self.posTheta = 0
@@ -351,10 +487,57 @@ class OmChain(object):
     #----------------------------------------------------------------------
     def newUnderlyingTick(self):
         """期货行情更新"""
-        for option in self.optionDict.values():
-            option.newUnderlyingTick()
+        if self.throttle and time() - self.calcTime < self.throttle:
+            self.dirty = True
+            return
+        
+        self.calculateGreeks()
+        
+    #----------------------------------------------------------------------
+    def flush(self):
+        """补算因限频推迟的计算"""
+        if self.dirty and time() - self.calcTime >= self.throttle:
+            self.calculateGreeks()
+    
+    #----------------------------------------------------------------------
+    def calculateGreeks(self):
+        """重新计算输入发生变化的期权，并按差值更新持仓希腊值"""
+        self.dirty = False
+        self.calcTime = time()
+        
+        if self.vectorized:
+            self.calculateImpv()
+            optionList = self.calculateTheoGreeks()
+        else:
+            optionList = []
+            for option in self.optionDict.values():
+                option.calculateOptionImpv()
+                if option.calculateTheoGreeks():
+                    optionList.append(option)
+        
+        # 全量重新计算，消除差值累加的误差
+        if self.resync:
+            self.resync = False
+            for option in self.optionDict.values():
+                option.calculatePosGreeks()
+            self.calculatePosGreeks()
+            return
+        
+        for option in optionList:
+            # 缓存旧数据
+            oldPosValue = option.posValue
+            oldPosDelta = option.posDelta
+            oldPosGamma = option.posGamma
+            oldPosTheta = option.posTheta
+            oldPosVega = option.posVega
             
-        self.calculatePosGreeks()
+            option.calculatePosGreeks()
+            
+            self.posValue += option.posValue - oldPosValue
+            self.posDelta += option.posDelta - oldPosDelta
+            self.posGamma += option.posGamma - oldPosGamma
+            self.posTheta += option.posTheta - oldPosTheta
+            self.posVega += option.posVega - oldPosVega
         
     #----------------------------------------------------------------------
     def newTrade(self, trade):
@@ -418,7 +601,347 @@ class OmChain(object):
         
         self.r = sum(l)/len(l)
         for option in self.optionDict.values():
-            option.setR(r)
+            option.setR(self.r)
+
+
+########################################################################
+class OmArrayOption(object):
+    """
+    数组期权链中的期权视图
+    
+    合约信息保存为普通属性，行情、波动率、希腊值和持仓数据通过属性读写
+    期权链中对应位置的数组元素，供界面和策略按OmOption的方式访问。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, option, chain, index):
+        """Constructor"""
+        self.chain = chain
+        self.index = index                  # 在期权链数组中的位置
+        self.arrayDict = chain.arrayDict
+        
+        # 合约信息
+        self.symbol = option.symbol
+        self.exchange = option.exchange
+        self.vtSymbol = option.vtSymbol
+        self.gatewayName = option.gatewayName
+        self.size = option.size
+        self.priceTick = option.priceTick
+        
+        self.underlying = option.underlying
+        self.k = option.k
+        self.cp = option.cp
+        self.expiryDate = option.expiryDate
+        
+        # 定价公式
+        self.calculatePrice = option.calculatePrice
+        self.calculateGreeks = option.calculateGreeks
+        self.calculateImpv = option.calculateImpv
+        self.vectorized = option.vectorized
+        
+        # 不参与计算的行情数据
+        self.tickInited = option.tickInited
+        self.date = option.date
+        self.time = option.time
+        self.openPrice = option.openPrice
+        self.upperLimit = option.upperLimit
+        self.lowerLimit = option.lowerLimit
+    
+    #----------------------------------------------------------------------
+    def setR(self, r):
+        """设置折现率"""
+        self.r = r
+
+
+#----------------------------------------------------------------------
+def arrayProperty(name):
+    """生成读写期权链数组中对应元素的属性"""
+    def getter(self):
+        return self.arrayDict[name].item(self.index)
+    
+    def setter(self, value):
+        self.arrayDict[name][self.index] = value
+    
+    return property(getter, setter, doc=name)
+
+
+for fieldName in ARRAY_FLOAT_FIELDS + ARRAY_INT_FIELDS:
+    setattr(OmArrayOption, fieldName, arrayProperty(fieldName))
+
+
+########################################################################
+class OmArrayChain(object):
+    """
+    数组期权链
+    
+    和OmChain的接口一致，但期权的行情、波动率、希腊值和持仓数据按期权位置保存在
+    NumPy数组中（前callCount个为看涨，之后依次为同一行权价的看跌），隐含波动率、
+    理论希腊值和持仓汇总都是对连续内存的一次数组运算。期权对象为OmArrayOption视图。
+    
+    要求定价模型支持数组计算（VECTORIZED），且期权链中所有期权的标的物相同。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, symbol, callList, putList, throttle=0):
+        """Constructor"""
+        self.symbol = symbol
+        
+        optionList = list(callList) + list(putList)
+        self.count = len(optionList)
+        self.callCount = len(callList)
+        
+        self.underlying = optionList[0].underlying if optionList else None
+        self.vectorized = True
+        
+        # 数据数组
+        self.arrayDict = OrderedDict()
+        for name in ARRAY_FLOAT_FIELDS:
+            self.arrayDict[name] = np.array([getattr(option, name) for option in optionList], dtype=float)
+        for name in ARRAY_INT_FIELDS:
+            self.arrayDict[name] = np.array([getattr(option, name) for option in optionList], dtype=np.int64)
+        
+        self.k = np.array([option.k for option in optionList], dtype=float)
+        self.cp = np.array([option.cp for option in optionList], dtype=float)
+        self.size = np.array([option.size for option in optionList], dtype=float)
+        
+        # 上一次计算时的输入，NaN表示尚未计算
+        self.impvInput = np.full((5, self.count), np.nan)      # 卖价、买价、标的价格、r、t
+        self.greeksInput = np.full((4, self.count), np.nan)    # 标的价格、定价波动率、r、t
+        
+        # 期权视图
+        self.callDict = OrderedDict()
+        self.putDict = OrderedDict()
+        self.optionDict = OrderedDict()
+        self.indexDict = {}                 # symbol:数组位置
+        
+        for index, option in enumerate(optionList):
+            view = OmArrayOption(option, self, index)
+            
+            if index < self.callCount:
+                self.callDict[view.symbol] = view
+            else:
+                self.putDict[view.symbol] = view
+            self.optionDict[view.symbol] = view
+            self.indexDict[view.symbol] = index
+        
+        if optionList:
+            self.calculateImpvFunc = optionList[0].calculateImpv
+            self.calculateGreeksFunc = optionList[0].calculateGreeks
+        
+        # 持仓数据
+        self.longPos = EMPTY_INT
+        self.shortPos = EMPTY_INT
+        self.netPos = EMPTY_INT
+        
+        self.posValue = EMPTY_FLOAT
+        self.posDelta = EMPTY_FLOAT
+        self.posGamma = EMPTY_FLOAT
+        self.posTheta = EMPTY_FLOAT
+        self.posVega = EMPTY_FLOAT
+        
+        # 限频计算
+        self.throttle = throttle / 1000
+        self.calcTime = 0
+        self.dirty = False
+        self.resync = False
+        
+        # 汇总期权载入的初始持仓
+        self.calculatePosGreeks()
+    
+    #----------------------------------------------------------------------
+    def calculateImpv(self, index=None):
+        """批量计算输入发生变化的期权的买卖价隐含波动率，index为要检查的期权位置（默认全部）"""
+        underlyingPrice = self.underlying.midPrice if self.underlying else 0
+        if not underlyingPrice:
+            return
+        
+        a = self.arrayDict
+        if index is None:
+            index = np.arange(self.count)
+        
+        ask = a['askPrice1'][index]
+        bid = a['bidPrice1'][index]
+        r = a['r'][index]
+        t = a['t'][index]
+        
+        impvInput = np.array([ask, bid, np.full(index.size, underlyingPrice), r, t])
+        changed = (impvInput != self.impvInput[:, index]).any(axis=0) & (t > 0)
+        if not changed.any():
+            return
+        
+        index = index[changed]
+        ask, bid, r, t = ask[changed], bid[changed], r[changed], t[changed]
+        self.impvInput[:, index] = impvInput[:, changed]
+        
+        # 卖价和买价拼接后一次求解
+        n = index.size
+        impv = self.calculateImpvFunc(np.concatenate([ask, bid]), underlyingPrice,
+                                      np.tile(self.k[index], 2), np.tile(r, 2),
+                                      np.tile(t, 2), np.tile(self.cp[index], 2))
+        
+        # 正常情况下波动率不应该超过100%，若超过则大概率为溢出，调整为1%
+        impv[impv > 1] = 0.01
+        
+        a['askImpv'][index] = impv[:n]
+        a['bidImpv'][index] = impv[n:]
+        a['midImpv'][index] = (impv[:n] + impv[n:]) / 2
+    
+    #----------------------------------------------------------------------
+    def calculateTheoGreeks(self):
+        """批量计算输入发生变化的期权的理论希腊值，返回重新计算的期权位置数组"""
+        underlyingPrice = self.underlying.midPrice if self.underlying else 0
+        if not underlyingPrice:
+            return np.empty(0, dtype=int)
+        
+        a = self.arrayDict
+        v = a['pricingImpv']
+        r = a['r']
+        t = a['t']
+        
+        greeksInput = np.array([np.full(self.count, underlyingPrice), v, r, t])
+        changed = (greeksInput != self.greeksInput).any(axis=0) & (v > 0)
+        index = np.flatnonzero(changed)
+        if not index.size:
+            return index
+        self.greeksInput[:, index] = greeksInput[:, index]
+        
+        price, delta, gamma, theta, vega = self.calculateGreeksFunc(underlyingPrice, self.k[index], r[index],
+                                                                    t[index], v[index], self.cp[index])
+        
+        size = self.size[index]
+        a['theoPrice'][index] = price
+        a['theoDelta'][index] = delta * size
+        a['theoGamma'][index] = gamma * size
+        a['theoTheta'][index] = theta * size
+        a['theoVega'][index] = vega * size
+        
+        return index
+    
+    #----------------------------------------------------------------------
+    def calculatePosGreeks(self):
+        """计算持仓希腊值"""
+        a = self.arrayDict
+        netPos = a['netPos']
+        
+        np.multiply(a['theoPrice'], netPos * self.size, out=a['posValue'])
+        np.multiply(a['theoDelta'], netPos, out=a['posDelta'])
+        np.multiply(a['theoGamma'], netPos, out=a['posGamma'])
+        np.multiply(a['theoTheta'], netPos, out=a['posTheta'])
+        np.multiply(a['theoVega'], netPos, out=a['posVega'])
+        
+        self.longPos = int(a['longPos'].sum())
+        self.shortPos = int(a['shortPos'].sum())
+        self.netPos = self.longPos - self.shortPos
+        
+        self.posValue = float(a['posValue'].sum())
+        self.posDelta = float(a['posDelta'].sum())
+        self.posGamma = float(a['posGamma'].sum())
+        self.posTheta = float(a['posTheta'].sum())
+        self.posVega = float(a['posVega'].sum())
+    
+    #----------------------------------------------------------------------
+    def newTick(self, tick):
+        """期权行情更新"""
+        option = self.optionDict[tick.symbol]
+        index = option.index
+        
+        if not option.tickInited:
+            option.date = tick.date
+            option.openPrice = tick.openPrice
+            option.upperLimit = tick.upperLimit
+            option.lowerLimit = tick.lowerLimit
+            option.tickInited = True
+        option.time = tick.time
+        
+        a = self.arrayDict
+        a['lastPrice'][index] = tick.lastPrice
+        a['volume'][index] = tick.volume
+        a['openInterest'][index] = tick.openInterest
+        a['bidPrice1'][index] = tick.bidPrice1
+        a['askPrice1'][index] = tick.askPrice1
+        a['bidVolume1'][index] = tick.bidVolume1
+        a['askVolume1'][index] = tick.askVolume1
+        a['midPrice'][index] = (tick.bidPrice1 + tick.askPrice1) / 2
+        
+        # 只检查该期权，买卖价不变时不会重新计算
+        self.calculateImpv(np.array([index]))
+    
+    #----------------------------------------------------------------------
+    def newUnderlyingTick(self):
+        """期货行情更新"""
+        if self.throttle and time() - self.calcTime < self.throttle:
+            self.dirty = True
+            return
+        
+        self.calculateGreeks()
+    
+    #----------------------------------------------------------------------
+    def flush(self):
+        """补算因限频推迟的计算"""
+        if self.dirty and time() - self.calcTime >= self.throttle:
+            self.calculateGreeks()
+    
+    #----------------------------------------------------------------------
+    def calculateGreeks(self):
+        """重新计算输入发生变化的期权，并汇总持仓希腊值"""
+        self.dirty = False
+        self.calcTime = time()
+        
+        self.calculateImpv()
+        
+        if self.calculateTheoGreeks().size or self.resync:
+            self.resync = False
+            self.calculatePosGreeks()
+    
+    #----------------------------------------------------------------------
+    def newTrade(self, trade):
+        """期权成交更新"""
+        index = self.indexDict[trade.symbol]
+        
+        a = self.arrayDict
+        if trade.direction is DIRECTION_LONG:
+            if trade.offset is OFFSET_OPEN:
+                a['longPos'][index] += trade.volume
+            else:
+                a['shortPos'][index] -= trade.volume
+        else:
+            if trade.offset is OFFSET_OPEN:
+                a['shortPos'][index] += trade.volume
+            else:
+                a['longPos'][index] -= trade.volume
+        a['netPos'][index] = a['longPos'][index] - a['shortPos'][index]
+        
+        self.calculatePosGreeks()
+    
+    #----------------------------------------------------------------------
+    def adjustR(self):
+        """调整折现率（r）"""
+        # 如果标的为期货，则不进行调整
+        if not self.underlying or self.underlying.productClass == PRODUCT_FUTURES:
+            return
+        
+        underlyingPrice = self.underlying.midPrice
+        if not underlyingPrice:
+            return
+        
+        # 通过计算期权链所有PCP的平价利率，忽略任意中间价为0的PCP
+        n = self.callCount
+        a = self.arrayDict
+        callPrice = a['midPrice'][:n]
+        putPrice = a['midPrice'][n:2*n]
+        k = self.k[:n]
+        t = a['t'][:n]
+        
+        valid = (callPrice > 0) & (putPrice > 0) & (k > 0) & (t > 0)
+        if not valid.any():
+            return
+        
+        temp = (underlyingPrice + putPrice[valid] - callPrice[valid]) / k[valid]
+        rArray = np.log1p(temp - 1) / (-t[valid])
+        
+        # 求平均值来计算拟合折现率
+        self.r = float(rArray.mean())
+        a['r'][:] = self.r
 
 
 ########################################################################
@@ -458,10 +981,13 @@ class OmPortfolio(object):
         self.posGamma = EMPTY_FLOAT
         self.posTheta = EMPTY_FLOAT
         self.posVega = EMPTY_FLOAT
+        
+        # 汇总初始持仓，之后按期权链的变化更新
+        self.calculatePosGreeks()
     
     #----------------------------------------------------------------------
     def calculatePosGreeks(self):
-        """计算持仓希腊值"""
+        """全量计算持仓希腊值"""
         self.longPos = 0
         self.shortPos = 0
         self.netPos = 0
@@ -487,19 +1013,36 @@ class OmPortfolio(object):
         
         self.netPos = self.longPos - self.shortPos        
     
+    #----------------------------------------------------------------------
+    def updatePosGreeks(self, chainList, func, *args):
+        """调用更新函数，并按期权链持仓数据的变化更新组合汇总"""
+        oldList = [[getattr(chain, field) for field in POS_FIELDS] for chain in chainList]
+        
+        func(*args)
+        
+        for chain, oldValues in zip(chainList, oldList):
+            for field, oldValue in zip(POS_FIELDS, oldValues):
+                newValue = getattr(chain, field)
+                if newValue != oldValue:
+                    setattr(self, field, getattr(self, field) + newValue - oldValue)
+        
+        self.netPos = self.longPos - self.shortPos
+    
     #----------------------------------------------------------------------
     def newTick(self, tick):
         """行情推送"""
         symbol = tick.symbol
         
+        # 期权行情只影响隐含波动率，不影响持仓希腊值
         if symbol in self.optionDict:
             chain = self.optionDict[symbol].chain
             chain.newTick(tick)
-            self.calculatePosGreeks()
         elif symbol in self.underlyingDict:
             underlying = self.underlyingDict[symbol]
-            underlying.newTick(tick)
-            self.calculatePosGreeks()
+            oldPosDelta = underlying.posDelta
+            
+            self.updatePosGreeks(underlying.chainDict.values(), underlying.newTick, tick)
+            self.posDelta += underlying.posDelta - oldPosDelta
     
     #----------------------------------------------------------------------
     def newTrade(self, trade):
@@ -508,12 +1051,35 @@ class OmPortfolio(object):
         
         if symbol in self.optionDict:
             chain = self.optionDict[symbol].chain
-            chain.newTrade(trade)
-            self.calculatePosGreeks()
+            self.updatePosGreeks([chain], chain.newTrade, trade)
         elif symbol in self.underlyingDict:
             underlying = self.underlyingDict[symbol]
+            oldPosDelta = underlying.posDelta
+            
             underlying.newTrade(trade)
-            self.calculatePosGreeks()
+            self.posDelta += underlying.posDelta - oldPosDelta
+    
+    #----------------------------------------------------------------------
+    def flush(self):
+        """补算各期权链因限频推迟的计算"""
+        for chain in self.chainDict.values():
+            if chain.dirty:
+                self.updatePosGreeks([chain], chain.flush)
+    
+    #----------------------------------------------------------------------
+    def updateTimeToMaturity(self, dt=None):
+        """更新所有期权的剩余到期时间，期权链标记为dirty后由flush全量重新计算"""
+        ttmDict = {}    # 到期日:剩余时间
+        
+        for chain in self.chainDict.values():
+            for option in chain.optionDict.values():
+                expiryDate = option.expiryDate
+                if expiryDate not in ttmDict:
+                    ttmDict[expiryDate] = getTimeToMaturity(expiryDate, dt)
+                option.t = ttmDict[expiryDate]
+            
+            chain.dirty = True
+            chain.resync = True
     
     #----------------------------------------------------------------------
     def adjustR(self):
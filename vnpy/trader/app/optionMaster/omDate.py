@@ -8,6 +8,7 @@ import csv
 import datetime
 import sys
 import os
+from bisect import bisect_left, bisect_right
 from collections import OrderedDict
 
 from vnpy.trader.uiQt import QtCore, QtWidgets, QtGui
@@ -16,6 +17,12 @@ from vnpy.trader.uiQt import QtCore, QtWidgets, QtGui
 # 常量定义
 ANNUAL_TRADINGDAYS = 240
 
+# 每日交易时段（开始时间，结束时间），用于计算日内剩余时间
+TRADING_SESSIONS = [
+    (datetime.time(9, 30), datetime.time(11, 30)),
+    (datetime.time(13, 0), datetime.time(15, 0))
+]
+
 CALENDAR_FILENAME = 'TradingCalendar.csv'
 PATH = os.path.abspath(os.path.dirname(__file__))
 CALENDAR_FILEPATH = os.path.join(PATH, CALENDAR_FILENAME)
@@ -28,8 +35,95 @@ try:
 except IOError:
     CALENDAR = []
 
-# TimeToMaturity缓存字典
-TTM_DICT = {}      # key:date, value:float time(year)
+
+
+########################################################################
+class TradingCalendar(object):
+    """
+    交易日历
+    
+    从日历数据一次性生成排序的交易日序号列表（date.toordinal），交易日在列表中
+    的位置即为累计交易日数，因此任意区间的交易日数只需要两次二分查找。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, calendar, sessions=TRADING_SESSIONS):
+        """Constructor"""
+        # 没有描述（假期、周末）的日期为交易日
+        dayList = []
+        for d in calendar:
+            if not d['description']:
+                date = d['date']
+                dayList.append(datetime.date(int(date[:4]), int(date[5:7]), int(date[8:10])).toordinal())
+        
+        self.dayList = sorted(dayList)
+        self.daySet = set(dayList)
+        
+        # 交易时段（当日秒数）
+        self.sessionList = []
+        for start, end in sessions:
+            self.sessionList.append((start.hour*3600 + start.minute*60 + start.second,
+                                     end.hour*3600 + end.minute*60 + end.second))
+        self.sessionSeconds = sum([end - start for start, end in self.sessionList])
+        
+        # 到期日字符串:日期序号
+        self.expiryDict = {}
+        
+    #----------------------------------------------------------------------
+    def isTradingDay(self, date):
+        """检查是否为交易日"""
+        return date.toordinal() in self.daySet
+    
+    #----------------------------------------------------------------------
+    def getTradingDays(self, startDate, endDate):
+        """计算两个日期之间（包含两端）的交易日数"""
+        return self.countTradingDays(startDate.toordinal(), endDate.toordinal())
+    
+    #----------------------------------------------------------------------
+    def countTradingDays(self, start, end):
+        """计算两个日期序号之间（包含两端）的交易日数"""
+        if start > end:
+            return 0
+        return bisect_right(self.dayList, end) - bisect_left(self.dayList, start)
+    
+    #----------------------------------------------------------------------
+    def getDayFraction(self, dt):
+        """计算当日剩余交易时段占全天交易时段的比例"""
+        if not self.sessionSeconds:
+            return 1
+        
+        seconds = dt.hour*3600 + dt.minute*60 + dt.second + dt.microsecond/1000000
+        remaining = 0
+        for start, end in self.sessionList:
+            remaining += max(0, end - max(start, seconds))
+        
+        return remaining / self.sessionSeconds
+    
+    #----------------------------------------------------------------------
+    def getTimeToMaturity(self, expiryDate, dt=None):
+        """
+        计算剩余的年化到期时间（交易日），expiryDate为到期日字符串（如20180628）
+        今日为交易日时，今日按剩余交易时段的比例计算，到期日收盘后为0
+        """
+        if dt is None:
+            dt = datetime.datetime.now()
+        
+        expiry = self.expiryDict.get(expiryDate, None)
+        if expiry is None:
+            expiry = datetime.date(int(expiryDate[:4]), int(expiryDate[4:6]), int(expiryDate[6:8])).toordinal()
+            self.expiryDict[expiryDate] = expiry
+        
+        today = dt.toordinal()
+        tradingDays = self.countTradingDays(today+1, expiry)
+        
+        if today <= expiry and today in self.daySet:
+            tradingDays += self.getDayFraction(dt)
+        
+        return tradingDays / ANNUAL_TRADINGDAYS
+
+
+# 交易日历
+TRADING_CALENDAR = TradingCalendar(CALENDAR)
 
 
 ########################################################################
@@ -224,30 +318,9 @@ def initCalendarCsv():
 
 
 #----------------------------------------------------------------------
-def getTimeToMaturity(expiryDate):
-    """计算剩余的年化到期时间（交易日）"""
-    # 如果有缓存则直接返回
-    if expiryDate in TTM_DICT:
-        return TTM_DICT[expiryDate]
-    
-    # 获取日期对象
-    expiryDt = datetime.datetime.strptime(expiryDate, '%Y%m%d').date()
-    todayDt = datetime.date.today()
-    
-    tradingDays = 0
-    for d in CALENDAR:
-        dt = datetime.datetime.strptime(d['date'], '%Y-%m-%d').date()
-        # 判断是否为交易日的条件：
-        # 1. 日期大于等于今日
-        # 2. 日期小于等于到期日
-        # 3. 日期没有描述（假期）        
-        if dt>=todayDt and dt<=expiryDt and not d['description']:
-            tradingDays += 1
-    
-    # 缓存并返回年化剩余时间
-    ttm = tradingDays/ANNUAL_TRADINGDAYS
-    TTM_DICT[expiryDate] = ttm
-    return ttm
+def getTimeToMaturity(expiryDate, dt=None):
+    """计算剩余的年化到期时间（交易日），包含今日剩余交易时段的比例"""
+    return TRADING_CALENDAR.getTimeToMaturity(expiryDate, dt)
     
     
 if __name__ == '__main__':
@@ -17,9 +17,9 @@ from vnpy.trader.vtConstant import (PRODUCT_OPTION, OPTION_CALL, OPTION_PUT,
                                     DIRECTION_LONG, DIRECTION_SHORT,
                                     OFFSET_OPEN, OFFSET_CLOSE,
                                     PRICETYPE_LIMITPRICE)
-from vnpy.pricing import black, bs, crr, bsCython, crrCython
+from vnpy.pricing import black, bs, crr, bsCython, crrCython, bsNumpy, blackNumpy, crrNumpy
 
-from .omBase import (OmOption, OmUnderlying, OmChain, OmPortfolio,
+from .omBase import (OmOption, OmUnderlying, OmChain, OmArrayChain, OmPortfolio,
                      EVENT_OM_LOG, EVENT_OM_STRATEGY, EVENT_OM_STRATEGYLOG,
                      OM_DB_NAME)
 from .strategy import STRATEGY_CLASS
@@ -33,6 +33,9 @@ MODEL_DICT['bs'] = bs
 MODEL_DICT['crr'] = crr
 MODEL_DICT['bsCython'] = bsCython
 MODEL_DICT['crrCython'] = crrCython
+MODEL_DICT['bsNumpy'] = bsNumpy
+MODEL_DICT['blackNumpy'] = blackNumpy
+MODEL_DICT['crrNumpy'] = crrNumpy
 
 
 
@@ -52,6 +55,10 @@ class OmEngine(object):
         self.portfolio = None
         self.optionContractDict = {}      # symbol:contract
         
+        # 剩余到期时间的更新间隔（秒）
+        self.ttmInterval = 60
+        self.ttmCount = 0
+        
         self.strategyEngine = OmStrategyEngine(self, eventEngine)
         
         self.registerEvent()
@@ -60,6 +67,7 @@ class OmEngine(object):
     def registerEvent(self):
         """注册事件监听"""
         self.eventEngine.register(EVENT_CONTRACT, self.processContractEvent)
+        self.eventEngine.register(EVENT_TIMER, self.processTimerEvent)
     
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
@@ -73,6 +81,20 @@ class OmEngine(object):
         trade = event.dict_['data']
         self.portfolio.newTrade(trade)
     
+    #----------------------------------------------------------------------
+    def processTimerEvent(self, event):
+        """定时事件"""
+        if not self.portfolio:
+            return
+        
+        # 交易时段内剩余到期时间持续减少，定时更新
+        self.ttmCount += 1
+        if self.ttmInterval and self.ttmCount >= self.ttmInterval:
+            self.ttmCount = 0
+            self.portfolio.updateTimeToMaturity()
+        
+        self.portfolio.flush()
+    
     #----------------------------------------------------------------------
     def processContractEvent(self, event):
         """合约事件"""
@@ -115,6 +137,16 @@ class OmEngine(object):
         if not model:
             self.writeLog(u'找不到定价模型%s' %setting['model'])
             return
+        
+        self.ttmInterval = setting.get('ttmInterval', self.ttmInterval)
+        
+        # 使用数组期权链，要求定价模型支持数组计算
+        chainClass = OmChain
+        if setting.get('arrayChain', False):
+            if getattr(model, 'VECTORIZED', False):
+                chainClass = OmArrayChain
+            else:
+                self.writeLog(u'定价模型%s不支持数组计算，使用普通期权链' %setting['model'])
             
         # 创建标的对象
         underlyingDict = OrderedDict()
@@ -169,7 +201,7 @@ class OmEngine(object):
             putList = [putDict[k] for k in strikeList]
             
             # 创建期权链
-            chain = OmChain(chainSymbol, callList, putList)
+            chain = chainClass(chainSymbol, callList, putList, d.get('throttle', 0))
             chainList.append(chain)
             
             # 添加标的映射关系
@@ -201,12 +201,12 @@ class ChainMonitor(QtWidgets.QTableWidget):
         portfolio = self.omEngine.portfolio
         
         for underlying in portfolio.underlyingDict.values():
-            self.eventEngine.register(EVENT_TICK + underlying.vtSymbol, self.signalTick.emit)
+            self.eventEngine.registerSnapshotHandler(EVENT_TICK + underlying.vtSymbol, self.signalTick.emit)
             self.eventEngine.register(EVENT_TRADE + underlying.vtSymbol, self.signalTrade.emit)
         
         for chain in portfolio.chainDict.values():
             for option in chain.optionDict.values():
-                self.eventEngine.register(EVENT_TICK + option.vtSymbol, self.signalTick.emit)
+                self.eventEngine.registerSnapshotHandler(EVENT_TICK + option.vtSymbol, self.signalTick.emit)
                 self.eventEngine.register(EVENT_TRADE + option.vtSymbol, self.signalTrade.emit)
     
     #----------------------------------------------------------------------
@@ -0,0 +1,70 @@
+# encoding: UTF-8
+
+'''
+本文件中包含了RPC服务模块中用到的推送主题定义。
+
+推送主题由事件类型、关键字和分隔符组成：
+    行情、成交、委托、持仓、账户事件：事件类型+关键字+分隔符，如eTick.rb1805|
+    其他事件：事件类型+分隔符，如eLog|
+
+网关推送的带关键字的事件（如eTick.rb1805）和通用事件包含同一个数据对象，
+服务端只推送通用事件，由客户端收到后重新生成带关键字的事件，减少一半的流量。
+
+客户端直接使用事件类型订阅：订阅eTick.时接收所有合约的行情，订阅eTick.rb1805时
+只接收该合约的行情。其他以.结尾的事件类型同样按前缀订阅整类事件，如订阅eCtaStrategy.
+时接收所有策略的状态事件（eCtaStrategy.策略名）。过滤由zmq的PUB端按主题前缀完成，
+未订阅的数据不会发送到客户端。
+'''
+
+from vnpy.trader.vtEvent import (EVENT_TICK, EVENT_TRADE, EVENT_ORDER,
+                                 EVENT_POSITION, EVENT_ACCOUNT)
+
+
+# 主题分隔符，避免订阅rb1805时同时收到rb18050之类的合约
+TOPIC_SEPARATOR = '|'
+
+# 以该字符结尾的事件类型为一类事件的前缀，后接具体的关键字
+FAMILY_SUFFIX = '.'
+
+# 带关键字的事件类型:数据对象中关键字的属性名，和vtGateway中的推送保持一致
+KEY_FIELD_DICT = {
+    EVENT_TICK: 'vtSymbol',
+    EVENT_TRADE: 'vtSymbol',
+    EVENT_ORDER: 'vtOrderID',
+    EVENT_POSITION: 'vtSymbol',
+    EVENT_ACCOUNT: 'vtAccountID'
+}
+
+KEY_EVENT_PREFIX = tuple(KEY_FIELD_DICT.keys())
+
+
+#----------------------------------------------------------------------
+def encodeTopic(topic):
+    """zmq的主题必须是字节串"""
+    if not isinstance(topic, bytes):
+        topic = topic.encode('utf-8')
+    return topic
+
+
+#----------------------------------------------------------------------
+def getPublishTopic(event):
+    """获取事件的推送主题，返回None表示该事件由客户端重新生成，不需要推送"""
+    type_ = event.type_
+
+    if type_ in KEY_FIELD_DICT:
+        key = getattr(event.dict_['data'], KEY_FIELD_DICT[type_])
+        return encodeTopic(type_ + key + TOPIC_SEPARATOR)
+
+    if type_.startswith(KEY_EVENT_PREFIX):
+        return None
+
+    return encodeTopic(type_ + TOPIC_SEPARATOR)
+
+
+#----------------------------------------------------------------------
+def getSubscribeTopic(type_):
+    """获取订阅事件类型所用的主题，type_为空字符串时订阅所有事件，以.结尾时订阅整类事件"""
+    if not type_ or type_ in KEY_FIELD_DICT or type_.endswith(FAMILY_SUFFIX):
+        return encodeTopic(type_)
+
+    return encodeTopic(type_ + TOPIC_SEPARATOR)
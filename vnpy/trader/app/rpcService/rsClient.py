@@ -2,7 +2,11 @@
 
 import copy
 
+from vnpy.event import Event
 from vnpy.rpc import RpcClient
+from vnpy.trader import vtCodec
+
+from .rsBase import KEY_FIELD_DICT, getSubscribeTopic
 
 
 ########################################################################
@@ -56,15 +60,43 @@ class RsClient(RpcClient):
     def callback(self, topic, data):
         """事件推送回调函数"""
         self.eventEngine.put(data)      # 直接放入事件引擎中
+        
+        # 服务端不推送带关键字的事件，在这里重新生成
+        field = KEY_FIELD_DICT.get(data.type_, None)
+        if field:
+            event = Event(type_=data.type_ + getattr(data.dict_['data'], field))
+            event.dict_ = data.dict_
+            self.eventEngine.put(event)
     
     #----------------------------------------------------------------------
-    def init(self, eventEngine):
-        """初始化"""
+    def init(self, eventEngine, eventList=None):
+        """
+        初始化
+        eventList：订阅的事件类型列表，如[EVENT_LOG, EVENT_TICK+'rb1805']，为None时订阅全部事件
+        """
         self.eventEngine = eventEngine  # 绑定事件引擎对象
         
         self.usePickle()                # 使用cPickle序列化
-        self.subscribeTopic('')         # 订阅全部主题推送
+        self.useMsgpackExt(vtCodec.encodeObject, 
+                           vtCodec.decodeExt, 
+                           publishOnly=True)    # 推送的事件使用msgpack编码
+        
+        if eventList is None:
+            eventList = ['']            # 订阅全部主题推送
+        for type_ in eventList:
+            self.subscribeEvent(type_)
+        
         self.start()                    # 启动
+    
+    #----------------------------------------------------------------------
+    def subscribeEvent(self, type_):
+        """订阅事件推送，EVENT_TICK订阅所有合约的行情，EVENT_TICK+vtSymbol订阅单个合约"""
+        self.subscribeTopic(getSubscribeTopic(type_))
+    
+    #----------------------------------------------------------------------
+    def unsubscribeEvent(self, type_):
+        """取消订阅事件推送"""
+        self.unsubscribeTopic(getSubscribeTopic(type_))
 
 
 ########################################################################
@@ -80,10 +112,20 @@ class MainEngineProxy(object):
         self.client = None
         
     #----------------------------------------------------------------------
-    def init(self, reqAddress, subAddress):
-        """初始化"""
+    def init(self, reqAddress, subAddress, eventList=None):
+        """初始化，eventList为订阅的事件类型列表，为None时订阅全部事件"""
         self.client = RsClient(reqAddress, subAddress)
-        self.client.init(self.eventEngine)
+        self.client.init(self.eventEngine, eventList)
+    
+    #----------------------------------------------------------------------
+    def subscribeEvent(self, type_):
+        """订阅事件推送"""
+        self.client.subscribeEvent(type_)
+    
+    #----------------------------------------------------------------------
+    def unsubscribeEvent(self, type_):
+        """取消订阅事件推送"""
+        self.client.unsubscribeEvent(type_)
 
     #----------------------------------------------------------------------
     def __getattr__(self, name):
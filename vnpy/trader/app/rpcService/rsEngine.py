@@ -6,6 +6,9 @@ from vnpy.trader.vtConstant import EMPTY_STRING
 
 from vnpy.rpc import RpcServer
 from vnpy.trader.vtFunction import getJsonPath
+from vnpy.trader import vtCodec
+
+from .rsBase import getPublishTopic
 
 
 ########################################################################
@@ -28,6 +31,7 @@ class RsEngine(object):
         self.pubAddress = EMPTY_STRING      # PUB地址
         
         self.functionDict = {}              # 调用过的函数对象缓存字典
+        self.errorTypeSet = set()           # 推送失败过的事件类型，只记录一次日志
         
         self.loadSetting()
         self.registerEvent()
@@ -41,8 +45,14 @@ class RsEngine(object):
             self.repAddress = d['repAddress']
             self.pubAddress = d['pubAddress']
             
-            self.server = RpcServer(self.repAddress, self.pubAddress)
+            # 工作线程数量大于0时并发处理调用请求，需确保调用的函数线程安全
+            workerCount = d.get('workerCount', 0)
+            
+            self.server = RpcServer(self.repAddress, self.pubAddress, workerCount)
             self.server.usePickle()
+            
+            # 推送的事件使用紧凑的msgpack编码，函数调用仍使用cPickle
+            self.server.useMsgpackExt(vtCodec.encodeObject, vtCodec.decodeExt, publishOnly=True)
             self.server.register(self.call)
             self.server.start()
             
@@ -83,7 +93,19 @@ class RsEngine(object):
     #----------------------------------------------------------------------
     def processEvent(self, event):
         """处理事件推送"""
-        self.server.publish('', event)
+        topic = getPublishTopic(event)
+        
+        # 带关键字的事件由客户端根据通用事件重新生成
+        if topic is None:
+            return
+        
+        # 推送失败时不能影响事件引擎的工作线程
+        try:
+            self.server.publish(topic, event)
+        except Exception as e:
+            if event.type_ not in self.errorTypeSet:
+                self.errorTypeSet.add(event.type_)
+                self.mainEngine.writeLog(u'RPC服务推送事件%s失败：%r' %(event.type_, e))
     
     #----------------------------------------------------------------------
     def stop(self):
@@ -59,8 +59,9 @@ class RtdEngine(object):
     #----------------------------------------------------------------------
     def registerEvent(self):
         """注册事件监听"""
+        # RTD只推送最新数据，行情事件可以合并
         for eventType in self.eventTypeDict.keys():
-            self.eventEngine.register(eventType, self.processDataEvent)
+            self.eventEngine.registerSnapshotHandler(eventType, self.processDataEvent)
         
     #----------------------------------------------------------------------
     def processDataEvent(self, event):
@@ -7,6 +7,7 @@ from datetime import datetime
 
 from vnpy.trader.vtConstant import (EMPTY_INT, EMPTY_FLOAT, 
                                     EMPTY_STRING, EMPTY_UNICODE)
+from vnpy.trader import vtCodec
 
 
 
@@ -170,7 +171,9 @@ class StSpread(object):
     def addPassiveLeg(self, leg):
         """添加被动腿"""
         self.passiveLegs.append(leg)
-        
-        
-    
-    
\ No newline at end of file
+
+
+
+# 注册RPC推送时的编码，价差行情和持仓事件的数据为价差对象
+vtCodec.registerClass(30, StLeg)
+vtCodec.registerClass(31, StSpread)
@@ -447,7 +447,7 @@ class RestApi(BigoneRestApi):
             
             # 只有订阅了深度行情才推送
             if tick.bidPrice1:
-                self.gateway.onTick(tick)
+                self.gateway.onTick(copy(tick))
     
     #----------------------------------------------------------------------
     def onQryDepth(self, data, reqid):
@@ -473,7 +473,7 @@ class RestApi(BigoneRestApi):
         tick.time = tick.datetime.strftime('%H:%M:%S')        
         
         if tick.lastPrice:
-            self.gateway.onTick(tick)
+            self.gateway.onTick(copy(tick))
     
     #----------------------------------------------------------------------
     def getTick(self, symbol):
@@ -6,6 +6,7 @@ vnpy.api.bithumb的gateway接入
 import json
 from collections import defaultdict
 from datetime import datetime
+from copy import copy
 
 from vnpy.api.bithumb import BithumbRestApi
 from vnpy.trader.vtFunction import getJsonPath
@@ -501,7 +502,7 @@ class RestApi(BithumbRestApi):
 
         # 只有订阅了深度行情才推送
         if tick.bidPrice1:
-            self.gateway.onTick(tick)
+            self.gateway.onTick(copy(tick))
 
     #----------------------------------------------------------------------
     def onQrySinglePublicTicker(self, symbol, data, reqid):
@@ -544,7 +545,7 @@ class RestApi(BithumbRestApi):
 
         # 只有订阅了深度行情才推送
         if tick.bidPrice1:
-            self.gateway.onTick(tick)
+            self.gateway.onTick(copy(tick))
 
     #----------------------------------------------------------------------
     def onQrySinglePublicOrderBook(self, symbol, data, reqid):
@@ -368,7 +368,7 @@ class WebsocketApi(BitmexWebsocketApi):
         tick.date = date.replace('-', '')
         tick.time = time.replace('Z', '')
         
-        self.gateway.onTick(tick)
+        self.gateway.onTick(copy(tick))
 
     #----------------------------------------------------------------------
     def onDepth(self, d):
@@ -392,7 +392,7 @@ class WebsocketApi(BitmexWebsocketApi):
         tick.date = date.replace('-', '')
         tick.time = time.replace('Z', '')
         
-        self.gateway.onTick(tick)
+        self.gateway.onTick(copy(tick))
     
     #----------------------------------------------------------------------
     def onTrade(self, d):
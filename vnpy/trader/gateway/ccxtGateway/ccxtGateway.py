@@ -498,7 +498,7 @@ class CcxtApi(object):
         
         # 只有订阅了深度行情才推送
         if tick.bidPrice1:
-            self.gateway.onTick(tick)
+            self.gateway.onTick(copy(tick))
     
     #----------------------------------------------------------------------
     def onQryDepth(self, data, reqid):
@@ -522,7 +522,7 @@ class CcxtApi(object):
         tick.time = tick.datetime.strftime('%H:%M:%S')        
         
         if tick.lastPrice:
-            self.gateway.onTick(tick)
+            self.gateway.onTick(copy(tick))
     
     #----------------------------------------------------------------------
     def getTick(self, symbol):
@@ -233,6 +233,9 @@ class BasicMonitor(QtWidgets.QTableWidget):
         # 默认不允许根据表头进行排序，需要的组件可以开启
         self.sorting = False
         
+        # 是否只显示最新数据（快照），开启后行情事件可以被合并
+        self.snapshot = False
+        
         # 初始化右键菜单
         self.initMenu()
         
@@ -257,6 +260,11 @@ class BasicMonitor(QtWidgets.QTableWidget):
         """设置字体"""
         self.font = font
     
+    #----------------------------------------------------------------------
+    def setSnapshot(self, snapshot):
+        """设置是否只显示最新数据"""
+        self.snapshot = snapshot
+    
     #----------------------------------------------------------------------
     def setSaveData(self, saveData):
         """设置是否要保存数据到单元格"""
@@ -289,7 +297,11 @@ class BasicMonitor(QtWidgets.QTableWidget):
     def registerEvent(self):
         """注册GUI更新相关的事件监听"""
         self.signal.connect(self.updateEvent)
-        self.eventEngine.register(self.eventType, self.signal.emit)
+        
+        if self.snapshot:
+            self.eventEngine.registerSnapshotHandler(self.eventType, self.signal.emit)
+        else:
+            self.eventEngine.register(self.eventType, self.signal.emit)
         
     #----------------------------------------------------------------------
     def updateEvent(self, event):
@@ -456,6 +468,7 @@ class MarketMonitor(BasicMonitor):
         
         # 设置监控事件类型
         self.setEventType(EVENT_TICK)
+        self.setSnapshot(True)
         
         # 设置字体
         self.setFont(BASIC_FONT)
@@ -1028,7 +1041,7 @@ class TradingWidget(QtWidgets.QFrame):
     def registerEvent(self):
         """注册事件监听"""
         self.signal.connect(self.updateTick)
-        self.eventEngine.register(EVENT_TICK, self.signal.emit)        
+        self.eventEngine.registerSnapshotHandler(EVENT_TICK, self.signal.emit)        
 
     #----------------------------------------------------------------------
     def sendOrder(self):
@@ -0,0 +1,199 @@
+# encoding: UTF-8
+
+'''
+本文件中实现了基于msgpack扩展类型的数据对象编码，用于RPC推送事件时替代cPickle。
+
+编码规则：
+    datetime：扩展类型1，int64小端的1970-01-01起微秒数（不保存时区）
+    Event：扩展类型2，内容为[type_, dict_]
+    numpy数值和数组：转换为Python数值和列表
+    数据对象：扩展类型10起，内容为[字段序号列表, 字段值列表]，
+             对象上有额外添加的属性时再附加{属性名:值}字典
+
+数据对象的字段序号由类的字段名排序得到，值为空（与默认值相同的空字符串、
+0、None）的字段以及rawData不会被编码。字段的取值和比较都通过operator和
+itertools完成，避免逐个字段的Python循环。
+
+解码时只会创建通过registerClass注册的类，不会执行推送方发来的任意代码。
+Vt数据对象在本文件中注册，各模块自定义的事件数据类（如价差交易的StSpread）
+在定义该类的模块中注册，通信双方都需要导入该模块。未注册的对象编码时抛出
+TypeError，未知编号的扩展类型解码为原始的ExtType。
+'''
+
+from __future__ import division
+
+import struct
+from datetime import datetime, timedelta
+from operator import itemgetter, ne
+from itertools import compress
+
+import numpy as np
+from msgpack import packb, unpackb, ExtType
+
+from vnpy.event import Event
+from vnpy.trader.vtObject import (VtTickData, VtBarData, VtTradeData, VtOrderData,
+                                  VtPositionData, VtAccountData, VtErrorData,
+                                  VtLogData, VtContractData, VtSubscribeReq,
+                                  VtOrderReq, VtCancelOrderReq)
+
+
+# 扩展类型编号
+EXT_DATETIME = 1
+EXT_EVENT = 2
+
+EPOCH = datetime(1970, 1, 1)
+DATETIME_STRUCT = struct.Struct('<q')
+
+# 不参与编码的字段
+SKIP_FIELDS = set(['rawData'])
+
+# 默认值为这些空值时，与默认值相同的字段不编码
+EMPTY_VALUES = ('', u'', 0, 0.0, None)
+
+# 非空默认值的标记，这些字段总是编码
+NO_DEFAULT = object()
+
+# 已注册的数据类，扩展类型编号:(类, 字段列表, 默认值列表, 序号列表, 字段取值函数, 字段集合)
+codeDict = {}
+classDict = {}      # 类:扩展类型编号
+
+
+#----------------------------------------------------------------------
+def isEmpty(value):
+    """检查是否为可以省略的空值"""
+    for empty in EMPTY_VALUES:
+        if type(value) is type(empty) and value == empty:
+            return True
+    return False
+
+
+#----------------------------------------------------------------------
+def registerClass(code, cls):
+    """
+    注册需要编码的数据类，code为10以上的扩展类型编号
+    类必须可以无参数创建，且通信双方注册的编号必须一致
+    """
+    if code < 10 or codeDict.get(code, (cls,))[0] is not cls:
+        raise ValueError('ext code %s is not available' %code)
+    
+    template = cls().__dict__
+    fieldList = sorted([field for field in template if field not in SKIP_FIELDS])
+
+    # 非空的默认值（如创建时生成的时间）不能省略
+    defaultList = []
+    for field in fieldList:
+        value = template[field]
+        if isEmpty(value):
+            defaultList.append(value)
+        else:
+            defaultList.append(NO_DEFAULT)
+
+    # 字段数量为1时itemgetter返回的不是元组
+    if len(fieldList) > 1:
+        getter = itemgetter(*fieldList)
+    else:
+        getter = lambda d: tuple(d[field] for field in fieldList)
+    fieldSet = set(template)
+
+    codeDict[code] = (cls, fieldList, defaultList, list(range(len(fieldList))), getter, fieldSet)
+    classDict[cls] = code
+
+
+registerClass(10, VtTickData)
+registerClass(11, VtBarData)
+registerClass(12, VtTradeData)
+registerClass(13, VtOrderData)
+registerClass(14, VtPositionData)
+registerClass(15, VtAccountData)
+registerClass(16, VtErrorData)
+registerClass(17, VtLogData)
+registerClass(18, VtContractData)
+registerClass(19, VtSubscribeReq)
+registerClass(20, VtOrderReq)
+registerClass(21, VtCancelOrderReq)
+
+
+#----------------------------------------------------------------------
+def encodeObject(obj):
+    """msgpack无法直接打包的对象的编码函数（用作packb的default参数）"""
+    if isinstance(obj, datetime):
+        if obj.tzinfo:
+            obj = obj.replace(tzinfo=None)
+        td = obj - EPOCH
+        us = (td.days * 86400 + td.seconds) * 1000000 + td.microseconds
+        return ExtType(EXT_DATETIME, DATETIME_STRUCT.pack(us))
+
+    if isinstance(obj, Event):
+        return ExtType(EXT_EVENT, pack([obj.type_, obj.dict_]))
+
+    # numpy数据（如策略变量）转换为Python对象后由msgpack继续打包
+    if isinstance(obj, np.generic):
+        return obj.item()
+    
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+
+    # 未注册的对象不编码，由调用方处理
+    code = classDict.get(type(obj), None)
+    if code is None:
+        raise TypeError('cannot encode unregistered type %s' %type(obj).__name__)
+
+    cls, fieldList, defaultList, indexList, getter, fieldSet = codeDict[code]
+    d = obj.__dict__
+
+    try:
+        valueList = getter(d)
+    except KeyError:
+        valueList = [d.get(field, None) for field in fieldList]
+
+    # 只保留和默认值不同的字段
+    maskList = list(map(ne, valueList, defaultList))
+    l = [list(compress(indexList, maskList)),
+         list(compress(valueList, maskList))]
+
+    # 额外添加的属性使用字段名保存
+    if len(d) > len(fieldSet):
+        l.append({field: value for field, value in d.items() if field not in fieldSet})
+
+    return ExtType(code, pack(l))
+
+
+#----------------------------------------------------------------------
+def decodeExt(code, data):
+    """扩展类型的解码函数（用作unpackb的ext_hook参数）"""
+    if code == EXT_DATETIME:
+        us = DATETIME_STRUCT.unpack(data)[0]
+        return EPOCH + timedelta(microseconds=us)
+
+    if code == EXT_EVENT:
+        type_, dict_ = unpack(data)
+        event = Event(type_)
+        event.dict_ = dict_
+        return event
+
+    if code not in codeDict:
+        return ExtType(code, data)
+
+    cls, fieldList = codeDict[code][:2]
+    obj = cls()
+    d = obj.__dict__
+
+    l = unpack(data)
+    d.update(zip(map(fieldList.__getitem__, l[0]), l[1]))
+
+    if len(l) > 2:
+        d.update(l[2])
+
+    return obj
+
+
+#----------------------------------------------------------------------
+def pack(data):
+    """打包数据"""
+    return packb(data, default=encodeObject, use_bin_type=True)
+
+
+#----------------------------------------------------------------------
+def unpack(data):
+    """解包数据"""
+    return unpackb(data, ext_hook=decodeExt, raw=False)
@@ -3,16 +3,18 @@
 from __future__ import division
 
 import os
+import glob
+import time
 import shelve
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from datetime import datetime
 from copy import copy
 
 from pymongo import MongoClient, ASCENDING
 from pymongo.errors import ConnectionFailure
 
-from vnpy.event import Event
+from vnpy.event import Event, EventEngine2, LaneEventEngine, EventMonitor
 from vnpy.trader.vtGlobal import globalSetting
 from vnpy.trader.vtEvent import *
 from vnpy.trader.vtGateway import *
@@ -21,6 +23,18 @@ from vnpy.trader.vtFunction import getTempPath
 
 
 
+#----------------------------------------------------------------------
+def createEventEngine():
+    """
+    创建无界面运行时使用的事件引擎
+    eventEngineLanes为True时使用分通道处理的LaneEventEngine，否则使用EventEngine2
+    """
+    if globalSetting.get('eventEngineLanes', False):
+        return LaneEventEngine()
+    else:
+        return EventEngine2()
+
+
 ########################################################################
 class MainEngine(object):
     """主引擎"""
@@ -33,6 +47,7 @@ class MainEngine(object):
         
         # 绑定事件引擎
         self.eventEngine = eventEngine
+        self.eventEngine.setConflation(globalSetting.get('tickConflation', False))
         self.eventEngine.start()
         
         # 创建数据引擎
@@ -55,6 +70,10 @@ class MainEngine(object):
         # 日志引擎实例
         self.logEngine = None
         self.initLogEngine()
+        
+        # 事件引擎监控实例
+        self.eventMonitor = None
+        self.initEventMonitor()
 
     #----------------------------------------------------------------------
     def addGateway(self, gatewayModule):
@@ -179,8 +198,9 @@ class MainEngine(object):
         for appEngine in self.appDict.values():
             appEngine.stop()
         
-        # 保存数据引擎里的合约数据到硬盘
+        # 保存数据引擎里的合约数据到硬盘，关闭归档
         self.dataEngine.saveContracts()
+        self.dataEngine.close()
     
     #----------------------------------------------------------------------
     def writeLog(self, content):
@@ -223,6 +243,18 @@ class MainEngine(object):
         else:
             self.writeLog(text.DATA_INSERT_FAILED)
     
+    #----------------------------------------------------------------------
+    def dbInsertMany(self, dbName, collectionName, l, ordered=False):
+        """向MongoDB中批量插入数据，l是数据字典的列表，返回是否执行了插入"""
+        if self.dbClient:
+            db = self.dbClient[dbName]
+            collection = db[collectionName]
+            collection.insert_many(l, ordered=ordered)
+            return True
+        else:
+            self.writeLog(text.DATA_INSERT_FAILED)
+            return False
+    
     #----------------------------------------------------------------------
     def dbQuery(self, dbName, collectionName, d, sortKey='', sortDirection=ASCENDING):
         """从MongoDB中读取数据，d是查询要求，返回的是数据库查询的指针"""
@@ -294,6 +326,11 @@ class MainEngine(object):
         """查询委托"""
         return self.dataEngine.getOrder(vtOrderID)
     
+    #----------------------------------------------------------------------
+    def getTrade(self, vtTradeID):
+        """查询成交"""
+        return self.dataEngine.getTrade(vtTradeID)
+    
     #----------------------------------------------------------------------
     def getPositionDetail(self, vtSymbol):
         """查询持仓细节"""
@@ -374,6 +411,16 @@ class MainEngine(object):
         # 注册事件监听
         self.registerLogEvent(EVENT_LOG)
     
+    #----------------------------------------------------------------------
+    def initEventMonitor(self):
+        """初始化事件引擎监控，eventMonitorInterval为汇总日志的输出间隔（秒），0则不启动"""
+        interval = globalSetting.get('eventMonitorInterval', 0)
+        if not interval:
+            return
+        
+        self.eventMonitor = EventMonitor(self.eventEngine, interval, self.writeLog)
+        self.eventMonitor.start()
+    
     #----------------------------------------------------------------------
     def registerLogEvent(self, eventType):
         """注册日志事件监听"""
@@ -417,8 +464,20 @@ class DataEngine(object):
         self.tradeDict = {}
         self.accountDict = {}
         self.positionDict= {}
-        self.logList = []
-        self.errorList = []
+        
+        # 日志和错误可以只保留最近的记录，默认0表示不限制
+        self.logList = deque(maxlen=globalSetting.get('logHistorySize', 0) or None)
+        self.errorList = deque(maxlen=globalSetting.get('errorHistorySize', 0) or None)
+        
+        # 已完成的委托和成交可以只在内存中保留最近的记录，超出数量或者时间的转存到归档，
+        # 默认全部保留在内存中
+        expiry = globalSetting.get('historyExpiry', 0) * 60         # 配置中的单位为分钟
+        self.orderHistory = DataHistory(self.orderDict, 'Order',
+                                        globalSetting.get('orderHistorySize', 0),
+                                        expiry)
+        self.tradeHistory = DataHistory(self.tradeDict, 'Trade',
+                                        globalSetting.get('tradeHistorySize', 0),
+                                        expiry)
         
         # 持仓细节相关
         self.detailDict = {}                                # vtSymbol:PositionDetail
@@ -433,7 +492,7 @@ class DataEngine(object):
     #----------------------------------------------------------------------
     def registerEvent(self):
         """注册事件监听"""
-        self.eventEngine.register(EVENT_TICK, self.processTickEvent)
+        self.eventEngine.registerSnapshotHandler(EVENT_TICK, self.processTickEvent)
         self.eventEngine.register(EVENT_CONTRACT, self.processContractEvent)
         self.eventEngine.register(EVENT_ORDER, self.processOrderEvent)
         self.eventEngine.register(EVENT_TRADE, self.processTradeEvent)
@@ -441,6 +500,7 @@ class DataEngine(object):
         self.eventEngine.register(EVENT_ACCOUNT, self.processAccountEvent)
         self.eventEngine.register(EVENT_LOG, self.processLogEvent)
         self.eventEngine.register(EVENT_ERROR, self.processErrorEvent)
+        self.eventEngine.register(EVENT_TIMER, self.processTimerEvent)
         
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
@@ -465,9 +525,13 @@ class DataEngine(object):
         if order.status in self.FINISHED_STATUS:
             if order.vtOrderID in self.workingOrderDict:
                 del self.workingOrderDict[order.vtOrderID]
+            
+            # 已完成的委托可以归档
+            self.orderHistory.add(order.vtOrderID)
         # 否则则更新字典中的数据        
         else:
             self.workingOrderDict[order.vtOrderID] = order
+            self.orderHistory.discard(order.vtOrderID)
             
         # 更新到持仓细节中
         detail = self.getPositionDetail(order.vtSymbol)
@@ -479,6 +543,7 @@ class DataEngine(object):
         trade = event.dict_['data']
         
         self.tradeDict[trade.vtTradeID] = trade
+        self.tradeHistory.add(trade.vtTradeID)
     
         # 更新到持仓细节中
         detail = self.getPositionDetail(trade.vtSymbol)
@@ -512,6 +577,13 @@ class DataEngine(object):
         """处理错误事件"""
         error = event.dict_['data']
         self.errorList.append(error)
+    
+    #----------------------------------------------------------------------
+    def processTimerEvent(self, event):
+        """处理定时事件"""
+        # 没有新数据时也按时间归档
+        self.orderHistory.check()
+        self.tradeHistory.check()
         
     #----------------------------------------------------------------------
     def getTick(self, vtSymbol):
@@ -553,11 +625,8 @@ class DataEngine(object):
         
     #----------------------------------------------------------------------
     def getOrder(self, vtOrderID):
-        """查询委托"""
-        try:
-            return self.orderDict[vtOrderID]
-        except KeyError:
-            return None
+        """查询委托（包括已归档的委托）"""
+        return self.orderHistory.get(vtOrderID)
     
     #----------------------------------------------------------------------
     def getAllWorkingOrders(self):
@@ -566,12 +635,17 @@ class DataEngine(object):
     
     #----------------------------------------------------------------------
     def getAllOrders(self):
-        """获取所有委托"""
+        """获取所有委托（设置了保留上限时不包括已归档的委托）"""
         return self.orderDict.values()
     
+    #----------------------------------------------------------------------
+    def getTrade(self, vtTradeID):
+        """查询成交（包括已归档的成交）"""
+        return self.tradeHistory.get(vtTradeID)
+    
     #----------------------------------------------------------------------
     def getAllTrades(self):
-        """获取所有成交"""
+        """获取所有成交（设置了保留上限时不包括已归档的成交）"""
         return self.tradeDict.values()
     
     #----------------------------------------------------------------------
@@ -635,14 +709,127 @@ class DataEngine(object):
 
     #----------------------------------------------------------------------
     def getLog(self):
-        """获取日志"""
+        """获取日志（最近的记录）"""
         return self.logList
     
     #----------------------------------------------------------------------
     def getError(self):
-        """获取错误"""
+        """获取错误（最近的记录）"""
         return self.errorList
     
+    #----------------------------------------------------------------------
+    def close(self):
+        """关闭归档"""
+        self.orderHistory.close()
+        self.tradeHistory.close()
+    
+
+########################################################################
+class DataHistory(object):
+    """
+    委托、成交等历史数据的保留和归档
+    
+    数据本身保存在数据引擎的字典中，这里按时间顺序记录可以归档的关键字（已完成的委托、成交），
+    数量超过size或者时间超过expiry（秒）的数据从字典中移除，转存到临时目录下的shelve文件中
+    （本进程专用，关闭时删除），按关键字查询时先查字典再查归档，因此移除的数据不会丢失。
+    size和expiry为0表示不限制，此时不会产生归档。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, dataDict, name, size=0, expiry=0):
+        """Constructor"""
+        self.dataDict = dataDict            # 保存数据的字典
+        self.size = size                    # 保留的数量上限
+        self.expiry = expiry                # 保留的时间上限（秒）
+        
+        self.timeDict = OrderedDict()       # 可以归档的关键字:加入时间，按加入先后排序
+        
+        self.filePath = getTempPath('%sArchive%s.vt' %(name, os.getpid()))    # 归档文件路径
+        self.shelf = None                   # 归档文件对象（有数据时才创建）
+        self.archiveCount = 0               # 已归档的数量
+    
+    #----------------------------------------------------------------------
+    def add(self, key):
+        """标记数据可以归档"""
+        # 重复推送的数据重新计时
+        if key in self.timeDict:
+            del self.timeDict[key]
+        self.timeDict[key] = time.time()
+        
+        self.check()
+    
+    #----------------------------------------------------------------------
+    def discard(self, key):
+        """取消归档标记"""
+        if key in self.timeDict:
+            del self.timeDict[key]
+    
+    #----------------------------------------------------------------------
+    def check(self):
+        """检查并归档超出数量或者时间的数据"""
+        timeDict = self.timeDict
+        if not timeDict:
+            return
+        
+        now = time.time()
+        
+        while timeDict:
+            key = next(iter(timeDict))
+            
+            overSize = self.size and len(timeDict) > self.size
+            overTime = self.expiry and now - timeDict[key] > self.expiry
+            if not (overSize or overTime):
+                break
+            
+            del timeDict[key]
+            self.archive(key)
+    
+    #----------------------------------------------------------------------
+    def archive(self, key):
+        """从字典中移除数据，写入归档文件"""
+        data = self.dataDict.pop(key, None)
+        if data is None:
+            return
+        
+        if self.shelf is None:
+            self.shelf = shelve.open(self.filePath, flag='n')
+        
+        self.shelf[self.convertKey(key)] = data
+        self.archiveCount += 1
+    
+    #----------------------------------------------------------------------
+    def get(self, key):
+        """查询数据"""
+        data = self.dataDict.get(key, None)
+        
+        if data is None and self.shelf is not None:
+            data = self.shelf.get(self.convertKey(key), None)
+        
+        return data
+    
+    #----------------------------------------------------------------------
+    def convertKey(self, key):
+        """shelve的关键字必须是字符串"""
+        if not isinstance(key, str):
+            key = key.encode('utf-8')
+        return key
+    
+    #----------------------------------------------------------------------
+    def close(self):
+        """关闭并删除归档文件"""
+        if self.shelf is None:
+            return
+        
+        self.shelf.close()
+        self.shelf = None
+        
+        # 不同的dbm实现生成的文件后缀不同
+        for path in glob.glob(self.filePath + '*'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
 
 ########################################################################    
 class LogEngine(object):
@@ -751,6 +938,10 @@ class LogEngine(object):
 class PositionDetail(object):
     """本地维护的持仓信息"""
     WORKING_STATUS = [STATUS_UNKNOWN, STATUS_NOTTRADED, STATUS_PARTTRADED]
+    CLOSE_OFFSET = [OFFSET_CLOSE, OFFSET_CLOSETODAY, OFFSET_CLOSEYESTERDAY]
+    
+    # 每次增量更新冻结量后和全量计算的结果进行核对（调试用）
+    CHECK_FROZEN = globalSetting.get('frozenCheck', False)
     
     MODE_NORMAL = 'normal'          # 普通模式
     MODE_SHFE = 'shfe'              # 上期所今昨分别平仓
@@ -796,6 +987,10 @@ class PositionDetail(object):
         
         self.workingOrderDict = {}
         
+        # 增量维护的平仓委托冻结量，冻结类型为(委托方向, 开平)
+        self.frozenOrderDict = {}       # vtOrderID:(冻结类型, 冻结量)
+        self.frozenVolumeDict = {}      # 冻结类型:冻结量合计
+        
     #----------------------------------------------------------------------
     def updateTrade(self, trade):
         """成交更新"""
@@ -850,21 +1045,26 @@ class PositionDetail(object):
         self.calculatePrice(trade)
         self.calculatePosition()
         self.calculatePnl()
+        
+        # 今仓变化后重新分配今昨冻结
+        self.allocateFrozen()
     
     #----------------------------------------------------------------------
     def updateOrder(self, order):
         """委托更新"""
-        # 将活动委托缓存下来
+        # 将活动委托缓存下来，冻结剩余未成交的数量
         if order.status in self.WORKING_STATUS:
             self.workingOrderDict[order.vtOrderID] = order
+            frozenVolume = order.totalVolume - order.tradedVolume
             
-        # 移除缓存中已经完成的委托
+        # 移除缓存中已经完成的委托，不再冻结
         else:
             if order.vtOrderID in self.workingOrderDict:
                 del self.workingOrderDict[order.vtOrderID]
+            frozenVolume = 0
                 
         # 计算冻结
-        self.calculateFrozen()
+        self.updateFrozen(order.vtOrderID, order.direction, order.offset, frozenVolume)
     
     #----------------------------------------------------------------------
     def updatePosition(self, pos):
@@ -881,6 +1081,9 @@ class PositionDetail(object):
             self.shortTd = self.shortPos - self.shortYd
             self.shortPnl = pos.positionProfit
             self.shortPrice = pos.price
+        
+        # 今仓变化后重新分配今昨冻结
+        self.allocateFrozen()
             
     #----------------------------------------------------------------------
     def updateOrderReq(self, req, vtOrderID):
@@ -901,7 +1104,7 @@ class PositionDetail(object):
         self.workingOrderDict[vtOrderID] = order
         
         # 计算冻结量
-        self.calculateFrozen()
+        self.updateFrozen(vtOrderID, order.direction, order.offset, order.totalVolume)
         
     #----------------------------------------------------------------------
     def updateTick(self, tick):
@@ -944,56 +1147,95 @@ class PositionDetail(object):
         self.shortPos = self.shortTd + self.shortYd      
         
     #----------------------------------------------------------------------
-    def calculateFrozen(self):
-        """计算冻结情况"""
-        # 清空冻结数据
-        self.longPosFrozen = EMPTY_INT
-        self.longYdFrozen = EMPTY_INT
-        self.longTdFrozen = EMPTY_INT
-        self.shortPosFrozen = EMPTY_INT
-        self.shortYdFrozen = EMPTY_INT
-        self.shortTdFrozen = EMPTY_INT     
+    def updateFrozen(self, vtOrderID, direction, offset, frozenVolume):
+        """根据委托冻结量的变化增量更新冻结情况，frozenVolume为0表示委托不再冻结持仓"""
+        key = (direction, offset)
+        d = self.frozenVolumeDict
+        
+        # 冻结情况没有变化
+        old = self.frozenOrderDict.get(vtOrderID, None)
+        if old == (key, frozenVolume):
+            return
+        
+        # 扣除委托原先的冻结量
+        if old:
+            oldKey, oldVolume = old
+            d[oldKey] -= oldVolume
+            del self.frozenOrderDict[vtOrderID]
+        
+        # 只有平仓委托会冻结持仓
+        if frozenVolume and offset in self.CLOSE_OFFSET:
+            d[key] = d.get(key, 0) + frozenVolume
+            self.frozenOrderDict[vtOrderID] = (key, frozenVolume)
+        
+        self.allocateFrozen()
+        
+        if self.CHECK_FROZEN:
+            self.checkFrozen()
+    
+    #----------------------------------------------------------------------
+    def allocateFrozen(self):
+        """根据各类平仓委托的冻结量，计算今昨冻结"""
+        # 多头委托冻结空头持仓，空头委托冻结多头持仓
+        self.shortTdFrozen, self.shortYdFrozen = self.splitFrozen(DIRECTION_LONG, self.shortTd)
+        self.longTdFrozen, self.longYdFrozen = self.splitFrozen(DIRECTION_SHORT, self.longTd)
+        
+        # 汇总今昨冻结
+        self.longPosFrozen = self.longYdFrozen + self.longTdFrozen
+        self.shortPosFrozen = self.shortYdFrozen + self.shortTdFrozen
+    
+    #----------------------------------------------------------------------
+    def splitFrozen(self, direction, td):
+        """计算某一方向委托的今昨冻结量"""
+        d = self.frozenVolumeDict
+        tdFrozen = d.get((direction, OFFSET_CLOSETODAY), 0)
+        ydFrozen = d.get((direction, OFFSET_CLOSEYESTERDAY), 0)
+        closeFrozen = d.get((direction, OFFSET_CLOSE), 0)
+        
+        # 平仓委托优先冻结今仓，超出剩余今仓的部分冻结昨仓
+        closeTdFrozen = min(closeFrozen, max(td - tdFrozen, 0))
+        tdFrozen += closeTdFrozen
+        ydFrozen += closeFrozen - closeTdFrozen
+        
+        return tdFrozen, ydFrozen
+    
+    #----------------------------------------------------------------------
+    def sumFrozen(self):
+        """遍历所有活动委托，统计各委托和各类型的冻结量"""
+        frozenOrderDict = {}
+        frozenVolumeDict = {}
         
-        # 遍历统计
-        for order in self.workingOrderDict.values():
+        for vtOrderID, order in self.workingOrderDict.items():
             # 计算剩余冻结量
             frozenVolume = order.totalVolume - order.tradedVolume
+            if not frozenVolume or order.offset not in self.CLOSE_OFFSET:
+                continue
             
-            # 多头委托
-            if order.direction is DIRECTION_LONG:
-                # 平今
-                if order.offset is OFFSET_CLOSETODAY:
-                    self.shortTdFrozen += frozenVolume
-                # 平昨
-                elif order.offset is OFFSET_CLOSEYESTERDAY:
-                    self.shortYdFrozen += frozenVolume
-                # 平仓
-                elif order.offset is OFFSET_CLOSE:
-                    self.shortTdFrozen += frozenVolume
-                    
-                    if self.shortTdFrozen > self.shortTd:
-                        self.shortYdFrozen += (self.shortTdFrozen - self.shortTd)
-                        self.shortTdFrozen = self.shortTd
-            # 空头委托
-            elif order.direction is DIRECTION_SHORT:
-                # 平今
-                if order.offset is OFFSET_CLOSETODAY:
-                    self.longTdFrozen += frozenVolume
-                # 平昨
-                elif order.offset is OFFSET_CLOSEYESTERDAY:
-                    self.longYdFrozen += frozenVolume
-                # 平仓
-                elif order.offset is OFFSET_CLOSE:
-                    self.longTdFrozen += frozenVolume
-                    
-                    if self.longTdFrozen > self.longTd:
-                        self.longYdFrozen += (self.longTdFrozen - self.longTd)
-                        self.longTdFrozen = self.longTd
-                        
-            # 汇总今昨冻结
-            self.longPosFrozen = self.longYdFrozen + self.longTdFrozen
-            self.shortPosFrozen = self.shortYdFrozen + self.shortTdFrozen
-            
+            key = (order.direction, order.offset)
+            frozenOrderDict[vtOrderID] = (key, frozenVolume)
+            frozenVolumeDict[key] = frozenVolumeDict.get(key, 0) + frozenVolume
+        
+        return frozenOrderDict, frozenVolumeDict
+    
+    #----------------------------------------------------------------------
+    def calculateFrozen(self):
+        """计算冻结情况（遍历所有活动委托全量计算）"""
+        self.frozenOrderDict, self.frozenVolumeDict = self.sumFrozen()
+        self.allocateFrozen()
+    
+    #----------------------------------------------------------------------
+    def checkFrozen(self):
+        """核对增量更新的冻结量和全量计算的结果，不一致时记录日志并使用全量计算的结果"""
+        frozenOrderDict, frozenVolumeDict = self.sumFrozen()
+        
+        volumeDict = dict([(key, volume) for key, volume in self.frozenVolumeDict.items() if volume])
+        if frozenOrderDict == self.frozenOrderDict and frozenVolumeDict == volumeDict:
+            return True
+        
+        logging.error(u'%s冻结量增量计算结果不一致，增量：%s，全量：%s' %(self.vtSymbol, volumeDict, frozenVolumeDict))
+        self.calculateFrozen()
+        return False
+    
     #----------------------------------------------------------------------
     def convertOrderReq(self, req):
         """转换委托请求"""
@@ -31,6 +31,58 @@ def safeUnicode(value):
     return text_type(value)
 
 
+# 行情时间解析器缓存的日期数量
+DATE_CACHE_SIZE = 64
+
+
+########################################################################
+class DatetimeParser(object):
+    """
+    行情时间解析器，替代datetime.strptime生成tick的datetime字段
+    
+    日期字符串（YYYYMMDD）解析后缓存，时间字符串（HH:MM:SS或者HH:MM:SS.f）
+    按固定位置切片转换，毫秒部分和%f一样按1-6位小数处理，
+    其他格式的时间仍然交给strptime解析（格式错误时抛出ValueError）。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, cacheSize=DATE_CACHE_SIZE):
+        """Constructor"""
+        self.cacheSize = cacheSize
+        self.dateDict = {}      # 日期字符串:(年, 月, 日)
+    
+    #----------------------------------------------------------------------
+    def parse(self, date, time):
+        """解析日期和时间字符串，返回datetime对象"""
+        ymd = self.dateDict.get(date, None)
+        if ymd is None:
+            d = datetime.strptime(date, '%Y%m%d')
+            ymd = (d.year, d.month, d.day)
+            
+            # 缓存的日期数量有限，超出时清空
+            if len(self.dateDict) >= self.cacheSize:
+                self.dateDict.clear()
+            self.dateDict[date] = ymd
+        
+        n = len(time)
+        if n >= 8 and time[2] == ':' and time[5] == ':':
+            if n == 8:
+                microsecond = 0
+            elif time[8] == '.' and 9 < n <= 15 and time[9:].isdigit():
+                microsecond = int(time[9:].ljust(6, '0'))
+            else:
+                microsecond = None
+            
+            if microsecond is not None and time[0:2].isdigit() and time[3:5].isdigit() and time[6:8].isdigit():
+                return datetime(ymd[0], ymd[1], ymd[2], int(time[0:2]), int(time[3:5]), int(time[6:8]), microsecond)
+        
+        # 非标准格式的时间
+        if '.' in time:
+            return datetime.strptime(' '.join([date, time]), '%Y%m%d %H:%M:%S.%f')
+        else:
+            return datetime.strptime(' '.join([date, time]), '%Y%m%d %H:%M:%S')
+
+
 #----------------------------------------------------------------------
 def todayDate():
     """获取当前本机电脑时间的日期"""
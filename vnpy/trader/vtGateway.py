@@ -7,6 +7,7 @@ from vnpy.event import *
 from vnpy.trader.vtEvent import *
 from vnpy.trader.vtConstant import *
 from vnpy.trader.vtObject import *
+from vnpy.trader.vtFunction import DatetimeParser
 
 
 ########################################################################
@@ -19,9 +20,23 @@ class VtGateway(object):
         self.eventEngine = eventEngine
         self.gatewayName = gatewayName
         
+        self.datetimeParser = DatetimeParser()      # 行情时间解析器
+        
     #----------------------------------------------------------------------
     def onTick(self, tick):
-        """市场行情推送"""
+        """
+        市场行情推送
+        
+        推送的tick对象由所有订阅者（包括CTA策略）共享，不会再复制，
+        因此接口每次推送都需要使用新的对象，推送后不能再修改。
+        """
+        # 添加datetime字段，只在推送时解析一次，异常时间由各模块自行过滤
+        if not tick.datetime:
+            try:
+                tick.datetime = self.datetimeParser.parse(tick.date, tick.time)
+            except ValueError:
+                pass
+        
         # 通用事件
         event1 = Event(type_=EVENT_TICK)
         event1.dict_['data'] = tick
@@ -0,0 +1,394 @@
+# encoding: UTF-8
+
+'''
+本文件中实现了行情数据的本地追加日志（Journal），用于数据记录时替代MongoDB写入。
+
+存储结构：
+    根目录/数据库名/合约代码/meta.json        合约信息和数据类型
+    根目录/数据库名/合约代码/YYYYMMDD.jnl     按自然日保存的定长二进制记录
+    根目录/数据库名/合约代码/compacted.json   已合并的日志文件日期和合并时的文件大小
+
+每条记录使用struct按固定格式打包（小端，无对齐），依次为：
+    datetime：int64，1970-01-01起的微秒数
+    数值字段：float64，字段列表与HistoryStore一致
+    date：8字节字符串
+    time：16字节字符串
+
+记录格式与numpy结构化数组完全一致，读取时直接使用np.fromfile按列解析。
+文件末尾因崩溃产生的不完整记录在读取时会被忽略，重新打开文件追加前会被截掉，
+保证之后写入的记录仍然对齐。收盘后可将日志合并到HistoryStore中，
+合并后没有再写入的日志文件不会重复合并。
+'''
+
+from __future__ import division
+
+import os
+import json
+import struct
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+
+from vnpy.trader.vtConstant import EMPTY_STRING
+from vnpy.trader.vtFunction import getTempPath
+from vnpy.trader.vtStore import (HistoryStore, DATATYPE_TICK,
+                                 META_FILE_NAME, PARTITION_FORMAT,
+                                 getFieldList, getColumnList, iterDict, makeDataList)
+
+
+# 日志文件相关
+JOURNAL_SUFFIX = '.jnl'
+COMPACTED_FILE_NAME = 'compacted.json'
+EPOCH = datetime(1970, 1, 1)
+
+# 字符串字段的定长宽度
+DATE_WIDTH = 8
+TIME_WIDTH = 16
+
+
+#----------------------------------------------------------------------
+def getRecordStruct(dataType):
+    """获取数据类型对应的记录打包格式"""
+    fmt = '<q%sd%ss%ss' %(len(getFieldList(dataType)), DATE_WIDTH, TIME_WIDTH)
+    return struct.Struct(fmt)
+
+
+#----------------------------------------------------------------------
+def getRecordDtype(dataType):
+    """获取数据类型对应的numpy结构化数组类型，和记录打包格式一致"""
+    l = [('datetime', '<i8')]
+    l.extend([(field, '<f8') for field in getFieldList(dataType)])
+    l.append(('date', 'S%s' %DATE_WIDTH))
+    l.append(('time', 'S%s' %TIME_WIDTH))
+    return np.dtype(l)
+
+
+#----------------------------------------------------------------------
+def toMicrosecond(dt):
+    """将datetime转换为1970-01-01起的微秒数"""
+    td = dt - EPOCH
+    return (td.days * 86400 + td.seconds) * 1000000 + td.microseconds
+
+
+#----------------------------------------------------------------------
+def toBytes(s):
+    """将字符串转换为定长记录中保存的字节"""
+    if not isinstance(s, bytes):
+        s = s.encode('ascii', 'ignore')
+    return s
+
+
+#----------------------------------------------------------------------
+def loadJournalFile(filePath, dataType):
+    """读取单个日志文件，返回按列组织的数组字典（不包括合约信息）"""
+    dtype = getRecordDtype(dataType)
+
+    # 崩溃时写了一半的记录直接忽略
+    count = os.path.getsize(filePath) // dtype.itemsize
+    records = np.fromfile(filePath, dtype=dtype, count=count)
+
+    # 日志按到达顺序写入，必要时按时间戳排序
+    dtArray = records['datetime']
+    if len(dtArray) > 1 and (np.diff(dtArray) < 0).any():
+        records = records[np.argsort(dtArray, kind='mergesort')]
+
+    arrayDict = {}
+    arrayDict['datetime'] = records['datetime'].astype('datetime64[us]')
+    for field in getFieldList(dataType):
+        arrayDict[field] = records[field].astype(float)
+    arrayDict['date'] = records['date'].astype('U')
+    arrayDict['time'] = records['time'].astype('U')
+    return arrayDict
+
+
+########################################################################
+class DataJournal(object):
+    """行情数据的本地追加日志"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, path=''):
+        """Constructor"""
+        if not path:
+            path = getTempPath('DataJournal')
+        self.path = path
+
+        self.fileDict = {}          # 打开的日志文件，key为(dbName, symbol, 日期)
+        self.structDict = {}        # 数据类型:记录打包格式
+        self.metaDict = {}          # 缓存的合约信息，key为(dbName, symbol)
+
+        self.lock = Lock()
+
+        self.count = 0              # 写入的记录数量
+
+    #----------------------------------------------------------------------
+    def getSymbolPath(self, dbName, symbol):
+        """获取合约日志所在目录"""
+        return os.path.join(self.path, dbName, symbol)
+
+    #----------------------------------------------------------------------
+    def getMeta(self, dbName, symbol):
+        """获取合约信息，若不存在则返回None"""
+        key = (dbName, symbol)
+        if key in self.metaDict:
+            return self.metaDict[key]
+
+        filePath = os.path.join(self.getSymbolPath(dbName, symbol), META_FILE_NAME)
+        if not os.path.isfile(filePath):
+            return None
+
+        with open(filePath) as f:
+            meta = json.load(f)
+
+        self.metaDict[key] = meta
+        return meta
+
+    #----------------------------------------------------------------------
+    def saveMeta(self, dbName, symbol, data, dataType):
+        """保存合约信息"""
+        symbolPath = self.getSymbolPath(dbName, symbol)
+        if not os.path.exists(symbolPath):
+            os.makedirs(symbolPath)
+
+        meta = {'dataType': dataType}
+        for field in HistoryStore.META_FIELDS:
+            meta[field] = getattr(data, field, EMPTY_STRING)
+
+        with open(os.path.join(symbolPath, META_FILE_NAME), 'w') as f:
+            json.dump(meta, f)
+
+        self.metaDict[(dbName, symbol)] = meta
+        return meta
+
+    #----------------------------------------------------------------------
+    def hasData(self, dbName, symbol):
+        """检查是否保存了该合约的日志"""
+        return self.getMeta(dbName, symbol) is not None
+
+    #----------------------------------------------------------------------
+    def getDateList(self, dbName, symbol):
+        """获取已保存的日志日期列表（已排序）"""
+        symbolPath = self.getSymbolPath(dbName, symbol)
+        if not os.path.isdir(symbolPath):
+            return []
+
+        l = [name[:-len(JOURNAL_SUFFIX)] for name in os.listdir(symbolPath)
+             if name.endswith(JOURNAL_SUFFIX)]
+        l.sort()
+        return l
+
+    #----------------------------------------------------------------------
+    def getFilePath(self, dbName, symbol, date):
+        """获取日志文件路径"""
+        return os.path.join(self.getSymbolPath(dbName, symbol), date + JOURNAL_SUFFIX)
+
+    #----------------------------------------------------------------------
+    def append(self, dbName, symbol, data, dataType=DATATYPE_TICK):
+        """追加一条数据（VtTickData或者VtBarData）"""
+        dt = data.datetime
+        date = dt.strftime(PARTITION_FORMAT)
+
+        record = [toMicrosecond(dt)]
+        record.extend([getattr(data, field, 0) or 0 for field in getFieldList(dataType)])
+        record.append(toBytes(data.date))
+        record.append(toBytes(data.time))
+
+        with self.lock:
+            s = self.structDict.get(dataType, None)
+            if not s:
+                s = getRecordStruct(dataType)
+                self.structDict[dataType] = s
+
+            f = self.getFile(dbName, symbol, date, data, dataType)
+            f.write(s.pack(*record))
+            self.count += 1
+
+    #----------------------------------------------------------------------
+    def getFile(self, dbName, symbol, date, data, dataType):
+        """获取日志文件对象，跨日时关闭前一天的文件，打开时截掉末尾不完整的记录"""
+        key = (dbName, symbol, date)
+        f = self.fileDict.get(key, None)
+
+        if not f:
+            if not self.hasData(dbName, symbol):
+                self.saveMeta(dbName, symbol, data, dataType)
+
+            for k in list(self.fileDict.keys()):
+                if k[:2] == key[:2]:
+                    self.fileDict.pop(k).close()
+
+            f = open(self.getFilePath(dbName, symbol, date), 'ab')
+
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            remainder = size % getRecordDtype(dataType).itemsize
+            if remainder:
+                f.truncate(size - remainder)
+
+            self.fileDict[key] = f
+
+        return f
+
+    #----------------------------------------------------------------------
+    def flush(self, fsync=True):
+        """将缓冲区写入硬盘，fsync为True时等待操作系统落盘"""
+        with self.lock:
+            for f in self.fileDict.values():
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+
+    #----------------------------------------------------------------------
+    def close(self):
+        """关闭所有日志文件"""
+        self.flush()
+
+        with self.lock:
+            for f in self.fileDict.values():
+                f.close()
+            self.fileDict.clear()
+
+    #----------------------------------------------------------------------
+    def loadArray(self, dbName, symbol, start=None, end=None, includeEnd=False):
+        """
+        读取时间范围内的数据，返回按列组织的数组字典，格式与HistoryStore一致
+        start和end为datetime对象，为None时表示不限制
+        includeEnd为True时包含end时间戳上的数据
+        """
+        meta = self.getMeta(dbName, symbol)
+        if not meta:
+            return {}
+
+        dataType = meta['dataType']
+        fieldList = getColumnList(dataType)
+
+        # 筛选时间范围涉及的日期
+        dateList = self.getDateList(dbName, symbol)
+        if start:
+            startDate = start.strftime(PARTITION_FORMAT)
+            dateList = [d for d in dateList if d >= startDate]
+        if end:
+            endDate = end.strftime(PARTITION_FORMAT)
+            dateList = [d for d in dateList if d <= endDate]
+
+        # 读取前先将缓冲区写入文件
+        self.flush(fsync=False)
+
+        dayDictList = [loadJournalFile(self.getFilePath(dbName, symbol, d), dataType)
+                       for d in dateList]
+
+        arrayDict = {}
+        for field in fieldList:
+            if dayDictList:
+                arrayDict[field] = np.concatenate([d[field] for d in dayDictList])
+            elif field == 'datetime':
+                arrayDict[field] = np.array([], dtype='datetime64[us]')
+            elif field in HistoryStore.STRING_FIELDS:
+                arrayDict[field] = np.array([], dtype='U')
+            else:
+                arrayDict[field] = np.array([], dtype=float)
+
+        # 二分查找定位精确的时间范围
+        dtArray = arrayDict['datetime']
+
+        startIndex = 0
+        if start:
+            startIndex = np.searchsorted(dtArray, np.datetime64(start, 'us'), 'left')
+
+        endIndex = len(dtArray)
+        if end:
+            if includeEnd:
+                side = 'right'
+            else:
+                side = 'left'
+            endIndex = np.searchsorted(dtArray, np.datetime64(end, 'us'), side)
+
+        for field in fieldList:
+            arrayDict[field] = arrayDict[field][startIndex:endIndex]
+
+        for field in HistoryStore.META_FIELDS:
+            arrayDict[field] = meta.get(field, EMPTY_STRING)
+        arrayDict['dataType'] = dataType
+
+        return arrayDict
+
+    #----------------------------------------------------------------------
+    def iterDict(self, arrayDict):
+        """将按列组织的数据逐条转换为字典（兼容数据库查询结果的格式）"""
+        return iterDict(arrayDict)
+
+    #----------------------------------------------------------------------
+    def loadData(self, dbName, symbol, start=None, end=None, includeEnd=False):
+        """读取时间范围内的数据，返回VtBarData或VtTickData对象列表"""
+        arrayDict = self.loadArray(dbName, symbol, start, end, includeEnd)
+        return makeDataList(arrayDict)
+
+    #----------------------------------------------------------------------
+    def loadCompacted(self, dbName, symbol):
+        """读取已合并的日志记录，返回日期:合并时的文件大小字典"""
+        filePath = os.path.join(self.getSymbolPath(dbName, symbol), COMPACTED_FILE_NAME)
+        if not os.path.isfile(filePath):
+            return {}
+
+        with open(filePath) as f:
+            return json.load(f)
+
+    #----------------------------------------------------------------------
+    def saveCompacted(self, dbName, symbol, compactedDict):
+        """保存已合并的日志记录"""
+        filePath = os.path.join(self.getSymbolPath(dbName, symbol), COMPACTED_FILE_NAME)
+        with open(filePath, 'w') as f:
+            json.dump(compactedDict, f)
+
+    #----------------------------------------------------------------------
+    def compact(self, store, remove=False, force=False):
+        """
+        将日志合并到按列存储的HistoryStore中，返回合并的记录数量
+        只合并新增或者上次合并后又有写入（文件大小变化）的日志文件，force为True时全部重新合并
+        同一时间戳的数据由HistoryStore去重，因此可以重复合并
+        remove为True时合并后删除日志文件（当天仍在写入的文件除外）
+        """
+        self.flush()
+
+        count = 0
+
+        if not os.path.isdir(self.path):
+            return count
+
+        for dbName in os.listdir(self.path):
+            dbPath = os.path.join(self.path, dbName)
+            if not os.path.isdir(dbPath):
+                continue
+
+            for symbol in os.listdir(dbPath):
+                meta = self.getMeta(dbName, symbol)
+                if not meta:
+                    continue
+
+                compactedDict = self.loadCompacted(dbName, symbol)
+                changed = False
+
+                for date in self.getDateList(dbName, symbol):
+                    filePath = self.getFilePath(dbName, symbol, date)
+                    size = os.path.getsize(filePath)
+
+                    # 跳过已经合并过且之后没有写入的文件
+                    if force or compactedDict.get(date, None) != size:
+                        arrayDict = loadJournalFile(filePath, meta['dataType'])
+                        store.insertArray(dbName, symbol, arrayDict, meta)
+                        count += len(arrayDict['datetime'])
+
+                        compactedDict[date] = size
+                        changed = True
+
+                    if remove:
+                        with self.lock:
+                            if (dbName, symbol, date) not in self.fileDict:
+                                os.remove(filePath)
+                                compactedDict.pop(date, None)
+                                changed = True
+
+                if changed:
+                    self.saveCompacted(dbName, symbol, compactedDict)
+
+        return count
@@ -20,7 +20,12 @@ class VtBaseData(object):
  
 ########################################################################
 class VtTickData(VtBaseData):
-    """Tick行情数据类"""
+    """
+    Tick行情数据类
+    
+    接口推送后的tick对象由所有订阅者共享，只能读取不能修改，
+    需要修改或者长期保存不同时刻的数据时请自行复制。
+    """
 
     #----------------------------------------------------------------------
     def __init__(self):
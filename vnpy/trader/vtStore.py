@@ -0,0 +1,427 @@
+# encoding: UTF-8
+
+'''
+本文件中实现了按列存储的本地历史数据库，用于替代MongoDB进行历史数据的批量读取。
+
+存储结构：
+    根目录/数据库名/合约代码/meta.json           合约信息和数据类型
+    根目录/数据库名/合约代码/YYYYMMDD/字段名.npy  按自然日分区的单列数组
+
+每个分区中的数据按datetime排序，读取时通过内存映射（mmap）加载，
+按时间范围查询时使用二分查找定位，全程不生成逐条数据的字典。
+'''
+
+from __future__ import division
+
+import os
+import json
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from vnpy.trader.vtConstant import EMPTY_STRING
+from vnpy.trader.vtObject import VtBarData, VtTickData
+from vnpy.trader.vtFunction import getTempPath
+
+
+# 数据类型
+DATATYPE_BAR = 'bar'
+DATATYPE_TICK = 'tick'
+
+# 分区相关
+META_FILE_NAME = 'meta.json'
+PARTITION_FORMAT = '%Y%m%d'
+
+
+########################################################################
+class HistoryStore(object):
+    """按列存储的本地历史数据库"""
+
+    # 需要按列保存的数值字段
+    BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'openInterest']
+
+    TICK_FIELDS = ['lastPrice', 'lastVolume', 'volume', 'openInterest',
+                   'openPrice', 'highPrice', 'lowPrice', 'preClosePrice',
+                   'upperLimit', 'lowerLimit',
+                   'bidPrice1', 'bidPrice2', 'bidPrice3', 'bidPrice4', 'bidPrice5',
+                   'askPrice1', 'askPrice2', 'askPrice3', 'askPrice4', 'askPrice5',
+                   'bidVolume1', 'bidVolume2', 'bidVolume3', 'bidVolume4', 'bidVolume5',
+                   'askVolume1', 'askVolume2', 'askVolume3', 'askVolume4', 'askVolume5']
+
+    # 需要按列保存的字符串字段
+    STRING_FIELDS = ['date', 'time']
+
+    # 保存在meta.json中的合约信息字段
+    META_FIELDS = ['vtSymbol', 'symbol', 'exchange']
+
+    #----------------------------------------------------------------------
+    def __init__(self, path=''):
+        """Constructor"""
+        if not path:
+            path = getTempPath('HistoryStore')
+        self.path = path
+
+        self.metaDict = {}      # 缓存的合约信息，key为(dbName, symbol)
+
+    #----------------------------------------------------------------------
+    def getSymbolPath(self, dbName, symbol):
+        """获取合约数据所在目录"""
+        return os.path.join(self.path, dbName, symbol)
+
+    #----------------------------------------------------------------------
+    def getFieldList(self, dataType):
+        """获取数据类型对应的数值字段列表"""
+        return getFieldList(dataType)
+
+    #----------------------------------------------------------------------
+    def getMeta(self, dbName, symbol):
+        """获取合约信息，若不存在则返回None"""
+        key = (dbName, symbol)
+        if key in self.metaDict:
+            return self.metaDict[key]
+
+        filePath = os.path.join(self.getSymbolPath(dbName, symbol), META_FILE_NAME)
+        if not os.path.isfile(filePath):
+            return None
+
+        with open(filePath) as f:
+            meta = json.load(f)
+
+        self.metaDict[key] = meta
+        return meta
+
+    #----------------------------------------------------------------------
+    def saveMeta(self, dbName, symbol, meta):
+        """保存合约信息"""
+        symbolPath = self.getSymbolPath(dbName, symbol)
+        if not os.path.exists(symbolPath):
+            os.makedirs(symbolPath)
+
+        with open(os.path.join(symbolPath, META_FILE_NAME), 'w') as f:
+            json.dump(meta, f)
+
+        self.metaDict[(dbName, symbol)] = meta
+
+    #----------------------------------------------------------------------
+    def hasData(self, dbName, symbol):
+        """检查是否保存了该合约的数据"""
+        return self.getMeta(dbName, symbol) is not None
+
+    #----------------------------------------------------------------------
+    def getPartitionList(self, dbName, symbol):
+        """获取已保存的分区日期列表（已排序）"""
+        symbolPath = self.getSymbolPath(dbName, symbol)
+        if not os.path.isdir(symbolPath):
+            return []
+
+        l = [name for name in os.listdir(symbolPath)
+             if len(name) == 8 and name.isdigit()]
+        l.sort()
+        return l
+
+    #----------------------------------------------------------------------
+    def insertData(self, dbName, symbol, dataList, dataType=DATATYPE_BAR):
+        """
+        插入数据，dataList中可以是VtBarData/VtTickData对象或者对应的字典
+        同一时间戳的数据会被新数据覆盖
+        """
+        if not dataList:
+            return
+
+        arrayDict = makeArray(dataList, dataType)
+
+        meta = {'dataType': dataType}
+        for field in self.META_FIELDS:
+            meta[field] = arrayDict[field]
+
+        self.insertArray(dbName, symbol, arrayDict, meta)
+
+    #----------------------------------------------------------------------
+    def insertArray(self, dbName, symbol, arrayDict, meta):
+        """
+        插入按列组织的数据
+        arrayDict中必须包含datetime64[us]类型的datetime数组
+        meta为合约信息字典，必须包含dataType
+        """
+        dtArray = arrayDict['datetime']
+        if not len(dtArray):
+            return
+
+        if not self.hasData(dbName, symbol):
+            self.saveMeta(dbName, symbol, meta)
+
+        fieldList = getColumnList(meta['dataType'])
+
+        # 按自然日拆分到各个分区
+        dayArray = dtArray.astype('datetime64[D]')
+        for day in np.unique(dayArray):
+            mask = dayArray == day
+            partition = day.astype(datetime).strftime(PARTITION_FORMAT)
+
+            newDict = {}
+            for field in fieldList:
+                newDict[field] = np.asarray(arrayDict[field])[mask]
+
+            self.mergePartition(dbName, symbol, partition, newDict, fieldList)
+
+    #----------------------------------------------------------------------
+    def mergePartition(self, dbName, symbol, partition, newDict, fieldList):
+        """合并新数据到分区中并写入硬盘"""
+        partitionPath = os.path.join(self.getSymbolPath(dbName, symbol), partition)
+
+        # 若分区已存在，则先读取旧数据进行合并
+        if os.path.isdir(partitionPath):
+            oldDict = self.loadPartition(partitionPath, fieldList, mmap=False)
+            mergedDict = {}
+            for field in fieldList:
+                mergedDict[field] = np.concatenate([oldDict[field], newDict[field]])
+        else:
+            mergedDict = newDict
+
+        # 稳定排序后去除重复时间戳，保留最后（即最新插入）的数据
+        dtArray = mergedDict['datetime']
+        index = np.argsort(dtArray, kind='mergesort')
+        sortedDt = dtArray[index]
+        keep = np.append(sortedDt[1:] != sortedDt[:-1], True)
+        index = index[keep]
+
+        # 先写入临时目录，完成后再替换，避免写入中断导致分区损坏
+        tempPath = partitionPath + '.tmp'
+        if os.path.isdir(tempPath):
+            shutil.rmtree(tempPath)
+        os.makedirs(tempPath)
+
+        for field in fieldList:
+            np.save(os.path.join(tempPath, field + '.npy'), mergedDict[field][index])
+
+        if os.path.isdir(partitionPath):
+            shutil.rmtree(partitionPath)
+        os.rename(tempPath, partitionPath)
+
+    #----------------------------------------------------------------------
+    def loadPartition(self, partitionPath, fieldList, mmap=True):
+        """读取单个分区的数据"""
+        if mmap:
+            mmapMode = 'r'
+        else:
+            mmapMode = None
+
+        d = {}
+        for field in fieldList:
+            d[field] = np.load(os.path.join(partitionPath, field + '.npy'),
+                               mmap_mode=mmapMode)
+        return d
+
+    #----------------------------------------------------------------------
+    def loadArray(self, dbName, symbol, start=None, end=None, includeEnd=False):
+        """
+        读取时间范围内的数据，返回按列组织的数组字典
+        start和end为datetime对象，为None时表示不限制
+        includeEnd为True时包含end时间戳上的数据
+        """
+        meta = self.getMeta(dbName, symbol)
+        if not meta:
+            return {}
+
+        fieldList = getColumnList(meta['dataType'])
+
+        # 筛选时间范围涉及的分区
+        partitionList = self.getPartitionList(dbName, symbol)
+        if start:
+            startPartition = start.strftime(PARTITION_FORMAT)
+            partitionList = [p for p in partitionList if p >= startPartition]
+        if end:
+            endPartition = end.strftime(PARTITION_FORMAT)
+            partitionList = [p for p in partitionList if p <= endPartition]
+
+        symbolPath = self.getSymbolPath(dbName, symbol)
+        partDictList = [self.loadPartition(os.path.join(symbolPath, p), fieldList)
+                        for p in partitionList]
+
+        # 单个分区时直接使用内存映射数组，多个分区时拼接
+        arrayDict = {}
+        for field in fieldList:
+            if len(partDictList) == 1:
+                arrayDict[field] = partDictList[0][field]
+            elif partDictList:
+                arrayDict[field] = np.concatenate([d[field] for d in partDictList])
+            elif field == 'datetime':
+                arrayDict[field] = np.array([], dtype='datetime64[us]')
+            elif field in self.STRING_FIELDS:
+                arrayDict[field] = np.array([], dtype='U')
+            else:
+                arrayDict[field] = np.array([], dtype=float)
+
+        # 二分查找定位精确的时间范围
+        dtArray = arrayDict['datetime']
+
+        startIndex = 0
+        if start:
+            startIndex = np.searchsorted(dtArray, np.datetime64(start, 'us'), 'left')
+
+        endIndex = len(dtArray)
+        if end:
+            if includeEnd:
+                side = 'right'
+            else:
+                side = 'left'
+            endIndex = np.searchsorted(dtArray, np.datetime64(end, 'us'), side)
+
+        for field in fieldList:
+            arrayDict[field] = arrayDict[field][startIndex:endIndex]
+
+        for field in self.META_FIELDS:
+            arrayDict[field] = meta.get(field, EMPTY_STRING)
+        arrayDict['dataType'] = meta['dataType']
+
+        return arrayDict
+
+    #----------------------------------------------------------------------
+    def iterDict(self, arrayDict):
+        """将按列组织的数据逐条转换为字典（兼容数据库查询结果的格式）"""
+        return iterDict(arrayDict)
+
+    #----------------------------------------------------------------------
+    def loadData(self, dbName, symbol, start=None, end=None, includeEnd=False):
+        """读取时间范围内的数据，返回VtBarData或VtTickData对象列表"""
+        arrayDict = self.loadArray(dbName, symbol, start, end, includeEnd)
+        return makeDataList(arrayDict)
+
+    #----------------------------------------------------------------------
+    def importFromMongo(self, dbClient, dbName, symbol, dataType=DATATYPE_BAR,
+                        batchSize=100000):
+        """从MongoDB导入某个合约的全部数据"""
+        collection = dbClient[dbName][symbol]
+        cursor = collection.find(projection={'_id': False}).sort('datetime')
+
+        count = 0
+        batch = []
+        for d in cursor:
+            batch.append(d)
+
+            if len(batch) >= batchSize:
+                self.insertData(dbName, symbol, batch, dataType)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            self.insertData(dbName, symbol, batch, dataType)
+            count += len(batch)
+
+        return count
+
+
+#----------------------------------------------------------------------
+def getFieldList(dataType):
+    """获取数据类型对应的数值字段列表"""
+    if dataType == DATATYPE_BAR:
+        return HistoryStore.BAR_FIELDS
+    else:
+        return HistoryStore.TICK_FIELDS
+
+
+#----------------------------------------------------------------------
+def getColumnList(dataType):
+    """获取数据类型对应的全部按列保存的字段（包括datetime和字符串字段）"""
+    return ['datetime'] + getFieldList(dataType) + HistoryStore.STRING_FIELDS
+
+
+#----------------------------------------------------------------------
+def makeArray(dataList, dataType=DATATYPE_BAR):
+    """
+    将数据列表转换为按列组织的数组字典
+    dataList中可以是VtBarData/VtTickData对象或者对应的字典
+    """
+    dList = [d if isinstance(d, dict) else d.__dict__ for d in dataList]
+
+    arrayDict = {}
+    arrayDict['datetime'] = np.array([d['datetime'] for d in dList],
+                                     dtype='datetime64[us]')
+
+    for field in getFieldList(dataType):
+        arrayDict[field] = np.array([d.get(field, 0) or 0 for d in dList],
+                                    dtype=float)
+
+    for field in HistoryStore.STRING_FIELDS:
+        arrayDict[field] = np.array([d.get(field, EMPTY_STRING) for d in dList],
+                                    dtype='U')
+
+    for field in HistoryStore.META_FIELDS:
+        if dList:
+            arrayDict[field] = dList[0].get(field, EMPTY_STRING)
+        else:
+            arrayDict[field] = EMPTY_STRING
+    arrayDict['dataType'] = dataType
+
+    return arrayDict
+
+
+#----------------------------------------------------------------------
+def iterDict(arrayDict):
+    """将按列组织的数据逐条转换为字典（兼容数据库查询结果的格式）"""
+    if not arrayDict:
+        return
+
+    fieldList = getColumnList(arrayDict['dataType'])
+
+    metaDict = {field: arrayDict[field] for field in HistoryStore.META_FIELDS}
+    columnList = [arrayDict[field].tolist() for field in fieldList]
+
+    for row in zip(*columnList):
+        d = dict(zip(fieldList, row))
+        d.update(metaDict)
+        yield d
+
+
+#----------------------------------------------------------------------
+def makeDataList(arrayDict):
+    """将按列组织的数据转换为VtBarData或VtTickData对象列表"""
+    if not arrayDict:
+        return []
+
+    if arrayDict['dataType'] == DATATYPE_BAR:
+        dataClass = VtBarData
+    else:
+        dataClass = VtTickData
+
+    l = []
+    for d in iterDict(arrayDict):
+        data = dataClass()
+        data.__dict__.update(d)
+        l.append(data)
+    return l
+
+
+#----------------------------------------------------------------------
+def saveSnapshot(path, arrayDict):
+    """
+    将按列组织的数据保存为不分区的快照目录
+    用于在多个进程之间通过内存映射共享同一份数据
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    meta = {'dataType': arrayDict['dataType']}
+    for field in HistoryStore.META_FIELDS:
+        meta[field] = arrayDict[field]
+
+    with open(os.path.join(path, META_FILE_NAME), 'w') as f:
+        json.dump(meta, f)
+
+    for field in getColumnList(arrayDict['dataType']):
+        np.save(os.path.join(path, field + '.npy'), arrayDict[field])
+
+
+#----------------------------------------------------------------------
+def loadSnapshot(path):
+    """以只读内存映射的方式载入快照目录，不复制数据"""
+    with open(os.path.join(path, META_FILE_NAME)) as f:
+        meta = json.load(f)
+
+    arrayDict = {}
+    for field in getColumnList(meta['dataType']):
+        arrayDict[field] = np.load(os.path.join(path, field + '.npy'), mmap_mode='r')
+
+    arrayDict.update(meta)
+    return arrayDict